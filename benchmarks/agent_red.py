@@ -0,0 +1,123 @@
+"""
+Measures the orchestration overhead of faice agent red with the in-process fake container backend, so neither a docker
+daemon nor network access is required. A synthetic REDFILE is executed sequentially, concurrently and pipelined. For
+every mode the throughput and the time per batch, which is not explained by the simulated container latencies, are
+reported.
+
+Run with: python -m benchmarks.agent_red --batches 500 --jobs 8 --latencies create=0.05,start=0.1,exec=0.01
+"""
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+from cc_faice.agent.red.main import run as run_red, OutputMode
+from cc_faice.commons.container_backends import FakeBackend, FakeLatencies
+from cc_faice.commons.serialization import dump
+
+from benchmarks.redfiles import generate_redfile
+
+# operations executed once per batch, the archive of every output file is retrieved separately
+BATCH_OPERATIONS = ['create', 'start', 'put_archive', 'exec', 'agent', 'stats', 'stop', 'remove']
+
+
+def attach_args(parser):
+    parser.add_argument(
+        '--batches', action='store', type=int, default=200,
+        help='The number of batches of the synthetic REDFILE, default is 200.'
+    )
+    parser.add_argument(
+        '--inputs', action='store', type=int, default=8,
+        help='The number of inputs per batch, default is 8.'
+    )
+    parser.add_argument(
+        '--jobs', action='store', type=int, default=8,
+        help='The number of jobs of the concurrent and pipelined modes, default is 8.'
+    )
+    parser.add_argument(
+        '--latencies', action='store', type=str, default='',
+        help='The simulated latencies of container operations in seconds as comma separated list like '
+             '"create=0.05,exec=0.01". Operations are [{}]. By default operations take no time.'
+             .format(', '.join(FakeLatencies.OPERATIONS))
+    )
+    parser.add_argument(
+        '--output-size', action='store', type=int, default=1024,
+        help='The size of every output file in bytes, default is 1024.'
+    )
+
+
+def simulated_batch_latency(latencies, output_count):
+    """
+    :return: The time in seconds a batch spends in simulated container operations
+    :rtype: float
+    """
+    return sum(latencies.get(operation) for operation in BATCH_OPERATIONS) + \
+        output_count * latencies.get('get_archive')
+
+
+def run(batches, inputs, jobs, latencies, output_size):
+    latencies = FakeLatencies.from_string(latencies)
+    red_data = generate_redfile(batches, input_count=inputs)
+    batch_latency = simulated_batch_latency(latencies, len(red_data['cli']['outputs']))
+    ram = red_data['container']['settings']['ram']
+
+    modes = OrderedDict([
+        ('sequential', {'jobs': 1}),
+        ('concurrent', {'jobs': jobs}),
+        ('pipelined', {'jobs': jobs, 'pipeline': True}),
+    ])
+
+    print('{} batches, simulated container latency {:.4f}s per batch'.format(batches, batch_latency))
+    failures = 0
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        red_file = os.path.join(tmp_dir, 'red.json')
+        dump(red_data, 'json', red_file)
+
+        for mode, mode_args in modes.items():
+            mode_dir = os.path.join(tmp_dir, mode)
+            os.mkdir(mode_dir)
+            os.chdir(mode_dir)
+            try:
+                start = time.perf_counter()
+                result = run_red(
+                    red_file=red_file,
+                    disable_pull=False,
+                    leave_container=False,
+                    preserve_environment=None,
+                    non_interactive=True,
+                    insecure=False,
+                    output_mode=OutputMode.Directory,
+                    keyring_service='red',
+                    gpu_ids=None,
+                    # the memory of this host should not limit the number of running fake containers
+                    memory_budget=ram * mode_args['jobs'],
+                    container_backend=FakeBackend(latencies, output_size),
+                    **mode_args
+                )
+                elapsed = time.perf_counter() - start
+            finally:
+                os.chdir(cwd)
+
+            if result['state'] != 'succeeded':
+                failures += 1
+
+            # with several jobs, each job executes its share of batches one after another
+            time_per_batch = elapsed * mode_args['jobs'] / batches
+            print('  {:<11} jobs {:>3}  total {:8.3f}s  throughput {:9.1f} batches/s  overhead {:8.2f}ms per batch  '
+                  '{}'.format(mode, mode_args['jobs'], elapsed, batches / elapsed,
+                              (time_per_batch - batch_latency) * 1000, result['state']))
+
+    return 1 if failures else 0
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    attach_args(parser)
+    args = parser.parse_args()
+    return run(**args.__dict__)
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,252 @@
+"""
+Benchmarks of the pure python code, which runs before any container starts: template completion, REDFILE validation
+and the conversion of batches. Every benchmark is executed on synthetic REDFILEs of several scenarios, which scale the
+number of batches, the number of inputs and the density of templates. The fastest execution time and the peak of traced
+memory are compared against a stored baseline, so regressions are caught.
+
+complete_red_templates() is measured in its two parts, collecting the unique template keys and completing the
+templates, because resolving the template values with the keyring is not reproducible.
+
+Run with: python -m benchmarks.hot_paths
+Update the baseline with: python -m benchmarks.hot_paths --save-baseline
+"""
+import copy
+import gc
+import json
+import os
+import platform
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+import jsonschema
+from cc_core.commons.red import red_validation, convert_batch_experiment
+from cc_core.commons.red_to_blue import convert_red_to_blue
+from cc_core.commons.schemas.red import red_schema
+from cc_core.commons.templates import get_template_keys
+
+from cc_faice.agent.red.main import _get_blue_batch_mount_keys
+from cc_faice.commons.templates import unique_template_keys, _complete_templates
+
+from benchmarks.redfiles import generate_redfile
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hot_paths_baseline.json')
+
+SCENARIOS = OrderedDict([
+    ('batches-1000', {'batch_count': 1000, 'input_count': 8, 'template_density': 0.0}),
+    ('inputs-64', {'batch_count': 100, 'input_count': 64, 'template_density': 0.0}),
+    ('templates-50', {'batch_count': 1000, 'input_count': 8, 'template_density': 0.5}),
+])
+
+# relative increase of time and peak memory compared to the baseline, which is reported as regression
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.1
+
+# smaller absolute increases are measurement noise of the fastest and smallest benchmarks
+MIN_TIME_INCREASE = 0.005
+MIN_MEMORY_INCREASE = 64 * 1024
+
+
+def _template_keys(red_data):
+    template_keys = set()
+    get_template_keys(red_data, template_keys)
+    return unique_template_keys(template_keys)
+
+
+def _prepare_complete_templates(red_data):
+    templates = {template_key.key: 'value-of-{}'.format(template_key.key) for template_key in _template_keys(red_data)}
+    return copy.deepcopy(red_data), templates
+
+
+def _convert_batch_experiments(red_data):
+    for batch in range(len(red_data['batches'])):
+        convert_batch_experiment(red_data, batch)
+
+
+def _blue_batch_mount_keys(blue_batches):
+    for blue_batch in blue_batches:
+        _get_blue_batch_mount_keys(blue_batch)
+
+
+# every benchmark consists of a setup, which is not measured, and the measured function called with its result
+BENCHMARKS = OrderedDict([
+    ('red-validation', (lambda red_data: red_data, lambda red_data: red_validation(red_data, False))),
+    ('jsonschema', (lambda red_data: red_data, lambda red_data: jsonschema.validate(red_data, red_schema))),
+    ('unique-template-keys', (lambda red_data: red_data, _template_keys)),
+    ('complete-templates', (_prepare_complete_templates, lambda args: _complete_templates(*args))),
+    ('convert-red-to-blue', (copy.deepcopy, convert_red_to_blue)),
+    ('convert-batch-experiment', (lambda red_data: red_data, _convert_batch_experiments)),
+    ('blue-batch-mount-keys', (lambda red_data: convert_red_to_blue(copy.deepcopy(red_data)), _blue_batch_mount_keys)),
+])
+
+
+def attach_args(parser):
+    parser.add_argument(
+        '--scenario', action='append', type=str, metavar='SCENARIO', choices=list(SCENARIOS),
+        help='Run only the given SCENARIO as one of [{}]. Can be given multiple times, default are all scenarios.'
+             .format(', '.join(SCENARIOS))
+    )
+    parser.add_argument(
+        '--benchmark', action='append', type=str, metavar='BENCHMARK', choices=list(BENCHMARKS),
+        help='Run only the given BENCHMARK as one of [{}]. Can be given multiple times, default are all benchmarks.'
+             .format(', '.join(BENCHMARKS))
+    )
+    parser.add_argument(
+        '--batches', action='store', type=int,
+        help='Run a custom scenario with the given number of batches instead of the predefined scenarios.'
+    )
+    parser.add_argument(
+        '--inputs', action='store', type=int, default=8,
+        help='The number of inputs per batch of a custom scenario, default is 8.'
+    )
+    parser.add_argument(
+        '--template-density', action='store', type=float, default=0.0,
+        help='The probability of a connector credential to be a template in a custom scenario, default is 0.0.'
+    )
+    parser.add_argument(
+        '--repeat', action='store', type=int, default=3,
+        help='The number of repetitions of each measurement. The fastest repetition is reported, default is 3.'
+    )
+    parser.add_argument(
+        '--baseline', action='store', type=str, metavar='FILE', default=DEFAULT_BASELINE,
+        help='The baseline FILE to compare with, default is "{}".'.format(os.path.relpath(DEFAULT_BASELINE))
+    )
+    parser.add_argument(
+        '--save-baseline', action='store_true',
+        help='Store the results in the baseline file instead of comparing with it.'
+    )
+    parser.add_argument(
+        '--time-tolerance', action='store', type=float, default=DEFAULT_TIME_TOLERANCE,
+        help='The relative increase of time reported as regression, default is {}.'.format(DEFAULT_TIME_TOLERANCE)
+    )
+    parser.add_argument(
+        '--memory-tolerance', action='store', type=float, default=DEFAULT_MEMORY_TOLERANCE,
+        help='The relative increase of peak memory reported as regression, default is {}.'
+             .format(DEFAULT_MEMORY_TOLERANCE)
+    )
+
+
+def measure(setup, func, red_data, repeat):
+    """
+    Measures the fastest execution time of func and its peak of traced memory. The memory is measured in an additional
+    execution, because tracing memory slows down the execution.
+
+    :return: The fastest execution time in seconds and the peak of traced memory in bytes
+    :rtype: Tuple[float, int]
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup(red_data)
+        gc.collect()
+        start = time.perf_counter()
+        func(args)
+        times.append(time.perf_counter() - start)
+        del args
+
+    args = setup(red_data)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(times), peak
+
+
+def read_baseline(path):
+    if not os.path.isfile(path):
+        return {'results': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_baseline(path, baseline, results):
+    baseline['python'] = platform.python_version()
+    baseline['machine'] = '{} {}'.format(platform.system(), platform.machine())
+    baseline['results'].update(results)
+    baseline['results'] = OrderedDict(sorted(baseline['results'].items()))
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+
+
+def _ratio(value, reference):
+    if not reference:
+        return '     -'
+    return '{:5.2f}x'.format(value / reference)
+
+
+def run(scenario, benchmark, batches, inputs, template_density, repeat, baseline, save_baseline, time_tolerance,
+        memory_tolerance):
+    if batches is not None:
+        scenarios = OrderedDict([(
+            'custom-b{}-i{}-t{}'.format(batches, inputs, template_density),
+            {'batch_count': batches, 'input_count': inputs, 'template_density': template_density}
+        )])
+    else:
+        scenarios = OrderedDict((name, SCENARIOS[name]) for name in scenario or SCENARIOS)
+    benchmarks = OrderedDict((name, BENCHMARKS[name]) for name in benchmark or BENCHMARKS)
+
+    stored_baseline = read_baseline(baseline)
+    baseline_results = stored_baseline['results']
+
+    results = OrderedDict()
+    regressions = []
+    for scenario_name, scenario_args in scenarios.items():
+        red_data = generate_redfile(**scenario_args)
+        print('\n{} ({} batches, {} inputs, template density {})'.format(
+            scenario_name, scenario_args['batch_count'], scenario_args['input_count'],
+            scenario_args['template_density']
+        ))
+
+        for benchmark_name, (setup, func) in benchmarks.items():
+            key = '{}/{}'.format(scenario_name, benchmark_name)
+            elapsed, peak = measure(setup, func, red_data, repeat)
+            results[key] = {'time': elapsed, 'peak': peak}
+
+            reference = baseline_results.get(key, {})
+            line = '  {:<26} {:9.4f}s {}  peak {:9.2f} MiB {}'.format(
+                benchmark_name, elapsed, _ratio(elapsed, reference.get('time')),
+                peak / 1024 ** 2, _ratio(peak, reference.get('peak'))
+            )
+            if not save_baseline and reference:
+                if elapsed > reference['time'] * (1 + time_tolerance) + MIN_TIME_INCREASE:
+                    regressions.append('{}: time'.format(key))
+                    line += '  TIME REGRESSION'
+                if peak > reference['peak'] * (1 + memory_tolerance) + MIN_MEMORY_INCREASE:
+                    regressions.append('{}: peak memory'.format(key))
+                    line += '  MEMORY REGRESSION'
+            print(line)
+
+    if save_baseline:
+        write_baseline(baseline, stored_baseline, results)
+        print('\nStored {} results in "{}".'.format(len(results), baseline))
+        return 0
+
+    if not baseline_results:
+        print('\nNo baseline found in "{}". Store one with --save-baseline.'.format(baseline))
+        return 0
+
+    print('\nCompared with baseline of python {} on {}.'.format(
+        stored_baseline.get('python'), stored_baseline.get('machine')
+    ))
+    if regressions:
+        print('Regressions:\n' + '\n'.join('  ' + regression for regression in regressions))
+        return 1
+
+    print('No regressions.')
+    return 0
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    attach_args(parser)
+    args = parser.parse_args()
+    return run(**args.__dict__)
+
+
+if __name__ == '__main__':
+    exit(main())
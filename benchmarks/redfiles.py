@@ -0,0 +1,127 @@
+"""
+Generators for synthetic REDFILEs, which are used by the benchmarks. The generated REDFILEs are deterministic for given
+arguments, so results of different runs are comparable.
+"""
+import random
+
+RED_VERSION = '8'
+DOCKER_IMAGE = 'docker.io/curiouscontainers/cc-core-example:latest'
+
+
+def generate_cli(input_count):
+    """
+    Generates a cli description with input_count inputs of alternating types and a single output file.
+
+    :param input_count: The number of inputs of the cli description
+    :type input_count: int
+
+    :rtype: Dict
+    """
+    inputs = {}
+    for index in range(input_count):
+        input_type = ['File', 'string', 'int', 'Directory'][index % 4]
+        inputs['input_{}'.format(index)] = {
+            'type': input_type,
+            'inputBinding': {'prefix': '--input-{}'.format(index)},
+            'doc': 'Synthetic input number {} of type {}.'.format(index, input_type)
+        }
+
+    return {
+        'cwlVersion': 'v1.0',
+        'class': 'CommandLineTool',
+        'baseCommand': 'process-data',
+        'doc': 'Synthetic command line tool generated for benchmarks.',
+        'inputs': inputs,
+        'outputs': {
+            'result': {
+                'type': 'File',
+                'outputBinding': {'glob': 'result.csv'}
+            }
+        }
+    }
+
+
+def _generate_input_value(index, input_type, batch_index, rnd, template_density):
+    def secret(value):
+        if rnd.random() < template_density:
+            return '{{{{server_{}_{}}}}}'.format(index % 8, value)
+        return '{}-{}'.format(value, batch_index)
+
+    if input_type == 'string':
+        return 'value-{}-{}'.format(batch_index, rnd.randint(0, 10 ** 6))
+    if input_type == 'int':
+        return rnd.randint(-10 ** 9, 10 ** 9)
+
+    connector = {
+        'command': 'red-connector-ssh',
+        'access': {
+            'host': 'storage-{}.example.com'.format(index % 16),
+            'port': 22,
+            'auth': {
+                'username': secret('username'),
+                'password': secret('password')
+            },
+            'path': '/data/batch-{}/input-{}'.format(batch_index, index)
+        }
+    }
+    if input_type == 'File':
+        return {'class': 'File', 'connector': connector}
+    return {'class': 'Directory', 'connector': connector, 'listing': [
+        {'class': 'File', 'basename': 'part-{}.csv'.format(part)} for part in range(3)
+    ]}
+
+
+def generate_redfile(batch_count, input_count=8, template_density=0.0, seed=0):
+    """
+    Generates a batch-heavy REDFILE. Every batch specifies all inputs of the cli description and one output.
+
+    :param batch_count: The number of batches
+    :type batch_count: int
+    :param input_count: The number of inputs of the cli description
+    :type input_count: int
+    :param template_density: The probability of a connector credential to be a template like "{{server_0_password}}"
+    :type template_density: float
+    :param seed: The seed of the random generator
+    :type seed: int
+
+    :return: The REDFILE data
+    :rtype: Dict
+    """
+    rnd = random.Random(seed)
+    cli = generate_cli(input_count)
+    input_types = [(key, value['type']) for key, value in cli['inputs'].items()]
+
+    batches = []
+    for batch_index in range(batch_count):
+        batch_inputs = {
+            key: _generate_input_value(index, input_type, batch_index, rnd, template_density)
+            for index, (key, input_type) in enumerate(input_types)
+        }
+        batches.append({
+            'inputs': batch_inputs,
+            'outputs': {
+                'result': {
+                    'class': 'File',
+                    'connector': {
+                        'command': 'red-connector-http',
+                        'access': {
+                            'url': 'https://results.example.com/batch-{}/result.csv'.format(batch_index),
+                            'method': 'PUT'
+                        }
+                    }
+                }
+            }
+        })
+
+    return {
+        'redVersion': RED_VERSION,
+        'cli': cli,
+        'batches': batches,
+        'container': {
+            'engine': 'docker',
+            'settings': {
+                'image': {'url': DOCKER_IMAGE},
+                'ram': 1024
+            }
+        }
+    }
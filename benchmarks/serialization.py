@@ -0,0 +1,115 @@
+"""
+Compares the serialization backends of cc_faice.commons.serialization on synthetic batch-heavy REDFILEs. For every
+format the time to load the REDFILE from disk and to dump it is measured with each backend and the dumped files are
+compared byte by byte.
+
+Run with: python -m benchmarks.serialization --batches 20000
+"""
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from contextlib import contextmanager
+
+from cc_faice.commons import serialization
+from cc_faice.commons.serialization import load_and_read, dumps, SERIALIZATION_ENVVAR, BACKENDS
+
+from benchmarks.redfiles import generate_redfile
+
+FORMATS = ['json', 'yaml']
+
+
+def attach_args(parser):
+    parser.add_argument(
+        '--batches', action='store', type=int, default=5000,
+        help='The number of batches of the synthetic REDFILE, default is 5000.'
+    )
+    parser.add_argument(
+        '--inputs', action='store', type=int, default=8,
+        help='The number of inputs per batch, default is 8.'
+    )
+    parser.add_argument(
+        '--repeat', action='store', type=int, default=3,
+        help='The number of repetitions of each measurement. The fastest repetition is reported, default is 3.'
+    )
+
+
+@contextmanager
+def selected_backend(backend):
+    previous = os.environ.get(SERIALIZATION_ENVVAR)
+    os.environ[SERIALIZATION_ENVVAR] = backend
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ[SERIALIZATION_ENVVAR]
+        else:
+            os.environ[SERIALIZATION_ENVVAR] = previous
+
+
+def best_time(func, repeat):
+    """
+    :return: The result of the last call and the fastest execution time in seconds
+    :rtype: Tuple[Any, float]
+    """
+    result = None
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def run(batches, inputs, repeat):
+    red_data = generate_redfile(batches, input_count=inputs)
+    print('orjson available: {}, libyaml available: {}'.format(
+        serialization.orjson is not None, serialization.yaml is not None
+    ))
+
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for fmt in FORMATS:
+            red_file = os.path.join(tmp_dir, 'red.{}'.format(fmt))
+            with selected_backend(serialization.CC_CORE_BACKEND):
+                with open(red_file, 'w') as f:
+                    f.write(dumps(red_data, fmt))
+            size = os.path.getsize(red_file) / 1024 ** 2
+
+            dumped = {}
+            timings = {}
+            for backend in BACKENDS:
+                with selected_backend(backend):
+                    loaded, load_time = best_time(lambda: load_and_read(red_file, 'REDFILE'), repeat)
+                    dumped[backend], dump_time = best_time(lambda: dumps(loaded, fmt), repeat)
+                timings[backend] = (load_time, dump_time)
+                if loaded != red_data:
+                    print('{} backend loaded different data from {} file'.format(backend, fmt), file=sys.stderr)
+                    mismatches += 1
+
+            reference_load, reference_dump = timings[serialization.CC_CORE_BACKEND]
+            print('\n{} ({:.1f} MB, {} batches)'.format(fmt, size, batches))
+            for backend in BACKENDS:
+                load_time, dump_time = timings[backend]
+                print('  {:<12} load {:8.3f}s ({:5.1f}x)  dump {:8.3f}s ({:5.1f}x)'.format(
+                    backend, load_time, reference_load / load_time, dump_time, reference_dump / dump_time
+                ))
+
+            identical = len(set(dumped.values())) == 1
+            print('  dumps identical: {}'.format(identical))
+            if not identical:
+                mismatches += 1
+
+    return 1 if mismatches else 0
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    attach_args(parser)
+    args = parser.parse_args()
+    return run(**args.__dict__)
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,74 @@
+from argparse import ArgumentParser
+
+from cc_core.commons.exceptions import print_exception
+
+from cc_faice.commons.serialization import dump_print
+from cc_faice.commons.bundles import read_bundle_index, extract_bundle_members
+
+DESCRIPTION = 'List or extract files of an output bundle written by "faice agent red --bundle-outputs".'
+
+
+def attach_args(parser):
+    parser.add_argument(
+        'bundle', action='store', type=str, metavar='BUNDLE',
+        help='The output bundle, like "outputs_0.tar.gz". Its index file has to be located next to the bundle.'
+    )
+    parser.add_argument(
+        'members', action='store', type=str, metavar='MEMBER', nargs='*',
+        help='Extract the files or directories named MEMBER. If no MEMBER is given, the content of the bundle is '
+             'listed.'
+    )
+    parser.add_argument(
+        '--output-dir', action='store', type=str, metavar='OUTPUT_DIR', default='.',
+        help='Extract the members to OUTPUT_DIR, default is the current directory.'
+    )
+    parser.add_argument(
+        '--format', action='store', type=str, metavar='FORMAT', choices=['json', 'yaml', 'yml'], default='yaml',
+        help='Specify FORMAT for generated data as one of [json, yaml, yml]. Default is yaml.'
+    )
+
+
+def main():
+    parser = ArgumentParser(description=DESCRIPTION)
+    attach_args(parser)
+    args = parser.parse_args()
+
+    try:
+        result = run(**args.__dict__)
+    except Exception as e:
+        print_exception(e)
+        return 1
+
+    dump_print(result, args.format)
+    return 0
+
+
+def run(bundle, members=None, output_dir='.', **_):
+    """
+    Lists the members of the given output bundle or extracts the given members. Only the chunks of the bundle
+    containing the given members are decompressed.
+
+    :param bundle: The path of the output bundle
+    :type bundle: str
+    :param members: The names of the members to extract. If empty, the members are listed.
+    :type members: List[str] or None
+    :param output_dir: The directory the members are extracted to
+    :type output_dir: str
+
+    :return: A dictionary containing the listed or extracted members as "members"
+    :rtype: Dict[str, List[Dict[str, Any]]]
+
+    :raise FileNotFoundError: If the bundle or its index does not exist
+    :raise ValueError: If the bundle does not contain one of the given members
+    """
+    if members:
+        extracted = extract_bundle_members(bundle, members, output_dir)
+    else:
+        extracted = read_bundle_index(bundle)['members']
+
+    return {
+        'members': [
+            {'name': member['name'], 'type': member['type'], 'size': member['size']}
+            for member in extracted
+        ]
+    }
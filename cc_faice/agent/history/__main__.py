@@ -0,0 +1,5 @@
+from cc_faice.agent.history.main import main
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,79 @@
+import os
+from argparse import ArgumentParser
+
+from cc_core.commons.exceptions import print_exception
+
+from cc_faice.commons.serialization import dump_print
+from cc_faice.commons.history import BatchHistory, HISTORY_FILE
+
+DESCRIPTION = 'Show the batch executions recorded by "faice agent red --history".'
+
+
+def attach_args(parser):
+    parser.add_argument(
+        'history_file', action='store', type=str, metavar='HISTORY_FILE', nargs='?', default=HISTORY_FILE,
+        help='The sqlite history database to show, default is "{}".'.format(HISTORY_FILE)
+    )
+    parser.add_argument(
+        '--batch-hash', action='store', type=str, metavar='BATCH_HASH',
+        help='Only show executions of the batch with the given BATCH_HASH.'
+    )
+    parser.add_argument(
+        '--limit', action='store', type=int, metavar='LIMIT',
+        help='Show at most LIMIT executions, most recent first.'
+    )
+    parser.add_argument(
+        '--summary', action='store_true',
+        help='Show one entry per batch containing the number of executions, the mean and maximal duration of '
+             'successful executions and the maximal peak memory usage.'
+    )
+    parser.add_argument(
+        '--format', action='store', type=str, metavar='FORMAT', choices=['json', 'yaml', 'yml'], default='yaml',
+        help='Specify FORMAT for generated data as one of [json, yaml, yml]. Default is yaml.'
+    )
+
+
+def main():
+    parser = ArgumentParser(description=DESCRIPTION)
+    attach_args(parser)
+    args = parser.parse_args()
+
+    try:
+        result = run(**args.__dict__)
+    except Exception as e:
+        print_exception(e)
+        return 1
+
+    dump_print(result, args.format)
+    return 0
+
+
+def run(history_file, batch_hash=None, limit=None, summary=False, **_):
+    """
+    Reads the batch executions recorded in the given history.
+
+    :param history_file: The path to the sqlite history database
+    :type history_file: str
+    :param batch_hash: If given, only executions of the batch with this hash are returned
+    :type batch_hash: str or None
+    :param limit: The maximal number of executions to return
+    :type limit: int or None
+    :param summary: If True, the executions are aggregated per batch
+    :type summary: bool
+
+    :return: A dictionary containing the recorded executions as "runs" or the aggregated batches as "batches"
+    :rtype: Dict[str, List[Dict[str, Any]]]
+
+    :raise FileNotFoundError: If the given history file does not exist
+    """
+    # opening a missing database would create an empty one
+    if not os.path.isfile(history_file):
+        raise FileNotFoundError('History file "{}" does not exist.'.format(history_file))
+
+    history = BatchHistory(history_file)
+    try:
+        if summary:
+            return {'batches': history.summary(batch_hash)[:limit]}
+        return {'runs': history.runs(batch_hash, limit)}
+    finally:
+        history.close()
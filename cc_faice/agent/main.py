@@ -2,6 +2,10 @@ from collections import OrderedDict
 
 from cc_faice.agent.red.main import main as red_main
 from cc_faice.agent.red.main import DESCRIPTION as RED_DESCRIPTION
+from cc_faice.agent.history.main import main as history_main
+from cc_faice.agent.history.main import DESCRIPTION as HISTORY_DESCRIPTION
+from cc_faice.agent.bundle.main import main as bundle_main
+from cc_faice.agent.bundle.main import DESCRIPTION as BUNDLE_DESCRIPTION
 
 from cc_core.commons.cli_modes import cli_modes
 
@@ -11,6 +15,8 @@ TITLE = 'modes'
 DESCRIPTION = 'Run a RED experiment.'
 MODES = OrderedDict([
     ('red', {'main': red_main, 'description': RED_DESCRIPTION}),
+    ('history', {'main': history_main, 'description': HISTORY_DESCRIPTION}),
+    ('bundle', {'main': bundle_main, 'description': BUNDLE_DESCRIPTION}),
 ])
 
 
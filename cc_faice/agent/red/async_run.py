@@ -0,0 +1,347 @@
+"""
+An asyncio API to execute RED experiments inside services, which run an event loop. The batches are executed as
+coroutines using the docker engine api, so waiting for containers does not occupy a thread per batch. Parsing the
+REDFILE, creating the archives of the blue batches and writing output files is done in the default executor of the event
+loop.
+
+Example:
+
+    result = await run('experiment.red.yml', jobs=4)
+"""
+import asyncio
+import functools
+import os
+import time
+from uuid import uuid4
+
+from cc_core.commons.docker_utils import create_batch_archive
+from cc_core.commons.exceptions import print_exception, exception_format, AgentError, JobExecutionError
+from cc_core.commons.red import red_validation
+from cc_core.commons.red_to_blue import CONTAINER_OUTPUT_DIR
+from cc_core.commons.templates import get_secret_values, normalize_keys
+
+from cc_faice.agent.red.main import OutputMode, ExecutionResultType, ContainerExecutionResult, define_is_mounting, \
+    output_file_paths, output_retrieval_error, _create_blue_agent_command
+from cc_faice.commons.async_docker import AsyncDockerManager, AsyncDockerError
+from cc_faice.commons.batches import BlueBatchConverter, lazy_blue_batches
+from cc_faice.commons.docker import env_vars, ExecutionTimeoutError, DEFAULT_TIMEOUT
+from cc_faice.commons.engines import container_engine_validation
+from cc_faice.commons.executor import execute_batches_async
+from cc_faice.commons.red_cache import RedCache, DEFAULT_RED_CACHE_SIZE, load_validated_red
+from cc_faice.commons.templates import complete_red_templates
+
+
+async def run(red_file,
+              output_mode=OutputMode.Directory,
+              non_interactive=True,
+              keyring_service='red',
+              jobs=1,
+              disable_pull=False,
+              leave_container=False,
+              preserve_environment=None,
+              insecure=False,
+              batch_timeout=None,
+              keep_going=False,
+              red_cache=None,
+              red_cache_size=DEFAULT_RED_CACHE_SIZE,
+              docker_manager=None,
+              docker_timeout=DEFAULT_TIMEOUT):
+    """
+    Executes a RED Experiment like cc_faice.agent.red.main.run() without blocking the event loop.
+
+    :param red_file: The path or URL to the RED File to execute
+    :param output_mode: Either Connectors or Directory. If Connectors, the blue agent will try to execute the output
+                        connectors. If Directory faice will copy the output files into the host output directory.
+    :param non_interactive: If True, unresolved template values are not asked interactively
+    :param keyring_service: The keyring service name to use for template substitution
+    :param jobs: The maximal number of batches executing at the same time
+    :type jobs: int
+    :param disable_pull: If True the docker image is not pulled from an registry
+    :param leave_container: If set to True, the executed docker container will not be removed.
+    :param preserve_environment: List of environment variables to preserve inside the docker container.
+    :param insecure: Allow insecure capabilities
+    :param batch_timeout: The number of seconds after which the execution of a batch is aborted. If None, the
+                          batchTimeout of the container settings is used.
+    :type batch_timeout: int or None
+    :param keep_going: If True, all batches are executed, even if some of them fail
+    :type keep_going: bool
+    :param red_cache: The directory of the REDFILE cache. If None, the REDFILE is parsed and validated without cache.
+    :type red_cache: str or None
+    :param red_cache_size: The maximal size of the REDFILE cache in megabytes
+    :type red_cache_size: int
+    :param docker_manager: The docker manager to use. If None, the docker daemon configured by the environment is used.
+    :type docker_manager: AsyncDockerManager or None
+    :param docker_timeout: The timeout of docker api calls in seconds, if no docker manager is given
+    :type docker_timeout: int
+
+    :return: The result of the experiment in the format of cc_faice.agent.red.main.run()
+    :rtype: Dict
+    """
+    loop = asyncio.get_event_loop()
+
+    result = {
+        'containers': [],
+        'batches': [],
+        'debugInfo': None,
+        'state': 'succeeded'
+    }
+
+    secret_values = None
+
+    try:
+        if jobs < 1:
+            raise ValueError('The number of jobs must be at least 1, but found {}.'.format(jobs))
+
+        red_data, faice_settings, secret_values = await loop.run_in_executor(
+            None, _load_red, red_file, output_mode, keyring_service, non_interactive, red_cache, red_cache_size
+        )
+
+        if red_data['container']['settings'].get('gpus'):
+            raise ValueError('GPUs are not supported by the asyncio execution. Use faice agent red instead.')
+
+        blue_batch_converter = BlueBatchConverter(red_data)
+
+        docker_image = red_data['container']['settings']['image']['url']
+        ram = red_data['container']['settings'].get('ram')
+        if batch_timeout is None:
+            batch_timeout = faice_settings.get('batchTimeout')
+        environment = env_vars(preserve_environment)
+
+        if docker_manager is None:
+            docker_manager = AsyncDockerManager(timeout=docker_timeout)
+
+        if not disable_pull:
+            await docker_manager.pull(docker_image, auth=red_data['container']['settings']['image'].get('auth'))
+
+        if len(blue_batch_converter) == 1:
+            host_outdir = 'outputs'
+        else:
+            host_outdir = 'outputs_{batch_index}'
+
+        batch_outcomes = {}
+        container_results = {}
+
+        async def process_batch(batch):
+            batch_index, blue_batch = batch
+
+            batch_outcome = {
+                'batchIndex': batch_index,
+                'state': str(ExecutionResultType.Failed),
+                'attempts': 1,
+                'debugInfo': None
+            }
+            batch_outcomes[batch_index] = batch_outcome
+
+            try:
+                container_execution_result = await run_blue_batch(
+                    blue_batch=blue_batch,
+                    docker_manager=docker_manager,
+                    docker_image=docker_image,
+                    host_outdir=host_outdir,
+                    output_mode=output_mode,
+                    leave_container=leave_container,
+                    batch_index=batch_index,
+                    ram=ram,
+                    environment=environment,
+                    insecure=insecure,
+                    timeout=batch_timeout
+                )
+            except Exception as e:
+                if not keep_going:
+                    raise
+
+                print_exception(e, secret_values)
+                batch_outcome['debugInfo'] = exception_format(secret_values)
+                result['state'] = 'failed'
+                return
+
+            container_result = container_execution_result.to_dict()
+            batch_outcome['state'] = container_result['state']
+            container_results[batch_index] = container_result
+
+            if keep_going and not container_execution_result.successful():
+                result['state'] = 'failed'
+
+            if not keep_going:
+                container_execution_result.raise_for_state()
+
+        try:
+            await execute_batches_async(
+                lazy_blue_batches(blue_batch_converter, range(len(blue_batch_converter))), process_batch, jobs
+            )
+        finally:
+            result['batches'] = [batch_outcomes[i] for i in sorted(batch_outcomes)]
+            result['containers'] = [container_results[i] for i in sorted(container_results)]
+    except Exception as e:
+        print_exception(e, secret_values)
+        result['debugInfo'] = exception_format(secret_values)
+        result['state'] = 'failed'
+
+    return result
+
+
+def _load_red(red_file, output_mode, keyring_service, non_interactive, red_cache, red_cache_size):
+    """
+    Loads, validates and completes the given REDFILE.
+
+    :return: The red data, the faice settings of the container engine and the secret values of the red data
+    :rtype: Tuple[Dict, Dict, List[str]]
+    """
+    ignore_outputs = output_mode == OutputMode.Directory
+    red_data, validation_results = load_validated_red(
+        red_file,
+        [
+            (
+                'red-container-ignore-outputs' if ignore_outputs else 'red-container',
+                lambda data: red_validation(data, ignore_outputs, container_requirement=True)
+            ),
+            ('container-engine', container_engine_validation)
+        ],
+        RedCache(red_cache, red_cache_size) if red_cache else None
+    )
+
+    complete_red_templates(red_data, keyring_service, non_interactive)
+    secret_values = get_secret_values(red_data)
+    normalize_keys(red_data)
+
+    return red_data, validation_results['container-engine'], secret_values
+
+
+async def run_blue_batch(blue_batch,
+                         docker_manager,
+                         docker_image,
+                         host_outdir,
+                         output_mode,
+                         leave_container,
+                         batch_index,
+                         ram,
+                         environment,
+                         insecure,
+                         timeout=None):
+    """
+    Executes an blue agent inside a docker container that takes the given blue batch as argument. See
+    cc_faice.agent.red.main.run_blue_batch() for a description of the arguments.
+
+    :param docker_manager: The docker manager to use for executing the batch
+    :type docker_manager: AsyncDockerManager
+
+    :return: A container result
+    :rtype: ContainerExecutionResult
+    """
+    loop = asyncio.get_event_loop()
+
+    container_name = str(uuid4())
+    command = _create_blue_agent_command()
+    if output_mode == OutputMode.Connectors:
+        command.append('--outputs')
+
+    is_mounting = define_is_mounting(blue_batch, insecure)
+    abs_host_outdir = os.path.abspath(host_outdir.format(batch_index=batch_index))
+
+    container_id = None
+    try:
+        container_id = await docker_manager.create_container(
+            name=container_name,
+            image=docker_image,
+            working_directory=CONTAINER_OUTPUT_DIR,
+            ram=ram,
+            environment=environment,
+            enable_fuse=is_mounting
+        )
+
+        blue_archive = await loop.run_in_executor(None, _create_batch_archive_data, blue_batch)
+        await docker_manager.put_archive(container_id, blue_archive)
+
+        # hack to make fuse working under osx
+        if is_mounting:
+            osx_fuse_result = await docker_manager.run_command(
+                container_id, ['chmod', 'o+rw', '/dev/fuse'], user='root', work_dir='/'
+            )
+            if osx_fuse_result.return_code != 0:
+                raise JobExecutionError(
+                   'Failed to set fuse permissions (exitcode: {}). Failed with the following message:\n{}\n{}'
+                   .format(osx_fuse_result.return_code, osx_fuse_result.get_stdout(), osx_fuse_result.get_stderr())
+                )
+
+        start = time.monotonic()
+        try:
+            agent_execution_result = await docker_manager.run_command(
+                container_id, command, user='cc', timeout=timeout
+            )
+        except ExecutionTimeoutError as e:
+            duration = time.monotonic() - start
+            await _stop_container(docker_manager, container_id, leave_container)
+            return ContainerExecutionResult(
+                ExecutionResultType.TimedOut, command, container_name, None, str(e), None, duration
+            )
+        duration = time.monotonic() - start
+
+        blue_agent_result = agent_execution_result.get_agent_result_dict()
+
+        if blue_agent_result['state'] == 'succeeded':
+            state = ExecutionResultType.Succeeded
+
+            if output_mode == OutputMode.Directory:
+                await _handle_directory_outputs(
+                    abs_host_outdir, blue_agent_result['outputs'], container_id, docker_manager, loop
+                )
+        else:
+            state = ExecutionResultType.Failed
+
+        await _stop_container(docker_manager, container_id, leave_container)
+    except Exception:
+        # do not leave a running container behind, if the batch could not be executed
+        if container_id is not None:
+            try:
+                await _stop_container(docker_manager, container_id, leave_container)
+            except (AsyncDockerError, asyncio.TimeoutError):
+                pass
+        raise
+
+    return ContainerExecutionResult(
+        state,
+        command,
+        container_name,
+        blue_agent_result,
+        agent_execution_result.get_stderr(),
+        agent_execution_result.get_stats(),
+        duration
+    )
+
+
+async def _stop_container(docker_manager, container_id, leave_container):
+    await docker_manager.stop_container(container_id)
+
+    if not leave_container:
+        await docker_manager.remove_container(container_id)
+
+
+def _create_batch_archive_data(blue_batch):
+    """
+    :return: The tar archive containing the blue agent and the given blue batch
+    :rtype: bytes
+    """
+    with create_batch_archive(blue_batch) as blue_archive:
+        return blue_archive.getvalue()
+
+
+async def _handle_directory_outputs(host_outdir, outputs, container_id, docker_manager, loop):
+    """
+    Creates the host_outdir and retrieves the files given in outputs from the docker container like
+    cc_faice.agent.red.main._handle_directory_outputs(). Creating the directory and extracting the retrieved archives
+    is done in the default executor of the given event loop.
+
+    :raise AgentError: If a file given in outputs could not be retrieved by the docker manager
+    """
+    await loop.run_in_executor(None, functools.partial(os.makedirs, host_outdir, exist_ok=True))
+
+    for output_key, file_path in output_file_paths(outputs):
+        try:
+            file_archive = await docker_manager.get_file_archive(container_id, file_path)
+        except AgentError as e:
+            raise output_retrieval_error(output_key, file_path, e)
+
+        try:
+            await loop.run_in_executor(None, file_archive.extractall, host_outdir)
+        finally:
+            file_archive.close()
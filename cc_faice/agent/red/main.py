@@ -1,33 +1,66 @@
 """
                 Host                    Container
-blue_file       in memory               /cc/blue_file.json
-blue_agent      <import...>             /cc/blue_agent.py
-outputs         ./outputs[_batch_id]    /cc/outputs (defined in red_to_blue.py)
+blue_file       in memory               /cc/blue_file.json (bind mounted from a staging directory with --mount-agent)
+blue_agent      <import...>             /cc/blue_agent.py (bind mounted from a staging directory with --mount-agent)
+outputs         ./outputs[_batch_id]    /cc/outputs (defined in red_to_blue.py, bind mounted with --mount-outputs)
 """
+import json
 import os
+import shutil
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 from argparse import ArgumentParser
+from contextlib import ExitStack
 from typing import List
 from enum import Enum
 from uuid import uuid4
 
-from cc_core.commons.docker_utils import create_batch_archive
-from cc_core.commons.engines import engine_validation
+from docker.errors import DockerException
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from cc_core.commons.docker_utils import create_batch_archive, get_blue_agent_host_path
 from cc_core.commons.exceptions import print_exception, exception_format, AgentError, JobExecutionError
-from cc_core.commons.files import load_and_read, dump_print
 from cc_core.commons.gpu_info import get_gpu_requirements, match_gpus, InsufficientGPUError
 from cc_core.commons.red import red_validation
-from cc_core.commons.red_to_blue import convert_red_to_blue, CONTAINER_OUTPUT_DIR, CONTAINER_AGENT_PATH, \
-    CONTAINER_BLUE_FILE_PATH
+from cc_core.commons.red_to_blue import CONTAINER_OUTPUT_DIR, CONTAINER_AGENT_PATH, \
+    CONTAINER_BLUE_FILE_PATH, CONTAINER_INPUT_DIR
 from cc_core.commons.templates import get_secret_values, normalize_keys
 
+from cc_faice.commons.serialization import dump_print
+from cc_faice.commons.batches import red_batch_hashes, BlueBatchConverter, lazy_blue_batches
+from cc_faice.commons.bundles import BundleWriter, BUNDLE_COMPRESSIONS, GZIP_COMPRESSION, bundle_paths, \
+    check_bundle_compression
+from cc_faice.commons.container_backends import CONTAINER_BACKENDS, DOCKER_BACKEND
+from cc_faice.commons.docker_hosts import DockerHost, DockerHostPool, read_docker_hosts_file, is_local_docker_host
+from cc_faice.commons.engines import container_engine_validation
+from cc_faice.commons.executor import execute_batches, longest_first_order
+from cc_faice.commons.input_cache import InputCache, INPUT_CACHE_DIR, DEFAULT_INPUT_CACHE_SIZE
+from cc_faice.commons.history import BatchHistory, HISTORY_FILE, peak_memory_usage
+from cc_faice.commons.red_cache import RedCache, RED_CACHE_DIR, DEFAULT_RED_CACHE_SIZE, load_validated_red
+from cc_faice.commons.host_slots import HostSlots
+from cc_faice.commons.journal import RunJournal, JOURNAL_FILE
+from cc_faice.commons.results_stream import ResultsStream
+from cc_faice.commons.resources import MemoryAdmissionController, host_memory_budget, DEFAULT_BATCH_RAM, \
+    CpuAllocator, numa_nodes
 from cc_faice.commons.templates import complete_red_templates
-from cc_faice.commons.docker import env_vars, DockerManager
+from cc_faice.commons.docker import env_vars, DockerManager, is_transient_docker_error, ExecutionTimeoutError, \
+    prepare_bind_directory, CONTAINER_USER_ID, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
 
 DESCRIPTION = 'Run an experiment as described in a REDFILE with ccagent red in a container.'
 
 PYTHON_INTERPRETER = 'python3'
 
+DEFAULT_MAX_RETRIES = 3
+RETRY_BACKOFF_BASE = 1
+RETRY_BACKOFF_MAX = 30
+
+STAGED_AGENT_FILE = 'blue_agent.py'
+STAGED_BLUE_FILE = 'blue_file.json'
+
 
 # noinspection PyPep8Naming
 def IntegerSet(s):
@@ -80,6 +113,154 @@ def attach_args(parser):
         help='Use the GPUs with the given GPU_IDS for this execution. GPU_IDS should be a comma separated list of '
              'integers, like --gpu-ids "1,2,3".'
     )
+    parser.add_argument(
+        '--journal', action='store', type=str, metavar='JOURNAL_FILE', nargs='?', const=JOURNAL_FILE,
+        help='Record the state and result of every batch in the sqlite database JOURNAL_FILE as soon as the batch '
+             'completes. If JOURNAL_FILE is omitted, "{}" is used. By default no journal is written.'
+             .format(JOURNAL_FILE)
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='Resume a previous run recorded in the journal given with --journal. Only batches, which are missing in '
+             'the journal or did not succeed, are executed.'
+    )
+    parser.add_argument(
+        '--keep-going', action='store_true',
+        help='Execute all batches, even if some of them fail. Batches failing because of transient docker errors are '
+             'retried.'
+    )
+    parser.add_argument(
+        '--max-retries', action='store', type=int, metavar='MAX_RETRIES', default=DEFAULT_MAX_RETRIES,
+        help='Retry a batch failing because of a transient docker error up to MAX_RETRIES times with --keep-going, '
+             'default is {}.'.format(DEFAULT_MAX_RETRIES)
+    )
+    parser.add_argument(
+        '--batch-timeout', action='store', type=int, metavar='SECONDS',
+        help='Kill the container of a batch, if its execution takes longer than SECONDS. Overrides the batchTimeout '
+             'given in the container settings of the REDFILE.'
+    )
+    parser.add_argument(
+        '--retry-timeout', action='store_true',
+        help='Retry a batch once, if its execution timed out.'
+    )
+    parser.add_argument(
+        '--mount-outputs', action='store_true',
+        help='Bind mount the host outputs directory of each batch into its container instead of copying the output '
+             'files out of the container. All files written to the outputs directory inside the container are kept, '
+             'not only the declared outputs. Cannot be combined with --outputs.'
+    )
+    parser.add_argument(
+        '--bundle-outputs', action='store', type=str, metavar='COMPRESSION', nargs='?', const=GZIP_COMPRESSION,
+        choices=BUNDLE_COMPRESSIONS,
+        help='Write the outputs of each batch to a single compressed tar archive "outputs_<BATCH>.tar.gz" or '
+             '"outputs_<BATCH>.tar.zst" with an index file instead of extracting them into a directory. COMPRESSION is '
+             'one of [{}], default is {}. Use "faice agent bundle" to list or extract single files of a bundle. Cannot '
+             'be combined with --outputs or --mount-outputs.'.format(', '.join(BUNDLE_COMPRESSIONS), GZIP_COMPRESSION)
+    )
+    parser.add_argument(
+        '--mount-agent', action='store_true',
+        help='Bind mount the blue agent and the blue file of each batch read-only into its container instead of '
+             'uploading them. The input and output directories of the container are bind mounted from a temporary '
+             'host directory as well.'
+    )
+    parser.add_argument(
+        '--jobs', action='store', type=int, metavar='JOBS', default=1,
+        help='Execute up to JOBS batches at the same time, default is 1.'
+    )
+    parser.add_argument(
+        '--pipeline', action='store_true',
+        help='Prepare the containers of upcoming batches and retrieve the outputs of finished batches, while other '
+             'batches are executing. At most JOBS batches are executing at the same time.'
+    )
+    parser.add_argument(
+        '--memory-budget', action='store', type=int, metavar='MEMORY_BUDGET',
+        help='Only start a container, if the ram of all running containers including the new one fits into '
+             'MEMORY_BUDGET megabytes. If several containers may run at the same time, the available memory of the '
+             'host according to /proc/meminfo is used by default.'
+    )
+    parser.add_argument(
+        '--default-batch-ram', action='store', type=int, metavar='DEFAULT_BATCH_RAM', default=DEFAULT_BATCH_RAM,
+        help='The ram in megabytes reserved against the memory budget for each batch, if the REDFILE does not specify '
+             'ram, default is {}.'.format(DEFAULT_BATCH_RAM)
+    )
+    parser.add_argument(
+        '--cpuset', action='store_true',
+        help='Assign a disjoint set of cpus to each running container. Cpus of the same numa node are preferred.'
+    )
+    parser.add_argument(
+        '--batch-cpus', action='store', type=int, metavar='BATCH_CPUS',
+        help='The number of cpus assigned to each container with --cpuset. Overrides the cpus given in the container '
+             'settings of the REDFILE. By default the available cpus are split evenly between JOBS containers.'
+    )
+    parser.add_argument(
+        '--docker-pool-size', action='store', type=int, metavar='POOL_SIZE',
+        help='The maximal number of connections kept open to the docker daemon. By default enough connections for '
+             'all concurrently processed batches are kept open.'
+    )
+    parser.add_argument(
+        '--docker-timeout', action='store', type=int, metavar='SECONDS', default=DEFAULT_TIMEOUT,
+        help='The timeout of docker api calls in SECONDS, default is {}.'.format(DEFAULT_TIMEOUT)
+    )
+    parser.add_argument(
+        '--results-stream', action='store', type=str, metavar='FILE',
+        help='Write the result of every batch as a single json line to FILE as soon as the batch completes. If FILE is '
+             '"-", the results are written to stdout. The container results are not included in the debug output.'
+    )
+    parser.add_argument(
+        '--history', action='store', type=str, metavar='HISTORY_FILE', nargs='?', const=HISTORY_FILE,
+        help='Record the duration, peak memory usage and image digest of every batch execution in the sqlite database '
+             'HISTORY_FILE, which is kept across runs. If HISTORY_FILE is omitted, "{}" is used. Use "faice agent '
+             'history" to show the recorded data.'.format(HISTORY_FILE)
+    )
+    parser.add_argument(
+        '--order', action='store', type=str, metavar='ORDER', choices=['index', 'longest-first'], default='index',
+        help='The order in which batches are started as one of [index, longest-first]. With longest-first, batches '
+             'with the longest duration according to --history are started first, which shortens the total execution '
+             'time, if several batches run at the same time. Batches without history are started before all others. '
+             'Default is index.'
+    )
+    parser.add_argument(
+        '--docker-host', action='append', type=str, metavar='DOCKER_HOST',
+        help='Execute batches on the docker daemon with the url DOCKER_HOST, like "tcp://10.0.0.2:2376". May be '
+             'provided multiple times. Each batch is executed on the daemon with the fewest running batches and up to '
+             'JOBS batches are executed on every daemon at the same time. By default the docker daemon configured by '
+             'the environment is used.'
+    )
+    parser.add_argument(
+        '--red-cache', action='store', type=str, metavar='CACHE_DIR', nargs='?', const=RED_CACHE_DIR,
+        help='Cache the parsed and validated REDFILE in CACHE_DIR, so parsing and validation are skipped, if the '
+             'REDFILE did not change. If CACHE_DIR is omitted, "{}" is used. The cache contains the REDFILE including '
+             'all credentials given in it.'.format(RED_CACHE_DIR)
+    )
+    parser.add_argument(
+        '--red-cache-size', action='store', type=int, metavar='MEGABYTES', default=DEFAULT_RED_CACHE_SIZE,
+        help='The maximal size of the REDFILE cache in MEGABYTES. Least recently used REDFILEs are removed from the '
+             'cache, if it exceeds this size, default is {}.'.format(DEFAULT_RED_CACHE_SIZE)
+    )
+    parser.add_argument(
+        '--docker-hosts-file', action='store', type=str, metavar='HOSTS_FILE',
+        help='Read additional docker daemon urls from HOSTS_FILE, one url per line. See --docker-host.'
+    )
+    parser.add_argument(
+        '--container-backend', action='store', type=str, metavar='BACKEND', choices=list(CONTAINER_BACKENDS),
+        default=DOCKER_BACKEND,
+        help='Execute batches with BACKEND as one of [{}]. The local backend executes the blue agent as process on '
+             'this host in a scratch directory instead of a container, which requires the experiment dependencies '
+             'and python3 to be installed on this host. Docker hosts and resource limits are not supported by the '
+             'local backend. Default is {}.'.format(', '.join(CONTAINER_BACKENDS), DOCKER_BACKEND)
+    )
+    parser.add_argument(
+        '--prefetch-inputs', action='store', type=str, metavar='CACHE_DIR', nargs='?', const=INPUT_CACHE_DIR,
+        help='Fetch input files, which are received with the http connector by several batches, only once into '
+             'CACHE_DIR on this host and mount them read-only into the containers. Unchanged files are not fetched '
+             'again by later runs, if the http server supports conditional requests. If CACHE_DIR is omitted, "{}" is '
+             'used.'.format(INPUT_CACHE_DIR)
+    )
+    parser.add_argument(
+        '--input-cache-size', action='store', type=int, metavar='MEGABYTES', default=DEFAULT_INPUT_CACHE_SIZE,
+        help='The maximal size of the input cache in MEGABYTES. Least recently used files are removed from the cache, '
+             'if it exceeds this size, default is {}.'.format(DEFAULT_INPUT_CACHE_SIZE)
+    )
 
 
 def _get_commandline_args():
@@ -99,6 +280,7 @@ def main():
         output_mode = OutputMode.Connectors
     else:
         output_mode = OutputMode.Directory
+    args.container_backend = CONTAINER_BACKENDS[args.container_backend]()
     result = run(**args.__dict__,
                  output_mode=output_mode)
 
@@ -120,6 +302,33 @@ def run(red_file,
         output_mode,
         keyring_service,
         gpu_ids,
+        journal=None,
+        resume=False,
+        keep_going=False,
+        max_retries=DEFAULT_MAX_RETRIES,
+        batch_timeout=None,
+        retry_timeout=False,
+        mount_outputs=False,
+        mount_agent=False,
+        bundle_outputs=None,
+        jobs=1,
+        pipeline=False,
+        memory_budget=None,
+        default_batch_ram=DEFAULT_BATCH_RAM,
+        cpuset=False,
+        batch_cpus=None,
+        docker_pool_size=None,
+        docker_timeout=DEFAULT_TIMEOUT,
+        results_stream=None,
+        history=None,
+        order='index',
+        docker_host=None,
+        docker_hosts_file=None,
+        red_cache=None,
+        red_cache_size=DEFAULT_RED_CACHE_SIZE,
+        container_backend=None,
+        prefetch_inputs=None,
+        input_cache_size=DEFAULT_INPUT_CACHE_SIZE,
         **_
         ):
     """
@@ -136,77 +345,404 @@ def run(red_file,
     :param keyring_service: The keyring service name to use for template substitution
     :param gpu_ids: A list of gpu ids, that should be used. If None all gpus are considered.
     :type gpu_ids: List[int] or None
+    :param journal: The path to the sqlite run journal. If None, no journal is written.
+    :type journal: str or None
+    :param resume: If True, batches that succeeded according to the journal are not executed again
+    :type resume: bool
+    :param keep_going: If True, all batches are executed, even if some of them fail. Batches failing because of
+                       transient docker errors are retried.
+    :type keep_going: bool
+    :param max_retries: The number of retries of a batch failing because of a transient docker error, if keep_going is
+                        set
+    :type max_retries: int
+    :param batch_timeout: The number of seconds after which the execution of a batch is aborted. If None, the
+                          batchTimeout of the container settings is used.
+    :type batch_timeout: int or None
+    :param retry_timeout: If True, a batch is retried once, if its execution timed out
+    :type retry_timeout: bool
+    :param mount_outputs: If True, the host outputs directory of each batch is bind mounted into its container. Only
+                          valid with output_mode Directory.
+    :type mount_outputs: bool
+    :param mount_agent: If True, the blue agent and the blue file are bind mounted into the containers instead of being
+                        uploaded.
+    :type mount_agent: bool
+    :param bundle_outputs: The compression of output bundles. If given, the outputs of each batch are written to a
+                           compressed tar archive with an index instead of a directory. Only valid with output_mode
+                           Directory.
+    :type bundle_outputs: str or None
+    :param jobs: The maximal number of batches executing at the same time
+    :type jobs: int
+    :param pipeline: If True, containers are prepared and outputs are retrieved, while other batches are executing
+    :type pipeline: bool
+    :param memory_budget: The memory in megabytes available for all running containers. If None and several
+                          containers may run at the same time, the available host memory is used.
+    :type memory_budget: int or None
+    :param default_batch_ram: The memory in megabytes reserved for a batch, if ram is not specified in the REDFILE
+    :type default_batch_ram: int
+    :param cpuset: If True, each running container is assigned a disjoint set of cpus
+    :type cpuset: bool
+    :param batch_cpus: The number of cpus assigned to each container, if cpuset is set. If None, the cpus of the
+                       container settings are used or the available cpus are split evenly between the jobs.
+    :type batch_cpus: int or None
+    :param docker_pool_size: The maximal number of connections kept open to the docker daemon. If None, the pool size
+                             is derived from the number of concurrently processed batches.
+    :type docker_pool_size: int or None
+    :param docker_timeout: The timeout of docker api calls in seconds
+    :type docker_timeout: int
+    :param results_stream: The path of a file, to which the result of every batch is written as a json line as soon as
+                           the batch completes, or "-" for stdout. If given, the container results are not kept in
+                           the returned result.
+    :type results_stream: str or None
+    :param history: The path to the sqlite run history, which is kept across runs. If None, no history is written.
+    :type history: str or None
+    :param order: The order in which batches are started. Either "index" or "longest-first", which requires a history.
+    :type order: str
+    :param docker_host: The urls of the docker daemons, which execute the batches. If None and no hosts file is given,
+                        the docker daemon configured by the environment is used.
+    :type docker_host: List[str] or None
+    :param docker_hosts_file: The path to a file containing additional docker daemon urls, one url per line
+    :type docker_hosts_file: str or None
+    :param red_cache: The directory of the REDFILE cache. If None, the REDFILE is parsed and validated without cache.
+    :type red_cache: str or None
+    :param red_cache_size: The maximal size of the REDFILE cache in megabytes
+    :type red_cache_size: int
+    :param container_backend: The backend executing the containers. If None, the docker daemons are used via docker-py.
+    :type container_backend: ContainerBackend or None
+    :param prefetch_inputs: The directory of the input cache. If given, input files received with the http connector by
+                            several batches are fetched once into this directory and bind mounted into the containers.
+    :type prefetch_inputs: str or None
+    :param input_cache_size: The maximal size of the input cache in megabytes
+    :type input_cache_size: int
     """
 
     result = {
         'containers': [],
+        'batches': [],
         'debugInfo': None,
         'state': 'succeeded'
     }
 
     secret_values = None
+    run_journal = None
+    staging_directory = None
+    stream = None
+    batch_history = None
 
     try:
-        red_data = load_and_read(red_file, 'REDFILE')
+        if mount_outputs and output_mode != OutputMode.Directory:
+            raise ValueError('Mounting the outputs directory is only possible, if output connectors are disabled.')
+        if bundle_outputs:
+            if output_mode != OutputMode.Directory or mount_outputs:
+                raise ValueError(
+                    'Output bundles are only possible, if output connectors are disabled and the outputs directory is '
+                    'not mounted.'
+                )
+            check_bundle_compression(bundle_outputs)
 
         # validation
-        red_validation(red_data, output_mode == OutputMode.Directory, container_requirement=True)
-        engine_validation(red_data, 'container', ['docker'], optional=False)
+        ignore_outputs = output_mode == OutputMode.Directory
+        red_data, validation_results = load_validated_red(
+            red_file,
+            [
+                (
+                    'red-container-ignore-outputs' if ignore_outputs else 'red-container',
+                    lambda data: red_validation(data, ignore_outputs, container_requirement=True)
+                ),
+                ('container-engine', container_engine_validation)
+            ],
+            RedCache(red_cache, red_cache_size) if red_cache else None
+        )
+        faice_settings = validation_results['container-engine']
+
+        # hashes are calculated before templates are completed, so they do not depend on credentials, and before the
+        # conversion to blue batches, which completes the batch inputs in place
+        batch_hashes = red_batch_hashes(red_data)
 
         # templates and secrets
         complete_red_templates(red_data, keyring_service, non_interactive)
         secret_values = get_secret_values(red_data)
         normalize_keys(red_data)
 
-        # process red data
-        blue_batches = convert_red_to_blue(red_data)
+        # the batches are converted to blue batches lazily, just before they are executed
+        blue_batch_converter = BlueBatchConverter(red_data)
 
         # docker settings
         docker_image = red_data['container']['settings']['image']['url']
         ram = red_data['container']['settings'].get('ram')
+        if batch_timeout is None:
+            batch_timeout = faice_settings.get('batchTimeout')
         environment = env_vars(preserve_environment)
 
-        # create docker manager
-        docker_manager = DockerManager()
+        if jobs < 1:
+            raise ValueError('The number of jobs must be at least 1, but found {}.'.format(jobs))
+
+        docker_host_urls = list(docker_host or [])
+        if docker_hosts_file:
+            docker_host_urls.extend(read_docker_hosts_file(docker_hosts_file))
+
+        # host paths can only be bind mounted and host resources only be managed for docker daemons on this machine
+        remote_docker_hosts = not all(is_local_docker_host(url) for url in docker_host_urls)
+        if remote_docker_hosts:
+            if mount_outputs or mount_agent or prefetch_inputs:
+                raise ValueError('Bind mounts are only possible, if all docker hosts are reachable via unix sockets.')
+            if cpuset:
+                raise ValueError('Cpusets are only possible, if all docker hosts are reachable via unix sockets.')
+
+        # with pipelining additional workers prepare containers and retrieve outputs, while the execution slots limit
+        # the number of batches executing at the same time
+        docker_host_count = max(1, len(docker_host_urls))
+        concurrent_jobs = jobs * docker_host_count
+        execution_slots = None
+        host_workers = jobs
+        if pipeline:
+            execution_slots = threading.BoundedSemaphore(concurrent_jobs)
+            host_workers = 2 * jobs + 1
+        workers = host_workers * docker_host_count
+
+        # create docker managers, every worker may use several connections at the same time
+        if docker_pool_size is None:
+            docker_pool_size = max(DEFAULT_POOL_SIZE, 2 * host_workers)
+        gpu_settings = red_data['container']['settings'].get('gpus')
+        registry_auth = red_data['container']['settings']['image'].get('auth')
+
+        docker_hosts = None
+        if docker_host_urls:
+            docker_host_list = connect_docker_hosts(
+                docker_host_urls, docker_pool_size, docker_timeout, gpu_settings, gpu_ids,
+                None if disable_pull else docker_image, registry_auth, container_backend
+            )
+            docker_hosts = DockerHostPool(docker_host_list, host_workers)
+            docker_manager = docker_host_list[0].docker_manager
+            gpus = docker_host_list[0].gpus
+        else:
+            docker_manager = DockerManager(
+                pool_size=docker_pool_size, timeout=docker_timeout, backend=container_backend
+            )
 
-        # gpus
-        gpus = get_gpus(docker_manager, red_data['container']['settings'].get('gpus'), gpu_ids)
+            # gpus
+            gpus = get_gpus(docker_manager, gpu_settings, gpu_ids)
 
-        if not disable_pull:
-            registry_auth = red_data['container']['settings']['image'].get('auth')
-            docker_manager.pull(docker_image, auth=registry_auth)
+            if not disable_pull:
+                docker_manager.pull(docker_image, auth=registry_auth)
 
-        if len(blue_batches) == 1:
+        if len(blue_batch_converter) == 1:
             host_outdir = 'outputs'
         else:
             host_outdir = 'outputs_{batch_index}'
 
-        for batch_index, blue_batch in enumerate(blue_batches):
-            container_execution_result = run_blue_batch(
-                blue_batch=blue_batch,
-                docker_manager=docker_manager,
-                docker_image=docker_image,
-                host_outdir=host_outdir,
-                output_mode=output_mode,
-                leave_container=leave_container,
-                batch_index=batch_index,
-                ram=ram,
-                gpus=gpus,
-                environment=environment,
-                insecure=insecure
-            )
+        if journal:
+            run_journal = RunJournal(journal)
+            if not resume:
+                run_journal.clear()
+        elif resume:
+            raise ValueError('A journal is required to resume an execution.')
+
+        if history:
+            batch_history = BatchHistory(history)
+            image_digest = docker_manager.get_image_digest(docker_image)
+
+        batch_order = range(len(blue_batch_converter))
+        if order == 'longest-first':
+            if batch_history is None:
+                raise ValueError('A history is required to order batches by their duration.')
+            batch_order = longest_first_order(batch_hashes, batch_history.predicted_durations(batch_hashes))
+        elif order != 'index':
+            raise ValueError('Unknown batch order "{}".'.format(order))
+
+        if mount_agent:
+            staging_directory = create_staging_directory()
+
+        # inputs shared by several batches are fetched once, before the first container is started
+        input_cache = None
+        if prefetch_inputs:
+            input_cache = InputCache(prefetch_inputs, input_cache_size)
+            input_cache.prefetch(red_data.get('batches') or [red_data], workers)
+
+        # the memory of this host is only used as default budget, if all containers are running on this host
+        memory_controller = None
+        if memory_budget is not None or (workers > 1 and not remote_docker_hosts):
+            if memory_budget is None:
+                memory_budget = host_memory_budget()
+            memory_controller = MemoryAdmissionController(memory_budget, default_batch_ram)
+
+        cpu_allocator = None
+        if cpuset:
+            cpu_allocator = CpuAllocator(numa_nodes())
+            if batch_cpus is None:
+                batch_cpus = faice_settings.get('cpus', max(1, cpu_allocator.cpu_count() // concurrent_jobs))
+
+        # limits the number of containers running on this host across all faice processes
+        host_slots = None
+        if not remote_docker_hosts:
+            host_slots = HostSlots.from_environment()
+
+        if results_stream:
+            stream = ResultsStream(results_stream)
+
+        batch_outcomes = {}
+        container_results = {}
+        result_lock = threading.Lock()
+
+        def complete_batch(batch_outcome, container_result):
+            # when streaming, only the small batch outcome is kept in memory
+            if stream:
+                record = dict(batch_outcome)
+                record['container'] = container_result
+                stream.write(record)
+            elif container_result is not None:
+                container_results[batch_outcome['batchIndex']] = container_result
+
+        def process_batch(batch):
+            batch_index, blue_batch = batch
+            batch_hash = batch_hashes[batch_index]
+
+            batch_outcome = {
+                'batchIndex': batch_index,
+                'state': str(ExecutionResultType.Failed),
+                'attempts': 0,
+                'debugInfo': None
+            }
+            with result_lock:
+                batch_outcomes[batch_index] = batch_outcome
+
+            if resume:
+                journaled_result = run_journal.get_succeeded_result(batch_index, batch_hash)
+                if journaled_result is not None:
+                    with result_lock:
+                        batch_outcome['state'] = journaled_result['state']
+                        complete_batch(batch_outcome, journaled_result)
+                    return
+
+            input_binds = None
+            if input_cache is not None:
+                blue_batch, input_binds = input_cache.localize_batch(blue_batch)
+
+            try:
+                container_execution_result = _run_blue_batch_with_retries(
+                    batch_outcome=batch_outcome,
+                    max_retries=max_retries if keep_going else 0,
+                    retry_timeout=retry_timeout,
+                    blue_batch=blue_batch,
+                    docker_manager=docker_manager,
+                    docker_hosts=docker_hosts,
+                    docker_image=docker_image,
+                    host_outdir=host_outdir,
+                    output_mode=output_mode,
+                    leave_container=leave_container,
+                    batch_index=batch_index,
+                    ram=ram,
+                    gpus=gpus,
+                    environment=environment,
+                    insecure=insecure,
+                    timeout=batch_timeout,
+                    mount_outputs=mount_outputs,
+                    bundle_compression=bundle_outputs,
+                    staging_directory=staging_directory,
+                    input_binds=input_binds,
+                    execution_slot=execution_slots,
+                    memory_controller=memory_controller,
+                    cpu_allocator=cpu_allocator,
+                    cpus=batch_cpus,
+                    host_slots=host_slots
+                )
+            except Exception as e:
+                if not keep_going:
+                    raise
+
+                print_exception(e, secret_values)
+                with result_lock:
+                    batch_outcome['debugInfo'] = exception_format(secret_values)
+                    result['state'] = 'failed'
+                    complete_batch(batch_outcome, None)
+                if run_journal:
+                    run_journal.record(batch_index, batch_hash, batch_outcome['state'], None)
+                return
 
             # handle execution result
-            result['containers'].append(container_execution_result.to_dict())
-            container_execution_result.raise_for_state()
+            container_result = container_execution_result.to_dict()
+            if run_journal:
+                run_journal.record(batch_index, batch_hash, container_result['state'], container_result)
+            if batch_history:
+                batch_history.record(
+                    batch_hash,
+                    docker_image,
+                    image_digest,
+                    container_result['state'],
+                    container_execution_result.duration,
+                    peak_memory_usage(container_execution_result.container_stats)
+                )
+
+            with result_lock:
+                batch_outcome['state'] = container_result['state']
+                complete_batch(batch_outcome, container_result)
+
+                if keep_going and not container_execution_result.successful():
+                    result['state'] = 'failed'
+
+            if not keep_going:
+                container_execution_result.raise_for_state()
+
+        try:
+            execute_batches(lazy_blue_batches(blue_batch_converter, batch_order), process_batch, workers)
+        finally:
+            result['batches'] = [batch_outcomes[i] for i in sorted(batch_outcomes)]
+            result['containers'] = [container_results[i] for i in sorted(container_results)]
     except Exception as e:
         print_exception(e, secret_values)
         result['debugInfo'] = exception_format(secret_values)
         result['state'] = 'failed'
+    finally:
+        if run_journal:
+            run_journal.close()
+        if stream:
+            stream.close()
+        if batch_history:
+            batch_history.close()
+        if staging_directory:
+            shutil.rmtree(staging_directory, ignore_errors=True)
 
     return result
 
 
+def connect_docker_hosts(urls, pool_size, timeout, gpu_settings, gpu_ids, docker_image, registry_auth, backend=None):
+    """
+    Connects to the docker daemons with the given urls, determines the gpus to use on every daemon and pulls the given
+    docker image. The docker daemons are prepared in parallel.
+
+    :param urls: The urls of the docker daemons
+    :type urls: List[str]
+    :param pool_size: The maximal number of connections kept open to every docker daemon
+    :type pool_size: int
+    :param timeout: The timeout of docker api calls in seconds
+    :type timeout: int
+    :param gpu_settings: The gpu settings of the red experiment specifying the required gpus
+    :type gpu_settings: Dict
+    :param gpu_ids: The gpu_ids specified by the user to use for the execution. If None all gpus are considered.
+    :type gpu_ids: List[int] or None
+    :param docker_image: The docker image to pull. If None, no image is pulled.
+    :type docker_image: str or None
+    :param registry_auth: The registry credentials used to pull the docker image
+    :type registry_auth: Dict or None
+    :param backend: The container backend creating the docker clients. If None, docker-py is used.
+    :type backend: ContainerBackend or None
+
+    :return: The prepared docker hosts in the order of the given urls
+    :rtype: List[DockerHost]
+
+    :raise DockerException: If a docker daemon is not reachable
+    :raise InsufficientGPUError: If the GPU settings could not be fulfilled on a docker daemon
+    """
+    def connect_docker_host(url):
+        docker_manager = DockerManager(pool_size=pool_size, timeout=timeout, base_url=url, backend=backend)
+        gpus = get_gpus(docker_manager, gpu_settings, gpu_ids)
+        if docker_image is not None:
+            docker_manager.pull(docker_image, auth=registry_auth)
+        return DockerHost(docker_manager, gpus)
+
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        return list(pool.map(connect_docker_host, urls))
+
+
 def get_gpu_devices(docker_manager, gpu_ids):
     """
     Gets all GPU devices that are available for this execution. If gpu_ids is given, the returned devices are limited to
@@ -307,22 +843,26 @@ def _get_blue_batch_mount_keys(blue_batch):
 class ExecutionResultType(Enum):
     Succeeded = 0
     Failed = 1
+    TimedOut = 2
 
     def __str__(self):
         return self.name.lower()
 
 
 class ContainerExecutionResult:
-    def __init__(self, state, command, container_name, agent_execution_result, agent_std_err, container_stats):
+    def __init__(
+            self, state, command, container_name, agent_execution_result, agent_std_err, container_stats, duration=None
+    ):
         """
         Creates a new Container Execution Result.
 
-        :param state: The state of the agent execution ('failed', 'successful')
+        :param state: The state of the agent execution ('failed', 'successful', 'timedout')
         :param command: The command, that executes the blue agent inside the docker container
         :param container_name: The name of the docker container
         :param agent_execution_result: The parsed json output of the blue agent
         :param agent_std_err: The std err as list of string of the blue agent
         :param container_stats: The stats of the executed container, given as dictionary
+        :param duration: The execution time of the blue agent in seconds
         """
         self.state = state
         self.command = command
@@ -330,6 +870,7 @@ class ContainerExecutionResult:
         self.agent_execution_result = agent_execution_result
         self.agent_std_err = agent_std_err
         self.container_stats = container_stats
+        self.duration = duration
 
     def successful(self):
         return self.state == ExecutionResultType.Succeeded
@@ -346,7 +887,8 @@ class ContainerExecutionResult:
             'containerName': self.container_name,
             'agentStdOut': self.agent_execution_result,
             'agentStdErr': self.agent_std_err,
-            'dockerStats': self.container_stats
+            'dockerStats': self.container_stats,
+            'duration': self.duration
         }
 
     def raise_for_state(self):
@@ -359,6 +901,41 @@ class ContainerExecutionResult:
             raise AgentError(self.agent_std_err)
 
 
+def _run_blue_batch_with_retries(batch_outcome, max_retries, retry_timeout, **kwargs):
+    """
+    Executes run_blue_batch() with the given keyword arguments. If the execution fails because of a transient docker
+    error, it is retried up to max_retries times with an exponential backoff. Failures of the blue agent are not
+    retried. If retry_timeout is set, a timed out execution is retried once.
+
+    :param batch_outcome: The outcome dictionary of the batch. Its attempts counter is incremented for every execution.
+    :type batch_outcome: Dict
+    :param max_retries: The maximal number of retries
+    :type max_retries: int
+    :param retry_timeout: If True, a timed out execution is retried once
+    :type retry_timeout: bool
+    :param kwargs: The keyword arguments for run_blue_batch()
+
+    :return: The container result of the last attempt
+    :rtype: ContainerExecutionResult
+    """
+    timeout_retried = False
+    while True:
+        batch_outcome['attempts'] += 1
+        try:
+            container_execution_result = run_blue_batch(**kwargs)
+        except Exception as e:
+            if batch_outcome['attempts'] > max_retries or not is_transient_docker_error(e):
+                raise
+        else:
+            if container_execution_result.state != ExecutionResultType.TimedOut or not retry_timeout \
+                    or timeout_retried:
+                return container_execution_result
+            timeout_retried = True
+            continue
+
+        time.sleep(min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (batch_outcome['attempts'] - 1)))
+
+
 def run_blue_batch(blue_batch,
                    docker_manager,
                    docker_image,
@@ -369,7 +946,18 @@ def run_blue_batch(blue_batch,
                    ram,
                    gpus,
                    environment,
-                   insecure):
+                   insecure,
+                   timeout=None,
+                   mount_outputs=False,
+                   bundle_compression=None,
+                   staging_directory=None,
+                   input_binds=None,
+                   execution_slot=None,
+                   memory_controller=None,
+                   cpu_allocator=None,
+                   cpus=None,
+                   host_slots=None,
+                   docker_hosts=None):
     """
     Executes an blue agent inside a docker container that takes the given blue batch as argument.
 
@@ -387,78 +975,397 @@ def run_blue_batch(blue_batch,
     :param gpus: The gpus to use for this batch execution
     :param environment: The environment to use for the docker container
     :param insecure: Allow insecure capabilities
+    :param timeout: The number of seconds after which the execution of the blue agent is aborted and the container is
+                    killed. If None, the execution is not limited in time.
+    :type timeout: int or None
+    :param mount_outputs: If True, the host outputs directory is bind mounted to the outputs directory of the container
+                          and the output files are not copied out of the container afterwards.
+    :type mount_outputs: bool
+    :param bundle_compression: If given, the output files are written to a bundle with this compression instead of the
+                               host outputs directory
+    :type bundle_compression: str or None
+    :param staging_directory: A staging directory created by create_staging_directory(). If given, the blue agent and
+                              the blue file are bind mounted into the container instead of being uploaded.
+    :type staging_directory: str or None
+    :param input_binds: Additional binds mounting cached input files into the container
+    :type input_binds: Dict[str, Dict[str, str]] or None
+    :param execution_slot: A semaphore, which is held while the blue agent is executed. The container is prepared
+                           before and the outputs are retrieved after the semaphore is held, so these stages of
+                           different batches can overlap with the execution of another batch.
+    :type execution_slot: threading.Semaphore or None
+    :param memory_controller: If given, the ram of this batch is reserved with this controller before the container
+                              is created and released after the container was removed
+    :type memory_controller: MemoryAdmissionController or None
+    :param cpu_allocator: If given, the number of cpus given by cpus is allocated with this allocator while the blue
+                          agent is executed and assigned to the container as cpuset
+    :type cpu_allocator: CpuAllocator or None
+    :param cpus: The number of cpus to allocate with cpu_allocator
+    :type cpus: int or None
+    :param host_slots: If given, a host slot is acquired before the container is created and released after the
+                       container was removed
+    :type host_slots: HostSlots or None
+    :param docker_hosts: If given, a docker host is acquired from this pool and the batch is executed on this host
+                         with its gpus instead of using docker_manager and gpus
+    :type docker_hosts: DockerHostPool or None
     :return: A container result
     :rtype: ContainerExecutionResult
     """
+    with ExitStack() as reservations:
+        if memory_controller is not None:
+            reservations.enter_context(memory_controller.reserve(ram))
+
+        if host_slots is not None:
+            reservations.enter_context(host_slots.acquire())
+
+        if docker_hosts is not None:
+            docker_host = reservations.enter_context(docker_hosts.acquire())
+            docker_manager = docker_host.docker_manager
+            gpus = docker_host.gpus
+
+        execution = BlueBatchExecution(
+            blue_batch=blue_batch,
+            docker_manager=docker_manager,
+            docker_image=docker_image,
+            host_outdir=host_outdir,
+            output_mode=output_mode,
+            leave_container=leave_container,
+            batch_index=batch_index,
+            ram=ram,
+            gpus=gpus,
+            environment=environment,
+            insecure=insecure,
+            timeout=timeout,
+            mount_outputs=mount_outputs,
+            bundle_compression=bundle_compression,
+            staging_directory=staging_directory,
+            input_binds=input_binds
+        )
+
+        try:
+            execution.prepare()
+
+            # cpus are only allocated for the execution, so containers prepared by pipeline workers do not hold cpus
+            with ExitStack() as execution_stage:
+                if execution_slot is not None:
+                    execution_stage.enter_context(execution_slot)
+                if cpu_allocator is not None:
+                    execution.assign_cpus(execution_stage.enter_context(cpu_allocator.allocate(cpus)))
+                execution.execute()
+
+            return execution.finish()
+        except Exception:
+            # do not leave a running container behind, if the batch could not be executed
+            execution.discard()
+            raise
+
+
+class BlueBatchExecution:
+    def __init__(self,
+                 blue_batch,
+                 docker_manager,
+                 docker_image,
+                 host_outdir,
+                 output_mode,
+                 leave_container,
+                 batch_index,
+                 ram,
+                 gpus,
+                 environment,
+                 insecure,
+                 timeout=None,
+                 mount_outputs=False,
+                 bundle_compression=None,
+                 staging_directory=None,
+                 input_binds=None):
+        """
+        Creates the execution of a blue batch inside a docker container. The execution is split into three stages,
+        which have to be called in order: prepare(), execute() and finish(). If one of the stages fails, discard()
+        has to be called. See run_blue_batch() for a description of the arguments.
+        """
+        self._blue_batch = blue_batch
+        self._docker_manager = docker_manager
+        self._docker_image = docker_image
+        self._output_mode = output_mode
+        self._leave_container = leave_container
+        self._ram = ram
+        self._gpus = gpus
+        self._environment = environment
+        self._timeout = timeout
+        self._mount_outputs = mount_outputs
+        self._bundle_compression = bundle_compression
+        self._staging_directory = staging_directory
+        self._input_binds = input_binds
+
+        self._container_name = str(uuid4())
+        self._command = _create_blue_agent_command()
+        if output_mode == OutputMode.Connectors:
+            self._command.append('--outputs')
+
+        self._is_mounting = define_is_mounting(blue_batch, insecure)
+        self._abs_host_outdir = os.path.abspath(host_outdir.format(batch_index=batch_index))
+
+        self._container = None
+        self._batch_staging_directory = None
+        self._agent_execution_result = None
+        self._timeout_error = None
+        self._duration = None
+
+    def prepare(self):
+        """
+        Creates and starts the container of this batch and provides the blue agent and the blue file inside the
+        container.
+
+        :raise JobExecutionError: If the fuse permissions could not be set
+        """
+        binds = {}
+        if self._mount_outputs:
+            prepare_bind_directory(self._abs_host_outdir)
+            binds[self._abs_host_outdir] = {'bind': CONTAINER_OUTPUT_DIR, 'mode': 'rw'}
+
+        if self._staging_directory:
+            self._batch_staging_directory = os.path.join(self._staging_directory, self._container_name)
+            binds.update(_stage_blue_batch(
+                self._blue_batch, self._staging_directory, self._batch_staging_directory, not self._mount_outputs
+            ))
+
+        if self._input_binds:
+            binds.update(self._input_binds)
+
+        self._container = self._docker_manager.create_container(
+            name=self._container_name,
+            image=self._docker_image,
+            working_directory=CONTAINER_OUTPUT_DIR,
+            ram=self._ram,
+            gpus=self._gpus,
+            environment=self._environment,
+            enable_fuse=self._is_mounting,
+            binds=binds or None
+        )
 
-    container_name = str(uuid4())
+        if not self._batch_staging_directory:
+            with create_batch_archive(self._blue_batch) as blue_archive:
+                self._docker_manager.put_archive(self._container, blue_archive)
+
+        # hack to make fuse working under osx
+        if self._is_mounting:
+            set_osx_fuse_permissions_command = [
+                'chmod',
+                'o+rw',
+                '/dev/fuse'
+            ]
+            osx_fuse_result = self._docker_manager.run_command(
+                self._container,
+                set_osx_fuse_permissions_command,
+                user='root',
+                work_dir='/'
+            )
+            if osx_fuse_result.return_code != 0:
+                raise JobExecutionError(
+                   'Failed to set fuse permissions (exitcode: {}). Failed with the following message:\n{}\n{}'
+                   .format(osx_fuse_result.return_code, osx_fuse_result.get_stdout(), osx_fuse_result.get_stderr())
+                )
 
-    command = _create_blue_agent_command()
+    def assign_cpus(self, cpuset_cpus):
+        """
+        Restricts the prepared container to the given cpus.
 
-    if output_mode == OutputMode.Connectors:
-        command.append('--outputs')
+        :param cpuset_cpus: The cpus in which the container is allowed to execute, given as cpu list like "0-3,8"
+        :type cpuset_cpus: str
+        """
+        self._docker_manager.set_cpuset(self._container, cpuset_cpus)
 
-    is_mounting = define_is_mounting(blue_batch, insecure)
+    def execute(self):
+        """
+        Executes the blue agent inside the prepared container. If the execution times out, the container is killed.
+        """
+        start = time.monotonic()
+        try:
+            self._agent_execution_result = self._docker_manager.run_command(
+                self._container, self._command, user='cc', timeout=self._timeout
+            )
+        except ExecutionTimeoutError as e:
+            self._timeout_error = e
+        self._duration = time.monotonic() - start
 
-    container = docker_manager.create_container(
-        name=container_name,
-        image=docker_image,
-        working_directory=CONTAINER_OUTPUT_DIR,
-        ram=ram,
-        gpus=gpus,
-        environment=environment,
-        enable_fuse=is_mounting,
-    )
+    def finish(self):
+        """
+        Retrieves the outputs of the executed blue agent and stops the container.
 
-    with create_batch_archive(blue_batch) as blue_archive:
-        docker_manager.put_archive(container, blue_archive)
+        :return: The result of this batch execution
+        :rtype: ContainerExecutionResult
 
-    # hack to make fuse working under osx
-    if is_mounting:
-        set_osx_fuse_permissions_command = [
-            'chmod',
-            'o+rw',
-            '/dev/fuse'
-        ]
-        osx_fuse_result = docker_manager.run_command(
-            container,
-            set_osx_fuse_permissions_command,
-            user='root',
-            work_dir='/'
-        )
-        if osx_fuse_result.return_code != 0:
-            raise JobExecutionError(
-               'Failed to set fuse permissions (exitcode: {}). Failed with the following message:\n{}\n{}'
-               .format(osx_fuse_result.return_code, osx_fuse_result.get_stdout(), osx_fuse_result.get_stderr())
+        :raise AgentError: If the output of the blue agent could not be parsed or an output file could not be retrieved
+        """
+        if self._timeout_error is not None:
+            self._stop_container()
+            return ContainerExecutionResult(
+                ExecutionResultType.TimedOut,
+                self._command,
+                self._container_name,
+                None,
+                str(self._timeout_error),
+                None,
+                self._duration
             )
 
-    agent_execution_result = docker_manager.run_command(container, command, user='cc')
+        blue_agent_result = self._agent_execution_result.get_agent_result_dict()
+
+        if blue_agent_result['state'] == 'succeeded':
+            state = ExecutionResultType.Succeeded
+
+            # create outputs directory
+            if self._output_mode == OutputMode.Directory and not self._mount_outputs:
+                if self._bundle_compression:
+                    _handle_bundled_outputs(
+                        self._abs_host_outdir, blue_agent_result['outputs'], self._container, self._docker_manager,
+                        self._bundle_compression
+                    )
+                else:
+                    _handle_directory_outputs(
+                        self._abs_host_outdir, blue_agent_result['outputs'], self._container, self._docker_manager
+                    )
+        else:
+            state = ExecutionResultType.Failed
 
-    blue_agent_result = agent_execution_result.get_agent_result_dict()
+        if self._batch_staging_directory:
+            _clear_staged_directories(self._container, self._docker_manager, not self._mount_outputs)
 
-    if blue_agent_result['state'] == 'succeeded':
-        state = ExecutionResultType.Succeeded
+        self._stop_container()
 
-        # create outputs directory
-        if output_mode == OutputMode.Directory:
-            abs_host_outdir = os.path.abspath(host_outdir.format(batch_index=batch_index))
-            _handle_directory_outputs(abs_host_outdir, blue_agent_result['outputs'], container, docker_manager)
-    else:
-        state = ExecutionResultType.Failed
+        return ContainerExecutionResult(
+            state,
+            self._command,
+            self._container_name,
+            blue_agent_result,
+            self._agent_execution_result.get_stderr(),
+            self._agent_execution_result.get_stats(),
+            self._duration
+        )
+
+    def discard(self):
+        """
+        Stops and removes the container and the staged files of this batch after a failed stage. Errors are ignored,
+        because the docker daemon may not be reachable in this situation and the original error is more relevant.
+        """
+        if self._container is not None:
+            _discard_container(self._container, self._leave_container)
+        self._remove_batch_staging_directory()
 
-    container.stop()
+    def _stop_container(self):
+        self._container.stop()
 
-    if not leave_container:
-        container.remove()
+        if not self._leave_container:
+            self._container.remove()
 
-    return ContainerExecutionResult(
-        state,
-        command,
-        container_name,
-        blue_agent_result,
-        agent_execution_result.get_stderr(),
-        agent_execution_result.get_stats()
-    )
+        self._remove_batch_staging_directory()
+
+    def _remove_batch_staging_directory(self):
+        if self._batch_staging_directory:
+            shutil.rmtree(self._batch_staging_directory, ignore_errors=True)
+
+
+def create_staging_directory():
+    """
+    Creates a temporary host directory, which contains a copy of the blue agent. The blue files and the input and
+    output directories of the batches are created in subdirectories of this directory, if they are bind mounted into
+    the containers instead of being uploaded.
+
+    :return: The path to the created staging directory
+    :rtype: str
+    """
+    staging_directory = tempfile.mkdtemp(prefix='faice_')
+    os.chmod(staging_directory, 0o755)
+
+    staged_agent_path = os.path.join(staging_directory, STAGED_AGENT_FILE)
+    shutil.copyfile(get_blue_agent_host_path(), staged_agent_path)
+    os.chmod(staged_agent_path, 0o644)
+
+    return staging_directory
+
+
+def _stage_blue_batch(blue_batch, staging_directory, batch_staging_directory, stage_outputs):
+    """
+    Writes the blue file of the given batch and creates its input directory and, if stage_outputs is set, its output
+    directory in the given batch staging directory.
+
+    :param blue_batch: The blue batch to stage
+    :type blue_batch: Dict
+    :param staging_directory: The staging directory created by create_staging_directory()
+    :type staging_directory: str
+    :param batch_staging_directory: The directory to create for this batch
+    :type batch_staging_directory: str
+    :param stage_outputs: If True, the output directory of the container is bind mounted from the batch staging
+                          directory
+    :type stage_outputs: bool
+
+    :return: The binds to use for the container of this batch
+    :rtype: Dict[str, Dict[str, str]]
+    """
+    os.mkdir(batch_staging_directory)
+    os.chmod(batch_staging_directory, 0o755)
+
+    blue_file_path = os.path.join(batch_staging_directory, STAGED_BLUE_FILE)
+    with open(blue_file_path, 'w') as blue_file:
+        json.dump(blue_batch, blue_file)
+    os.chmod(blue_file_path, 0o644)
+
+    inputs_directory = os.path.join(batch_staging_directory, 'inputs')
+    prepare_bind_directory(inputs_directory)
+
+    binds = {
+        os.path.join(staging_directory, STAGED_AGENT_FILE): {'bind': CONTAINER_AGENT_PATH, 'mode': 'ro'},
+        blue_file_path: {'bind': CONTAINER_BLUE_FILE_PATH, 'mode': 'ro'},
+        inputs_directory: {'bind': CONTAINER_INPUT_DIR, 'mode': 'rw'}
+    }
+
+    if stage_outputs:
+        outputs_directory = os.path.join(batch_staging_directory, 'outputs')
+        prepare_bind_directory(outputs_directory)
+        binds[outputs_directory] = {'bind': CONTAINER_OUTPUT_DIR, 'mode': 'rw'}
+
+    return binds
+
+
+def _clear_staged_directories(container, docker_manager, outputs_staged):
+    """
+    Removes the files, which were created by the cc user in the staged input and output directories. If faice does not
+    run as root or with the user id of the cc user, it is not allowed to remove these files itself.
+
+    :param container: The running container of the batch
+    :type container: Container
+    :param docker_manager: The docker manager to use
+    :type docker_manager: DockerManager
+    :param outputs_staged: If True, the output directory of the container was staged and is cleared as well
+    :type outputs_staged: bool
+    """
+    if os.geteuid() in (0, CONTAINER_USER_ID):
+        return
+
+    staged_directories = [CONTAINER_INPUT_DIR]
+    if outputs_staged:
+        staged_directories.append(CONTAINER_OUTPUT_DIR)
+
+    # the directories are bind mounted, so only their content can be removed
+    command = ['sh', '-c', ' '.join('rm -rf {0}/* {0}/.[!.]*'.format(d) for d in staged_directories)]
+    docker_manager.run_command(container, command, user='cc', work_dir='/')
+
+
+def _discard_container(container, leave_container):
+    """
+    Stops and removes the given container after a failed batch execution. Errors are ignored, because the docker
+    daemon may not be reachable in this situation and the original error is more relevant.
+
+    :param container: The container to discard
+    :type container: Container
+    :param leave_container: If True, the container is stopped but not removed
+    :type leave_container: bool
+    """
+    try:
+        container.stop()
+        if not leave_container:
+            container.remove()
+    except (DockerException, RequestsConnectionError):
+        pass
 
 
 def _handle_directory_outputs(host_outdir, outputs, container, docker_manager):
@@ -480,6 +1387,54 @@ def _handle_directory_outputs(host_outdir, outputs, container, docker_manager):
 
     os.makedirs(host_outdir, exist_ok=True)
 
+    for output_key, file_path in output_file_paths(outputs):
+        try:
+            file_archive = docker_manager.get_file_archive(container, file_path)
+        except AgentError as e:
+            raise output_retrieval_error(output_key, file_path, e)
+
+        file_archive.extractall(host_outdir)
+        file_archive.close()
+
+
+def _handle_bundled_outputs(host_outdir, outputs, container, docker_manager, compression):
+    """
+    Streams the files given in outputs from the docker container into a compressed output bundle, which replaces the
+    host_outdir. The bundle and its index are written next to the path of host_outdir.
+
+    :param host_outdir: The absolute path to the output directory of the host, which is replaced by the bundle
+    :type host_outdir: str
+    :param outputs: A dictionary mapping output_keys to file information.
+    :type outputs: Dict[str, Dict]
+    :param container: The container to get the outputs from
+    :type container: Container
+    :param docker_manager: The docker manager from which to retrieve the files
+    :type docker_manager: DockerManager
+    :param compression: The compression of the bundle
+    :type compression: str
+
+    :raise AgentError: If a file given in outputs could not be retrieved by the docker manager
+    """
+    bundle_path, _ = bundle_paths(host_outdir, compression)
+
+    with BundleWriter(bundle_path, compression) as bundle:
+        for output_key, file_path in output_file_paths(outputs):
+            try:
+                bundle.add_archive(docker_manager.stream_file_archive(container, file_path))
+            except AgentError as e:
+                raise output_retrieval_error(output_key, file_path, e)
+
+
+def output_file_paths(outputs):
+    """
+    Yields the output files found by the blue agent.
+
+    :param outputs: A dictionary mapping output_keys to file information as given by the blue agent
+    :type outputs: Dict[str, Dict]
+
+    :return: Tuples of output key and the absolute path of the output file inside the docker container
+    :rtype: Iterator[Tuple[str, str]]
+    """
     for output_key, output_file_information in outputs.items():
         container_file_path = output_file_information['path']
 
@@ -487,22 +1442,19 @@ def _handle_directory_outputs(host_outdir, outputs, container, docker_manager):
         if container_file_path is None:
             continue
 
-        file_path = os.path.join(CONTAINER_OUTPUT_DIR, container_file_path)
+        yield output_key, os.path.join(CONTAINER_OUTPUT_DIR, container_file_path)
 
-        if not file_path:
-            continue
-
-        try:
-            file_archive = docker_manager.get_file_archive(container, file_path)
-        except AgentError as e:
-            raise AgentError(
-                'Could not retrieve output file "{}" with path "{}" from docker container. '
-                'Failed with the following message:\n{}'
-                .format(output_key, file_path, str(e))
-            )
 
-        file_archive.extractall(host_outdir)
-        file_archive.close()
+def output_retrieval_error(output_key, file_path, error):
+    """
+    :return: The error raised, if the given output file could not be retrieved from the docker container
+    :rtype: AgentError
+    """
+    return AgentError(
+        'Could not retrieve output file "{}" with path "{}" from docker container. '
+        'Failed with the following message:\n{}'
+        .format(output_key, file_path, str(error))
+    )
 
 
 def define_is_mounting(blue_batch, insecure):
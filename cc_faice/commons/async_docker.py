@@ -0,0 +1,552 @@
+"""
+An asyncio counterpart of the DockerManager operations used to execute batches. It talks to the docker engine api over
+the unix socket of the docker daemon with a minimal HTTP/1.1 client, so waiting for a container does not block a
+thread. Containers are configured by the same arguments as the containers of DockerManager.
+"""
+import asyncio
+import base64
+import io
+import json
+import os
+import struct
+import tarfile
+from urllib.parse import urlencode
+
+from docker.models.containers import _create_container_args
+from docker.types import ContainerConfig, DeviceRequest
+
+from cc_core.commons.exceptions import AgentError
+from cc_core.commons.gpu_info import set_nvidia_environment_variables
+
+from cc_faice.commons.docker import AgentExecutionResult, ExecutionTimeoutError, container_arguments, \
+    DEFAULT_TIMEOUT, KILL_GRACE_PERIOD
+
+DEFAULT_DOCKER_SOCKET = '/var/run/docker.sock'
+UNIX_SCHEME = 'unix://'
+
+# the docker engine api version of docker 20.10
+API_VERSION = '1.41'
+
+NVIDIA_DOCKER_RUNTIME = 'nvidia'
+
+# seconds a container is given to stop, before it is killed, like the default of docker-py
+STOP_TIMEOUT = 10
+
+READ_SIZE = 64 * 1024
+EXEC_FRAME_HEADER = struct.Struct('>BxxxL')
+EXEC_STDOUT = 1
+EXEC_STDERR = 2
+
+
+class AsyncDockerError(Exception):
+    def __init__(self, message, status=None):
+        """
+        An error returned by the docker daemon or raised while communicating with it.
+
+        :param message: The error message
+        :type message: str
+        :param status: The HTTP status code of the response or None, if no response was received
+        :type status: int or None
+        """
+        super().__init__(message)
+        self.status = status
+
+
+def docker_socket_path():
+    """
+    Returns the path of the docker socket as configured by the environment variable DOCKER_HOST.
+
+    :rtype: str
+
+    :raise ValueError: If DOCKER_HOST does not refer to a unix socket
+    """
+    docker_host = os.environ.get('DOCKER_HOST')
+    if not docker_host:
+        return DEFAULT_DOCKER_SOCKET
+    if not docker_host.startswith(UNIX_SCHEME):
+        raise ValueError(
+            'The asyncio docker client only supports unix sockets, but DOCKER_HOST is "{}".'.format(docker_host)
+        )
+    return docker_host[len(UNIX_SCHEME):]
+
+
+def _container_config(image, command, arguments, api_version):
+    """
+    Converts the given arguments of docker.DockerClient.containers.create() into the body of the docker engine api call
+    creating a container. The conversion of docker-py is used, so the body equals the one sent by DockerManager.
+
+    :param arguments: The arguments as returned by container_arguments() without the name of the container
+    :type arguments: Dict[str, Any]
+
+    :rtype: Dict
+    """
+    arguments = dict(arguments, image=image, command=command, version=api_version)
+    return ContainerConfig(api_version, **_create_container_args(arguments))
+
+
+def _split_image(image):
+    """
+    Splits the given image url into repository and tag like the docker command line client does.
+
+    :rtype: Tuple[str, str or None]
+    """
+    if '@' in image:
+        return image, None
+    repository, separator, tag = image.rpartition(':')
+    if not separator or '/' in tag:
+        return image, 'latest'
+    return repository, tag
+
+
+class _Response:
+    def __init__(self, status, reason, headers, reader, writer):
+        """
+        A HTTP response, whose body has not been read yet. The connection is closed, when the body was read completely
+        or close() is called.
+        """
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._reader = reader
+        self._writer = writer
+
+        self._chunked = headers.get('transfer-encoding', '').lower() == 'chunked'
+        self._remaining = None
+        if 'content-length' in headers:
+            self._remaining = int(headers['content-length'])
+        if status in (204, 304):
+            self._remaining = 0
+        self._chunk_remaining = 0
+        self._finished = False
+
+    async def read_chunk(self):
+        """
+        :return: The next part of the body or b'', if the body was read completely
+        :rtype: bytes
+        """
+        if self._finished:
+            return b''
+
+        if self._chunked:
+            if self._chunk_remaining == 0:
+                size_line = await self._reader.readline()
+                chunk_size = int(size_line.split(b';')[0].strip() or b'0', 16)
+                if chunk_size == 0:
+                    # skip the trailer
+                    while (await self._reader.readline()).strip():
+                        pass
+                    self.close()
+                    return b''
+                self._chunk_remaining = chunk_size
+
+            data = await self._reader.read(min(READ_SIZE, self._chunk_remaining))
+            if not data:
+                raise AsyncDockerError('Connection to docker daemon closed unexpectedly.')
+            self._chunk_remaining -= len(data)
+            if self._chunk_remaining == 0:
+                await self._reader.readexactly(2)
+            return data
+
+        if self._remaining is not None:
+            if self._remaining == 0:
+                self.close()
+                return b''
+            data = await self._reader.read(min(READ_SIZE, self._remaining))
+            if not data:
+                raise AsyncDockerError('Connection to docker daemon closed unexpectedly.')
+            self._remaining -= len(data)
+            return data
+
+        # the body ends with the connection
+        data = await self._reader.read(READ_SIZE)
+        if not data:
+            self.close()
+        return data
+
+    async def read(self):
+        """
+        :return: The complete body
+        :rtype: bytes
+        """
+        body = bytearray()
+        while True:
+            data = await self.read_chunk()
+            if not data:
+                return bytes(body)
+            body.extend(data)
+
+    async def read_json(self):
+        body = await self.read()
+        if not body:
+            return None
+        return json.loads(body.decode('utf-8'))
+
+    def close(self):
+        self._finished = True
+        self._writer.close()
+
+
+class _BodyStream:
+    """
+    An asynchronous iterator over the parts of a response body.
+    """
+    def __init__(self, response):
+        self._response = response
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        data = await self._response.read_chunk()
+        if not data:
+            raise StopAsyncIteration
+        return data
+
+    def close(self):
+        self._response.close()
+
+
+class AsyncDockerManager:
+    def __init__(self, socket_path=None, timeout=DEFAULT_TIMEOUT, api_version=API_VERSION):
+        """
+        Creates a new AsyncDockerManager. Every api call uses its own connection to the docker socket, so any number of
+        operations may be executed concurrently.
+
+        :param socket_path: The path of the docker socket. If None, the socket is configured by DOCKER_HOST.
+        :type socket_path: str or None
+        :param timeout: The timeout of docker api calls in seconds. Executions of commands are limited separately.
+        :type timeout: int or float
+        :param api_version: The docker engine api version to use
+        :type api_version: str
+        """
+        if socket_path is None:
+            socket_path = docker_socket_path()
+        self.socket_path = socket_path
+        self._timeout = timeout
+        self._api_version = api_version
+        self._runtimes = None
+
+    async def _open_response(self, method, path, params=None, body=None, headers=None):
+        """
+        Sends a request to the docker daemon and reads the status line and headers of the response.
+
+        :param body: The request body. Dictionaries and lists are sent as json.
+        :type body: bytes or Dict or List or None
+
+        :rtype: _Response
+        """
+        request_headers = {'Host': 'docker', 'Connection': 'close'}
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+            request_headers['Content-Type'] = 'application/json'
+        if body is not None:
+            request_headers['Content-Length'] = str(len(body))
+        request_headers.update(headers or {})
+
+        target = '/v{}{}'.format(self._api_version, path)
+        if params:
+            target += '?' + urlencode({key: value for key, value in params.items() if value is not None})
+
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=READ_SIZE * 4)
+        except OSError as e:
+            raise AsyncDockerError(
+                'Could not connect to docker socket "{}". Is the docker daemon running?\n{}'
+                .format(self.socket_path, str(e))
+            )
+
+        try:
+            head = '{} {} HTTP/1.1\r\n'.format(method, target)
+            head += ''.join('{}: {}\r\n'.format(key, value) for key, value in request_headers.items())
+            writer.write((head + '\r\n').encode('latin-1'))
+            if body:
+                writer.write(body)
+            await writer.drain()
+
+            status_line = (await reader.readline()).decode('latin-1')
+            parts = status_line.split(' ', 2)
+            if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+                raise AsyncDockerError('Invalid response from docker daemon: "{}"'.format(status_line.strip()))
+            status = int(parts[1])
+            reason = parts[2].strip() if len(parts) > 2 else ''
+
+            response_headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1')
+                if line in ('\r\n', '\n', ''):
+                    break
+                key, _, value = line.partition(':')
+                response_headers[key.strip().lower()] = value.strip()
+        except BaseException:
+            writer.close()
+            raise
+
+        response = _Response(status, reason, response_headers, reader, writer)
+        if status >= 400:
+            message = await response.read()
+            try:
+                message = json.loads(message.decode('utf-8'))['message']
+            except (ValueError, KeyError, TypeError):
+                message = message.decode('utf-8', errors='replace') or reason
+            raise AsyncDockerError('{} {}: {}'.format(method, path, message), status)
+        return response
+
+    async def _request(self, method, path, params=None, body=None, headers=None):
+        """
+        Executes a docker api call within the timeout of this docker manager.
+
+        :return: The parsed json body of the response or None, if the body is empty
+        """
+        async def request():
+            response = await self._open_response(method, path, params, body, headers)
+            return await response.read_json()
+
+        try:
+            return await asyncio.wait_for(request(), self._timeout)
+        except asyncio.TimeoutError:
+            raise AsyncDockerError('{} {} did not respond within {} seconds.'.format(method, path, self._timeout))
+
+    async def info(self):
+        """
+        :return: The information about the docker daemon as given by "docker info"
+        :rtype: Dict
+        """
+        info = await self._request('GET', '/info')
+        self._runtimes = info.get('Runtimes') or {}
+        return info
+
+    async def pull(self, image, auth=None):
+        """
+        Pulls the given image.
+
+        :param image: The image url
+        :type image: str
+        :param auth: The registry credentials as dictionary with username and password
+        :type auth: Dict or None
+
+        :raise AsyncDockerError: If the image could not be pulled
+        """
+        repository, tag = _split_image(image)
+        headers = {}
+        if auth:
+            headers['X-Registry-Auth'] = base64.urlsafe_b64encode(json.dumps(auth).encode('utf-8')).decode('ascii')
+
+        response = await self._open_response(
+            'POST', '/images/create', params={'fromImage': repository, 'tag': tag}, headers=headers
+        )
+
+        # the progress is reported as json lines, which contain errors occurring during the pull
+        for line in (await response.read()).splitlines():
+            if not line.strip():
+                continue
+            progress = json.loads(line.decode('utf-8'))
+            if 'error' in progress:
+                raise AsyncDockerError('Could not pull image "{}": {}'.format(image, progress['error']))
+
+    async def create_container(
+            self,
+            name,
+            image,
+            ram,
+            working_directory,
+            gpus=None,
+            environment=None,
+            enable_fuse=False,
+            binds=None,
+            cpuset_cpus=None
+    ):
+        """
+        Creates and starts a docker container like DockerManager.create_container() does.
+
+        :return: The id of the created container
+        :rtype: str
+        """
+        environment = dict(environment or {})
+
+        arguments = container_arguments(
+            name=name,
+            ram=ram,
+            working_directory=working_directory,
+            environment=environment,
+            enable_fuse=enable_fuse,
+            binds=binds,
+            cpuset_cpus=cpuset_cpus
+        )
+
+        if gpus:
+            gpu_ids = [gpu.device_id for gpu in gpus]
+            set_nvidia_environment_variables(environment, gpu_ids)
+            if self._runtimes is None:
+                await self.info()
+            if NVIDIA_DOCKER_RUNTIME in self._runtimes:
+                arguments['runtime'] = NVIDIA_DOCKER_RUNTIME
+            else:
+                arguments['device_requests'] = [DeviceRequest(
+                    driver='nvidia', device_ids=[str(gpu_id) for gpu_id in gpu_ids], capabilities=[['gpu']]
+                )]
+
+        name = arguments.pop('name')
+        config = _container_config(image, '/bin/sh', arguments, self._api_version)
+
+        created = await self._request('POST', '/containers/create', params={'name': name}, body=config)
+        container_id = created['Id']
+        await self._request('POST', '/containers/{}/start'.format(container_id))
+        return container_id
+
+    async def put_archive(self, container_id, archive):
+        """
+        Inserts the given tar archive into the root directory of the container.
+
+        :param container_id: The id of the container
+        :type container_id: str
+        :param archive: The tar archive
+        :type archive: bytes
+        """
+        await self._request(
+            'PUT', '/containers/{}/archive'.format(container_id), params={'path': '/'}, body=archive,
+            headers={'Content-Type': 'application/x-tar'}
+        )
+
+    async def _exec(self, container_id, command, user, work_dir):
+        exec_config = {
+            'Cmd': command,
+            'User': user,
+            'WorkingDir': work_dir,
+            'AttachStdout': True,
+            'AttachStderr': True,
+            'Tty': False
+        }
+        created = await self._request('POST', '/containers/{}/exec'.format(container_id), body=exec_config)
+        exec_id = created['Id']
+
+        # the output is multiplexed into frames with a header containing the stream and the size of the frame
+        response = await self._open_response('POST', '/exec/{}/start'.format(exec_id), body={'Detach': False})
+        stdout = None
+        stderr = None
+        buffer = bytearray()
+        try:
+            while True:
+                data = await response.read_chunk()
+                if not data:
+                    break
+                buffer.extend(data)
+                while len(buffer) >= EXEC_FRAME_HEADER.size:
+                    stream_type, size = EXEC_FRAME_HEADER.unpack_from(buffer)
+                    if len(buffer) < EXEC_FRAME_HEADER.size + size:
+                        break
+                    frame = bytes(buffer[EXEC_FRAME_HEADER.size:EXEC_FRAME_HEADER.size + size])
+                    del buffer[:EXEC_FRAME_HEADER.size + size]
+                    if stream_type == EXEC_STDOUT:
+                        stdout = frame if stdout is None else stdout + frame
+                    elif stream_type == EXEC_STDERR:
+                        stderr = frame if stderr is None else stderr + frame
+        finally:
+            response.close()
+
+        exec_info = await self._request('GET', '/exec/{}/json'.format(exec_id))
+        return exec_info.get('ExitCode'), stdout, stderr
+
+    async def run_command(self, container_id, command, user='cc', work_dir=None, timeout=None):
+        """
+        Runs the given command in the given container and waits for the execution to end without blocking a thread.
+
+        :param container_id: The id of a running container
+        :type container_id: str
+        :param command: The command to execute
+        :type command: List[str]
+        :param user: The user to execute the command
+        :type user: str or int
+        :param work_dir: The working directory where to execute the command
+        :type work_dir: str or None
+        :param timeout: The number of seconds after which the execution is aborted. If None, the execution is not
+                        limited in time.
+        :type timeout: int or float or None
+
+        :return: The result of the execution
+        :rtype: AgentExecutionResult
+
+        :raise ExecutionTimeoutError: If the execution did not finish within timeout seconds. In this case the given
+                                      container is killed.
+        """
+        try:
+            return_code, stdout, stderr = await asyncio.wait_for(
+                self._exec(container_id, command, str(user), work_dir), timeout
+            )
+        except asyncio.TimeoutError:
+            try:
+                await asyncio.wait_for(self.kill_container(container_id), KILL_GRACE_PERIOD)
+            except (AsyncDockerError, asyncio.TimeoutError):
+                pass
+            raise ExecutionTimeoutError(
+                'Execution of command "{}" in container "{}" did not finish within {} seconds. The container was '
+                'killed.'.format(command, container_id, timeout)
+            )
+
+        stats = await self._request('GET', '/containers/{}/stats'.format(container_id), params={'stream': 'false'})
+
+        return AgentExecutionResult(
+            return_code,
+            None if stdout is None else stdout.decode('utf-8'),
+            None if stderr is None else stderr.decode('utf-8'),
+            stats
+        )
+
+    async def stream_file_archive(self, container_id, file_path):
+        """
+        Retrieves the given file path as tar archive from the container.
+
+        :param container_id: The id of the container
+        :type container_id: str
+        :param file_path: A file path inside the container
+        :type file_path: str
+
+        :return: An asynchronous iterator over the chunks of the tar archive
+        :rtype: AsyncIterator[bytes]
+
+        :raise AgentError: If the given file could not be fetched
+        """
+        try:
+            response = await self._open_response(
+                'GET', '/containers/{}/archive'.format(container_id), params={'path': file_path}
+            )
+        except AsyncDockerError as e:
+            raise AgentError(str(e))
+        return _BodyStream(response)
+
+    async def get_file_archive(self, container_id, file_path):
+        """
+        Retrieves the given file path as tar archive from the container.
+
+        :return: A tar archive, which corresponds to the given file path
+        :rtype: tarfile.TarFile
+
+        :raise AgentError: If the given file could not be fetched
+        """
+        archive = io.BytesIO()
+        stream = await self.stream_file_archive(container_id, file_path)
+        try:
+            async for chunk in stream:
+                archive.write(chunk)
+        except AsyncDockerError as e:
+            raise AgentError(str(e))
+        finally:
+            stream.close()
+
+        archive.seek(0)
+        return tarfile.TarFile(fileobj=archive)
+
+    async def kill_container(self, container_id):
+        await self._request('POST', '/containers/{}/kill'.format(container_id))
+
+    async def stop_container(self, container_id):
+        # the stop request returns after the container stopped, which takes up to STOP_TIMEOUT seconds
+        async def stop():
+            response = await self._open_response(
+                'POST', '/containers/{}/stop'.format(container_id), params={'t': STOP_TIMEOUT}
+            )
+            await response.read()
+
+        await asyncio.wait_for(stop(), self._timeout + STOP_TIMEOUT)
+
+    async def remove_container(self, container_id):
+        await self._request('DELETE', '/containers/{}'.format(container_id))
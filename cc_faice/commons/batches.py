@@ -0,0 +1,164 @@
+import hashlib
+import json
+
+from cc_core.commons.red_to_blue import get_cli_arguments, produce_base_command, remove_null_values, \
+    complete_batch_inputs, complete_input_references_in_outputs, generate_command, create_blue_batch
+from cc_core.commons.templates import is_protected_key
+
+# replaces the values of protected keys, so batch hashes are not derived from credentials
+MASKED_VALUE = '********'
+
+
+def red_batches(red_data):
+    """
+    Returns the batches of the given red data. If the red data does not define batches, the experiment itself is
+    treated as a single batch.
+
+    :param red_data: The red data to extract the batches from
+    :type red_data: Dict[str, Any]
+
+    :return: A list of dictionaries, each containing the inputs and outputs of one batch
+    :rtype: List[Dict[str, Any]]
+    """
+    batches = red_data.get('batches')
+    if batches:
+        return batches
+    return [{'inputs': red_data['inputs'], 'outputs': red_data.get('outputs')}]
+
+
+def _mask_protected_values(data):
+    """
+    :return: A copy of the given data, in which all values under protected keys are replaced by MASKED_VALUE
+    """
+    if isinstance(data, dict):
+        return {
+            key: MASKED_VALUE if is_protected_key(key) else _mask_protected_values(value)
+            for key, value in data.items()
+        }
+    if isinstance(data, list):
+        return [_mask_protected_values(value) for value in data]
+    return data
+
+
+def red_batch_hash(red_data, red_batch):
+    """
+    Calculates a stable hash for the given batch of the given red data. The hash covers the cli description, the
+    container settings and the inputs and outputs of the batch. It does not depend on randomly generated values, so it
+    can be used to recognize a batch across different executions of the same experiment.
+
+    The hash does not depend on credentials. Therefore it has to be calculated before the templates of the red data are
+    completed and the values of protected keys are masked.
+
+    :param red_data: The red data containing the given batch
+    :type red_data: Dict[str, Any]
+    :param red_batch: The batch to hash as found in red_data
+    :type red_batch: Dict[str, Any]
+
+    :return: The hex digest of the batch hash
+    :rtype: str
+    """
+    hash_data = {
+        'cli': red_data.get('cli'),
+        'container': red_data.get('container'),
+        'inputs': red_batch.get('inputs'),
+        'outputs': red_batch.get('outputs')
+    }
+    hash_data = _mask_protected_values(hash_data)
+    serialized = json.dumps(hash_data, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def red_batch_hashes(red_data):
+    """
+    Calculates the stable hash of every batch in the given red data. This function should be called before the
+    templates of the red data are completed and before the red data is converted to blue batches, because the
+    conversion completes the batch inputs in place.
+
+    :param red_data: The red data to hash
+    :type red_data: Dict[str, Any]
+
+    :return: A list of hex digests, one for each batch
+    :rtype: List[str]
+    """
+    return [red_batch_hash(red_data, red_batch) for red_batch in red_batches(red_data)]
+
+
+class BlueBatchConverter:
+    def __init__(self, red_data):
+        """
+        Converts the batches of the given red data to blue batches one at a time, like convert_red_to_blue() of cc-core
+        does for all batches at once. The cli description is analysed only once.
+
+        A red batch is completed in place, when it is converted, and afterwards removed from the red data, so the
+        memory of batches already executed can be released. Therefore every batch can only be converted once and
+        red_batch_hashes() has to be called before.
+
+        :param red_data: The red data to convert
+        :type red_data: Dict[str, Any]
+        """
+        self._red_data = red_data
+        self._batches = red_data.get('batches')
+
+        cli_description = red_data['cli']
+        self._cli_inputs = cli_description['inputs']
+        self._cli_outputs = cli_description.get('outputs')
+        self._cli_stdout = cli_description.get('stdout')
+        self._cli_stderr = cli_description.get('stderr')
+
+        self._cli_arguments = get_cli_arguments(self._cli_inputs)
+        self._base_command = produce_base_command(cli_description.get('baseCommand'))
+
+    def __len__(self):
+        if self._batches:
+            return len(self._batches)
+        return 1
+
+    def _take_red_batch(self, batch_index):
+        if not self._batches:
+            if batch_index != 0:
+                raise IndexError('Batch index {} out of range for red data without batches.'.format(batch_index))
+            return self._red_data
+
+        red_batch = self._batches[batch_index]
+        if red_batch is None:
+            raise ValueError('Batch {} has already been converted.'.format(batch_index))
+        self._batches[batch_index] = None
+        return red_batch
+
+    def convert(self, batch_index):
+        """
+        Converts the batch with the given index to a blue batch.
+
+        :param batch_index: The index of the batch in the red data
+        :type batch_index: int
+
+        :return: The blue batch
+        :rtype: Dict[str, Any]
+
+        :raise ValueError: If the batch has already been converted
+        """
+        red_batch = self._take_red_batch(batch_index)
+        batch = {'inputs': red_batch['inputs'], 'outputs': red_batch.get('outputs', {})}
+        remove_null_values(batch['inputs'])
+        remove_null_values(batch['outputs'])
+
+        complete_batch_inputs(batch['inputs'], self._cli_inputs)
+        resolved_cli_outputs = complete_input_references_in_outputs(self._cli_outputs, batch['inputs'])
+        command = generate_command(self._base_command, self._cli_arguments, batch)
+        return create_blue_batch(command, batch, resolved_cli_outputs, self._cli_stdout, self._cli_stderr)
+
+
+def lazy_blue_batches(converter, batch_order):
+    """
+    Converts the batches in the given order, each batch only when it is requested from the returned iterator.
+
+    :param converter: The converter of the red data
+    :type converter: BlueBatchConverter
+    :param batch_order: The indices of the batches in the order of execution
+    :type batch_order: Iterable[int]
+
+    :return: An iterator of tuples containing the batch index and the blue batch
+    :rtype: Iterator[Tuple[int, Dict[str, Any]]]
+    """
+    for batch_index in batch_order:
+        yield batch_index, converter.convert(batch_index)
@@ -0,0 +1,329 @@
+"""
+Output bundles store the outputs of a batch in a single compressed tar archive instead of a directory tree. A bundle is
+written as a sequence of independently compressed chunks, each containing complete tar members. The concatenated
+chunks form a regular compressed tar archive, which can be extracted with "tar -xf". An index file next to the bundle
+records the chunk of every member, so a single member can be listed and extracted by decompressing only its chunk.
+"""
+import io
+import json
+import os
+import tarfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_COMPRESSION = 'gzip'
+ZSTD_COMPRESSION = 'zstd'
+BUNDLE_COMPRESSIONS = [GZIP_COMPRESSION, ZSTD_COMPRESSION]
+
+BUNDLE_EXTENSIONS = {
+    GZIP_COMPRESSION: '.tar.gz',
+    ZSTD_COMPRESSION: '.tar.zst'
+}
+INDEX_EXTENSION = '.index.json'
+
+# a chunk is completed after the member, which exceeds this number of uncompressed bytes
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+READ_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+
+MEMBER_TYPES = [
+    (tarfile.TarInfo.isreg, 'file'),
+    (tarfile.TarInfo.isdir, 'directory'),
+    (tarfile.TarInfo.issym, 'symlink'),
+    (tarfile.TarInfo.islnk, 'hardlink')
+]
+
+
+def check_bundle_compression(compression):
+    """
+    :param compression: The compression of bundles as one of BUNDLE_COMPRESSIONS
+    :type compression: str
+
+    :raise ValueError: If the compression is unknown or its library is not installed
+    """
+    if compression not in BUNDLE_COMPRESSIONS:
+        raise ValueError(
+            'The compression of output bundles should be one of [{}], but found "{}".'
+            .format(', '.join(BUNDLE_COMPRESSIONS), compression)
+        )
+    if compression == ZSTD_COMPRESSION and zstandard is None:
+        raise ValueError('The python package "zstandard" is required for zstd compressed output bundles.')
+
+
+def bundle_paths(host_outdir, compression):
+    """
+    Returns the paths of the bundle and its index, which replace the given outputs directory.
+
+    :param host_outdir: The path of the outputs directory of a batch
+    :type host_outdir: str
+    :param compression: The compression of the bundle
+    :type compression: str
+
+    :return: The path of the bundle and the path of its index
+    :rtype: Tuple[str, str]
+    """
+    bundle_path = host_outdir + BUNDLE_EXTENSIONS[compression]
+    return bundle_path, bundle_path + INDEX_EXTENSION
+
+
+def _compressor(compression):
+    if compression == ZSTD_COMPRESSION:
+        return zstandard.ZstdCompressor().compressobj()
+    # wbits 31 writes a gzip header and trailer, so every chunk is a gzip member
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def _decompressor(compression):
+    if compression == ZSTD_COMPRESSION:
+        if zstandard is None:
+            raise ValueError('The python package "zstandard" is required to read zstd compressed output bundles.')
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(31)
+
+
+def _member_type(tarinfo):
+    for is_type, member_type in MEMBER_TYPES:
+        if is_type(tarinfo):
+            return member_type
+    return 'other'
+
+
+class _ChunkStream(io.RawIOBase):
+    """
+    A readable file object returning the data of the given iterable of byte chunks.
+    """
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+class BundleWriter:
+    def __init__(self, bundle_path, compression=GZIP_COMPRESSION, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Writes an output bundle and its index. The index is written, when the writer is closed.
+
+        :param bundle_path: The path of the bundle as given by bundle_paths()
+        :type bundle_path: str
+        :param compression: The compression of the bundle as one of BUNDLE_COMPRESSIONS
+        :type compression: str
+        :param chunk_size: The number of uncompressed bytes, after which a chunk is completed
+        :type chunk_size: int
+        """
+        check_bundle_compression(compression)
+        self._bundle_path = bundle_path
+        self._compression = compression
+        self._chunk_size = chunk_size
+
+        self._file = open(bundle_path, 'wb')
+        self._members = []
+        self._chunks = []
+        self._compressor = None
+        self._chunk_start = 0
+        self._chunk_fill = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def add_archive(self, archive_chunks):
+        """
+        Adds all members of the given tar archive to the bundle. The archive is read as stream, so it is never kept in
+        memory completely.
+
+        :param archive_chunks: The tar archive as iterable of byte chunks, like returned by container.get_archive()
+        :type archive_chunks: Iterable[bytes]
+        """
+        with tarfile.open(fileobj=_ChunkStream(archive_chunks), mode='r|') as archive:
+            for tarinfo in archive:
+                data = archive.extractfile(tarinfo) if tarinfo.isreg() else None
+                self._add_member(tarinfo, data)
+
+    def _add_member(self, tarinfo, data):
+        if self._compressor is None:
+            self._compressor = _compressor(self._compression)
+            self._chunk_start = self._file.tell()
+            self._chunk_fill = 0
+
+        member_offset = self._chunk_fill
+        self._write(tarinfo.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+
+        if data is not None:
+            while True:
+                block = data.read(READ_SIZE)
+                if not block:
+                    break
+                self._write(block)
+            remainder = tarinfo.size % tarfile.BLOCKSIZE
+            if remainder:
+                self._write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+        member = {
+            'name': tarinfo.name,
+            'type': _member_type(tarinfo),
+            'size': tarinfo.size,
+            'mode': tarinfo.mode,
+            'mtime': tarinfo.mtime,
+            'chunk': len(self._chunks),
+            'offset': member_offset
+        }
+        if tarinfo.issym() or tarinfo.islnk():
+            member['linkname'] = tarinfo.linkname
+        self._members.append(member)
+
+        if self._chunk_fill >= self._chunk_size:
+            self._finish_chunk()
+
+    def _write(self, data):
+        self._file.write(self._compressor.compress(data))
+        self._chunk_fill += len(data)
+
+    def _finish_chunk(self):
+        self._file.write(self._compressor.flush())
+        self._compressor = None
+        self._chunks.append({'offset': self._chunk_start, 'length': self._file.tell() - self._chunk_start})
+
+    def close(self):
+        """
+        Completes the bundle with the end of archive marker and writes the index.
+        """
+        if self._compressor is not None:
+            self._finish_chunk()
+
+        # the end of archive marker is not part of an indexed chunk
+        compressor = _compressor(self._compression)
+        self._file.write(compressor.compress(tarfile.NUL * (2 * tarfile.BLOCKSIZE)))
+        self._file.write(compressor.flush())
+        self._file.close()
+
+        index = {
+            'compression': self._compression,
+            'chunks': self._chunks,
+            'members': self._members
+        }
+        with open(self._bundle_path + INDEX_EXTENSION, 'w') as f:
+            json.dump(index, f)
+
+
+def read_bundle_index(bundle_path):
+    """
+    :param bundle_path: The path of an output bundle
+    :type bundle_path: str
+
+    :return: The index of the given bundle containing the compression, the chunks and the members of the bundle
+    :rtype: Dict
+
+    :raise FileNotFoundError: If the bundle or its index does not exist
+    """
+    if not os.path.isfile(bundle_path):
+        raise FileNotFoundError('Output bundle "{}" does not exist.'.format(bundle_path))
+
+    index_path = bundle_path + INDEX_EXTENSION
+    if not os.path.isfile(index_path):
+        raise FileNotFoundError('Index "{}" of output bundle does not exist.'.format(index_path))
+
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def _read_chunk(bundle_path, compression, chunk):
+    """
+    Decompresses a single chunk of a bundle.
+
+    :return: The decompressed data of the chunk as iterable of byte chunks
+    :rtype: Iterator[bytes]
+    """
+    decompressor = _decompressor(compression)
+    with open(bundle_path, 'rb') as f:
+        f.seek(chunk['offset'])
+        remaining = chunk['length']
+        while remaining > 0:
+            data = f.read(min(READ_SIZE, remaining))
+            if not data:
+                raise EOFError('Output bundle "{}" is truncated.'.format(bundle_path))
+            remaining -= len(data)
+            yield decompressor.decompress(data)
+
+
+def _select_members(index, names):
+    """
+    :return: The members of the index, which have one of the given names or are contained in a directory with one of
+             the given names
+    :rtype: List[Dict]
+    """
+    selected = []
+    for name in names:
+        name = name.rstrip('/')
+        matches = [
+            member for member in index['members']
+            if member['name'] == name or member['name'].startswith(name + '/')
+        ]
+        if not matches:
+            raise ValueError('Output bundle does not contain member "{}".'.format(name))
+        selected.extend(matches)
+    return selected
+
+
+def extract_bundle_members(bundle_path, names, target_dir):
+    """
+    Extracts the members with the given names from an output bundle. If a name refers to a directory, the directory is
+    extracted with all its content. Only the chunks containing the requested members are decompressed.
+
+    :param bundle_path: The path of the output bundle
+    :type bundle_path: str
+    :param names: The names of the members to extract
+    :type names: List[str]
+    :param target_dir: The directory the members are extracted to
+    :type target_dir: str
+
+    :return: The extracted members
+    :rtype: List[Dict]
+
+    :raise FileNotFoundError: If the bundle or its index does not exist
+    :raise ValueError: If the bundle does not contain a member with one of the given names
+    """
+    index = read_bundle_index(bundle_path)
+    selected = _select_members(index, names)
+
+    chunk_members = {}
+    for member in selected:
+        chunk_members.setdefault(member['chunk'], set()).add(member['offset'])
+
+    os.makedirs(target_dir, exist_ok=True)
+    for chunk_index in sorted(chunk_members):
+        offsets = chunk_members[chunk_index]
+        last_offset = max(offsets)
+        stream = _ChunkStream(_read_chunk(bundle_path, index['compression'], index['chunks'][chunk_index]))
+        with tarfile.open(fileobj=stream, mode='r|') as archive:
+            for tarinfo in archive:
+                member_offset = tarinfo.offset
+                if member_offset in offsets:
+                    archive.extract(tarinfo, target_dir)
+                if member_offset >= last_offset:
+                    break
+
+    return selected
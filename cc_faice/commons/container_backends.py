@@ -0,0 +1,553 @@
+"""
+Container backends create the clients, which are used by DockerManager to execute batches. A client implements the part
+of the docker-py DockerClient api used by faice:
+
+- client.info()
+- client.images.pull(image, auth_config) and client.images.get(image)
+- client.containers.create(image, command, **kwargs), returning a container with the attribute name and the methods
+  start(), update(**kwargs), put_archive(path, data), exec_run(cmd, user, workdir, stdout, stderr, demux),
+  stats(stream), get_archive(path), kill(), stop() and remove()
+
+Errors of clients are raised as docker.errors.DockerException, like the errors of docker-py.
+"""
+import io
+import json
+import os
+import posixpath
+import shutil
+import signal
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from uuid import uuid4
+
+import docker
+from docker.errors import DockerException, NotFound, ImageNotFound
+
+from cc_core.commons.red_to_blue import CONTAINER_AGENT_PATH, CONTAINER_BLUE_FILE_PATH
+
+DOCKER_BACKEND = 'docker'
+FAKE_BACKEND = 'fake'
+LOCAL_BACKEND = 'local'
+
+# the directory inside containers, which contains the blue agent, the blue file, the inputs and the outputs
+CONTAINER_CC_DIR = '/cc'
+
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+
+FAKE_IMAGE_DIGEST = 'sha256:' + '0' * 64
+
+# the exit code of a process killed with SIGKILL
+KILLED_EXIT_CODE = 137
+
+
+class ContainerBackend(ABC):
+    """
+    The interface of container backends. DockerManager calls create_client() once, when it connects.
+    """
+    name = None
+
+    @abstractmethod
+    def create_client(self, base_url, pool_size, timeout):
+        """
+        :param base_url: The url of the container daemon or None, if the daemon is configured by the environment
+        :type base_url: str or None
+        :param pool_size: The maximal number of connections kept open to the daemon
+        :type pool_size: int
+        :param timeout: The timeout of api calls in seconds
+        :type timeout: int
+
+        :return: A client implementing the docker-py api used by faice
+        """
+
+
+class DockerBackend(ContainerBackend):
+    """
+    Executes containers with a docker daemon using docker-py.
+    """
+    name = DOCKER_BACKEND
+
+    def create_client(self, base_url, pool_size, timeout):
+        if base_url is None:
+            return docker.from_env(max_pool_size=pool_size, timeout=timeout)
+        return docker.DockerClient(base_url=base_url, max_pool_size=pool_size, timeout=timeout)
+
+
+class FakeLatencies:
+    OPERATIONS = ['pull', 'create', 'start', 'put_archive', 'exec', 'agent', 'stats', 'get_archive', 'stop', 'remove']
+
+    def __init__(self, **latencies):
+        """
+        The simulated durations of the operations of a FakeBackend in seconds. Operations not given take no time.
+
+        :param latencies: The durations of the operations in OPERATIONS. "exec" is the overhead of every executed
+                          command and "agent" is the additional duration of the blue agent.
+        :type latencies: float
+
+        :raise ValueError: If an unknown operation is given
+        """
+        for operation in latencies:
+            if operation not in self.OPERATIONS:
+                raise ValueError(
+                    'Unknown operation "{}" of fake container backend. Should be one of [{}].'
+                    .format(operation, ', '.join(self.OPERATIONS))
+                )
+        self._latencies = latencies
+
+    @staticmethod
+    def from_string(specification):
+        """
+        :param specification: The latencies as comma separated list like "create=0.05,exec=0.01"
+        :type specification: str
+
+        :rtype: FakeLatencies
+
+        :raise ValueError: If the specification is invalid
+        """
+        latencies = {}
+        for part in specification.split(','):
+            if not part.strip():
+                continue
+            operation, separator, value = part.partition('=')
+            if not separator:
+                raise ValueError('Latency "{}" should have the form OPERATION=SECONDS.'.format(part))
+            latencies[operation.strip()] = float(value)
+        return FakeLatencies(**latencies)
+
+    def get(self, operation):
+        return self._latencies.get(operation, 0.0)
+
+    def wait(self, operation):
+        latency = self.get(operation)
+        if latency > 0:
+            time.sleep(latency)
+
+
+class FakeBackend(ContainerBackend):
+    name = FAKE_BACKEND
+
+    def __init__(self, latencies=None, output_size=1024):
+        """
+        An in-process container backend, which does not start containers. It is used to measure the overhead of faice
+        without docker daemon. The blue agent is simulated: it succeeds and reports every output of the cli
+        description with its glob as path. Retrieved output files contain output_size zero bytes.
+
+        :param latencies: The simulated durations of the container operations. If None, operations take no time.
+        :type latencies: FakeLatencies or None
+        :param output_size: The size of every output file in bytes
+        :type output_size: int
+        """
+        self.latencies = latencies or FakeLatencies()
+        self.output_size = output_size
+
+    def create_client(self, base_url, pool_size, timeout):
+        return _FakeClient(self)
+
+
+class _FakeImage:
+    def __init__(self, image):
+        self.id = FAKE_IMAGE_DIGEST
+        self.attrs = {'RepoDigests': ['{}@{}'.format(image.split(':')[0], FAKE_IMAGE_DIGEST)]}
+
+
+class _FakeImages:
+    def __init__(self, backend):
+        self._backend = backend
+        self._pulled = set()
+        self._lock = threading.Lock()
+
+    def pull(self, image, auth_config=None):
+        self._backend.latencies.wait('pull')
+        with self._lock:
+            self._pulled.add(image)
+
+    def get(self, image):
+        with self._lock:
+            if image not in self._pulled:
+                raise ImageNotFound('No such image: {}'.format(image))
+        return _FakeImage(image)
+
+
+class _FakeContainers:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def create(self, image, command, name=None, volumes=None, **kwargs):
+        self._backend.latencies.wait('create')
+        return _FakeContainer(self._backend, name or str(uuid4()), volumes)
+
+
+class _FakeClient:
+    def __init__(self, backend):
+        self.images = _FakeImages(backend)
+        self.containers = _FakeContainers(backend)
+
+    @staticmethod
+    def info():
+        return {'Runtimes': {'runc': {'path': 'runc'}}}
+
+
+class _FakeContainer:
+    def __init__(self, backend, name, volumes):
+        self.name = name
+        self._backend = backend
+        self._blue_batch = None
+
+        # the blue file is bind mounted instead of being uploaded, if the agent is staged on the host
+        for host_path, bind in (volumes or {}).items():
+            if bind['bind'] == CONTAINER_BLUE_FILE_PATH:
+                with open(host_path) as f:
+                    self._blue_batch = json.load(f)
+        self._killed = threading.Event()
+        self._removed = False
+
+    def _check_exists(self):
+        if self._removed:
+            raise NotFound('No such container: {}'.format(self.name))
+
+    def start(self):
+        self._check_exists()
+        self._backend.latencies.wait('start')
+
+    def update(self, **kwargs):
+        self._check_exists()
+
+    def put_archive(self, path, data):
+        self._check_exists()
+        self._backend.latencies.wait('put_archive')
+        if hasattr(data, 'read'):
+            data = data.read()
+
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            for member in archive.getmembers():
+                if posixpath.join(path, member.name) == CONTAINER_BLUE_FILE_PATH:
+                    self._blue_batch = json.loads(archive.extractfile(member).read().decode('utf-8'))
+
+    def exec_run(self, cmd, user=None, workdir=None, stdout=True, stderr=True, demux=False):
+        self._check_exists()
+        self._backend.latencies.wait('exec')
+
+        if CONTAINER_AGENT_PATH not in cmd:
+            return 0, (None, None)
+
+        # the blue agent is simulated, it can be interrupted by killing the container
+        if self._killed.wait(self._backend.latencies.get('agent')):
+            return KILLED_EXIT_CODE, (None, None)
+
+        outputs = {}
+        if self._blue_batch is not None:
+            for output_key, output in (self._blue_batch['cli'].get('outputs') or {}).items():
+                glob = output.get('outputBinding', {}).get('glob')
+                outputs[output_key] = {'class': output['type'], 'path': glob}
+
+        agent_result = {'state': 'succeeded', 'command': self._blue_batch and self._blue_batch['command'],
+                        'outputs': outputs, 'debugInfo': None}
+        return 0, (json.dumps(agent_result).encode('utf-8'), b'')
+
+    def stats(self, stream=True):
+        self._check_exists()
+        self._backend.latencies.wait('stats')
+        return {'name': '/' + self.name, 'memory_stats': {'usage': 0, 'max_usage': 0}}
+
+    def get_archive(self, path):
+        self._check_exists()
+        self._backend.latencies.wait('get_archive')
+
+        file_name = posixpath.basename(path.rstrip('/'))
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar:
+            tarinfo = tarfile.TarInfo(file_name)
+            tarinfo.size = self._backend.output_size
+            tarinfo.mtime = int(time.time())
+            tar.addfile(tarinfo, io.BytesIO(bytes(self._backend.output_size)))
+
+        stat = {'name': file_name, 'size': self._backend.output_size, 'mode': 0o644, 'linkTarget': ''}
+        return iter([archive.getvalue()]), stat
+
+    def kill(self):
+        self._check_exists()
+        self._killed.set()
+
+    def stop(self):
+        self._check_exists()
+        self._backend.latencies.wait('stop')
+        self._killed.set()
+
+    def remove(self):
+        self._check_exists()
+        self._backend.latencies.wait('remove')
+        self._removed = True
+
+
+class LocalBackend(ContainerBackend):
+    name = LOCAL_BACKEND
+
+    def __init__(self, scratch_directory=None):
+        """
+        Executes batches as processes on this host instead of containers, which is useful to iterate on an experiment
+        in an environment, which already provides its dependencies. Every "container" is a scratch directory
+        containing the /cc directory of a container. Paths below /cc in the blue file and in executed commands are
+        replaced by the corresponding paths in the scratch directory. The blue agent is executed with the python3
+        interpreter of this host.
+
+        Bind mounts are emulated with symbolic links in the scratch directory, so read-only mounts are not enforced. A
+        bind mounted blue file is copied, because its paths have to be replaced. Resource limits, users and FUSE mounts
+        of containers are not supported. Containers left with --leave-container are kept as scratch directories.
+
+        Only the blue agent is executed. Other commands prepare or clean up containers, for example by changing
+        /dev/fuse as root, and must not be executed on the host, so they succeed without being executed.
+
+        :param scratch_directory: The directory, in which the scratch directories are created. If None, the temp
+                                  directory is used.
+        :type scratch_directory: str or None
+        """
+        self._scratch_directory = scratch_directory
+
+    def create_client(self, base_url, pool_size, timeout):
+        if base_url is not None:
+            raise DockerException(
+                'The local backend does not support docker hosts, but "{}" was given.'.format(base_url)
+            )
+        return _LocalClient(self._scratch_directory)
+
+
+class _LocalImages:
+    @staticmethod
+    def pull(image, auth_config=None):
+        pass
+
+    @staticmethod
+    def get(image):
+        return _FakeImage(image)
+
+
+class _LocalContainers:
+    def __init__(self, scratch_directory):
+        self._scratch_directory = scratch_directory
+
+    def create(self, image, command, name=None, volumes=None, working_dir=None, environment=None, cap_add=None,
+               devices=None, **kwargs):
+        if cap_add or devices:
+            raise DockerException(
+                'The local backend does not support FUSE mounts, which require the insecure capabilities {} and the '
+                'devices {}.'.format(cap_add, devices)
+            )
+
+        container = _LocalContainer(name or str(uuid4()), self._scratch_directory, working_dir, environment)
+        try:
+            for host_path, bind in (volumes or {}).items():
+                container.bind(host_path, bind['bind'])
+        except BaseException:
+            container.remove()
+            raise
+        return container
+
+
+class _LocalClient:
+    def __init__(self, scratch_directory):
+        self.images = _LocalImages()
+        self.containers = _LocalContainers(scratch_directory)
+
+    @staticmethod
+    def info():
+        return {'Runtimes': {}}
+
+
+def _local_paths(data, root):
+    """
+    Replaces all strings in the given data, which are paths below /cc, by the corresponding path inside root.
+
+    :param data: The data to convert, like a blue batch or a command
+    :param root: The scratch directory, which replaces the root directory of the container
+    :type root: str
+
+    :return: The converted data
+    """
+    if isinstance(data, str):
+        if data == CONTAINER_CC_DIR or data.startswith(CONTAINER_CC_DIR + '/'):
+            return root + data
+        return data
+    if isinstance(data, dict):
+        return {key: _local_paths(value, root) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_local_paths(value, root) for value in data]
+    return data
+
+
+def _is_blue_agent_command(cmd):
+    """
+    :return: Whether the given command executes the blue agent like "python3 /cc/blue_agent.py /cc/blue_file.json"
+    :rtype: bool
+    """
+    return isinstance(cmd, list) and len(cmd) > 1 and cmd[1] == CONTAINER_AGENT_PATH
+
+
+class _LocalContainer:
+    def __init__(self, name, scratch_directory, working_dir, environment):
+        self.name = name
+        self._root = tempfile.mkdtemp(prefix='faice_{}_'.format(name), dir=scratch_directory)
+        self._working_dir = working_dir or '/'
+        self._environment = dict(os.environ)
+        self._environment.update({key: str(value) for key, value in (environment or {}).items()})
+
+        # maps the resolved host paths of bind mounts to their paths inside the container
+        self._bind_targets = {}
+
+        self._processes = set()
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def _host_path(self, path):
+        """
+        :param path: An absolute path inside the container, a path, which was already converted, or a path below a
+                     bind mounted host directory, which is reported by processes resolving the symbolic links of
+                     bind mounts
+        :type path: str
+
+        :return: The path inside the scratch directory
+        :rtype: str
+        """
+        if path == self._root or path.startswith(self._root + os.sep):
+            return path
+
+        for target in sorted(self._bind_targets, key=len, reverse=True):
+            if path == target or path.startswith(target + os.sep):
+                path = self._bind_targets[target] + path[len(target):]
+                break
+
+        return os.path.join(self._root, posixpath.normpath(path).lstrip('/'))
+
+    def _write_file(self, container_path, content, mode):
+        if container_path == CONTAINER_BLUE_FILE_PATH:
+            blue_batch = json.loads(content.decode('utf-8'))
+            content = json.dumps(_local_paths(blue_batch, self._root)).encode('utf-8')
+
+        host_path = self._host_path(container_path)
+        os.makedirs(os.path.dirname(host_path), exist_ok=True)
+        with open(host_path, 'wb') as f:
+            f.write(content)
+        os.chmod(host_path, mode)
+
+    def bind(self, host_path, container_path):
+        """
+        Provides the given host file or directory at the given path inside the container.
+
+        :param host_path: The path of the host file or directory
+        :type host_path: str
+        :param container_path: The absolute path inside the container
+        :type container_path: str
+        """
+        if container_path == CONTAINER_BLUE_FILE_PATH:
+            with open(host_path, 'rb') as f:
+                self._write_file(container_path, f.read(), 0o644)
+            return
+
+        link_path = self._host_path(container_path)
+        os.makedirs(os.path.dirname(link_path), exist_ok=True)
+        os.symlink(os.path.abspath(host_path), link_path)
+        self._bind_targets[os.path.realpath(host_path)] = container_path
+
+    def start(self):
+        pass
+
+    def update(self, **kwargs):
+        # resource limits are not supported
+        pass
+
+    def put_archive(self, path, data):
+        if hasattr(data, 'read'):
+            data = data.read()
+
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            for member in archive.getmembers():
+                container_path = posixpath.normpath(posixpath.join(path, member.name))
+                if container_path.startswith('/..'):
+                    raise DockerException('Archive member "{}" is outside of the container.'.format(member.name))
+
+                if member.isdir():
+                    os.makedirs(self._host_path(container_path), exist_ok=True)
+                elif member.isfile():
+                    self._write_file(container_path, archive.extractfile(member).read(), member.mode)
+
+    def exec_run(self, cmd, user=None, workdir=None, stdout=True, stderr=True, demux=False):
+        if not _is_blue_agent_command(cmd):
+            return 0, (None, None)
+
+        work_dir = self._host_path(workdir or self._working_dir)
+        os.makedirs(work_dir, exist_ok=True)
+
+        with self._lock:
+            if self._stopped:
+                raise DockerException('Container "{}" is not running.'.format(self.name))
+            try:
+                process = subprocess.Popen(
+                    _local_paths(cmd, self._root), cwd=work_dir, env=self._environment, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+                )
+            except OSError as e:
+                return 127, (None, str(e).encode('utf-8'))
+            self._processes.add(process)
+
+        try:
+            out, err = process.communicate()
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+
+        return process.returncode, (out or None, err or None)
+
+    @staticmethod
+    def stats(stream=True):
+        # the memory usage of processes is not recorded
+        return {}
+
+    def get_archive(self, path):
+        host_path = self._host_path(path)
+        if not os.path.lexists(host_path):
+            raise NotFound('Could not find the file {} in container {}'.format(path, self.name))
+
+        archive = tempfile.TemporaryFile()
+        with tarfile.open(fileobj=archive, mode='w') as tar:
+            tar.add(host_path, arcname=os.path.basename(host_path.rstrip(os.sep)))
+        archive.seek(0)
+
+        stat = os.lstat(host_path)
+        return _read_chunks(archive), {'name': os.path.basename(host_path), 'size': stat.st_size, 'mode': stat.st_mode}
+
+    def kill(self):
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+        self.kill()
+
+    def remove(self):
+        shutil.rmtree(self._root, ignore_errors=True)
+
+
+def _read_chunks(f):
+    try:
+        while True:
+            chunk = f.read(ARCHIVE_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        f.close()
+
+
+CONTAINER_BACKENDS = OrderedDict([
+    (DOCKER_BACKEND, DockerBackend),
+    (LOCAL_BACKEND, LocalBackend),
+])
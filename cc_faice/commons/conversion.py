@@ -0,0 +1,170 @@
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from cc_core.commons.exceptions import brief_exception_text
+from cc_core.commons.files import file_extension
+
+from cc_faice.commons.serialization import load_and_read, dump
+
+# file extensions of the files converted, if a directory is given as input
+INPUT_EXTENSIONS = ('.json', '.yml', '.yaml')
+
+# the number of files sent to a worker process at once
+CHUNK_SIZE = 16
+
+
+def expand_inputs(inputs):
+    """
+    Expands the given inputs to a list of files. An input may be a file path, a glob pattern like "reds/**/*.yml" or a
+    directory. Directories are searched recursively for json and yaml files.
+
+    :param inputs: The inputs to expand
+    :type inputs: List[str]
+
+    :return: The expanded files in the order of the given inputs. Files found in a directory or matched by a pattern
+             are sorted. An input, which matches nothing, is returned unchanged, so it is reported as missing file.
+    :rtype: List[str]
+    """
+    files = []
+    for location in inputs:
+        location = os.path.expanduser(location)
+        if os.path.isdir(location):
+            directory_files = []
+            for directory, _, file_names in os.walk(location):
+                directory_files.extend(
+                    os.path.join(directory, file_name) for file_name in file_names
+                    if file_name.lower().endswith(INPUT_EXTENSIONS)
+                )
+            files.extend(sorted(directory_files))
+        elif glob.has_magic(location):
+            files.extend(sorted(glob.glob(location, recursive=True)))
+        else:
+            files.append(location)
+    return files
+
+
+def output_file_names(files, fmt):
+    """
+    Assigns an output file name to every input file, which consists of the name of the input file without extension
+    and the extension of the given format.
+
+    :param files: The input files
+    :type files: List[str]
+    :param fmt: The output format
+    :type fmt: str
+
+    :return: The output file names in the order of the given files. If several input files map to the same name, only
+             the first file gets a name and the others are assigned None.
+    :rtype: List[str or None]
+    """
+    ext = file_extension(fmt)
+    assigned = set()
+    file_names = []
+    for file in files:
+        file_name = '{}.{}'.format(os.path.splitext(os.path.basename(file))[0], ext)
+        if file_name in assigned:
+            file_names.append(None)
+        else:
+            assigned.add(file_name)
+            file_names.append(file_name)
+    return file_names
+
+
+def _convert_file(task):
+    """
+    Converts a single file inside a worker.
+
+    :param task: A tuple containing the input file, the function extracting the converted data from the file content,
+                 the output format and the output path. If the output path is None, the converted data is returned as
+                 json line.
+    :type task: Tuple[str, Callable, str, str or None]
+
+    :return: The json line or None, if the data was written to the output path, and the error message or None
+    :rtype: Tuple[str or None, str or None]
+    """
+    file, extract, fmt, output_path = task
+    try:
+        data = extract(load_and_read(file, 'FILE'))
+        if output_path is None:
+            # serialized inside the worker, so data, which can not be represented as json, is reported for this file
+            return _json_line({'file': file, 'data': data}), None
+        dump(data, fmt, output_path)
+        return None, None
+    except Exception as e:
+        return None, brief_exception_text(e)
+
+
+def convert_files(files, extract, fmt, output_dir=None, workers=1):
+    """
+    Converts the given files using a pool of worker processes. If output_dir is given, each file is written to this
+    directory in the given format. Otherwise one json line per file is written to stdout containing the name of the
+    input file and the converted data. Errors are written to stderr and, without output_dir, as json line containing
+    the error message instead of the data. They do not abort the conversion of other files.
+
+    :param files: The files to convert
+    :type files: List[str]
+    :param extract: A function returning the data to convert from the content of a file. It has to be defined on module
+                    level, so it can be sent to worker processes.
+    :type extract: Callable[[Dict], Any]
+    :param fmt: The output format for files written to output_dir
+    :type fmt: str
+    :param output_dir: The directory the converted files are written to. It is created, if it does not exist.
+    :type output_dir: str or None
+    :param workers: The number of worker processes. If 1, the files are converted in this process.
+    :type workers: int
+
+    :return: The errors of the files, which could not be converted, as list of dictionaries with the keys "file" and
+             "error"
+    :rtype: List[Dict[str, str]]
+    """
+    errors = []
+    tasks = []
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        input_paths = {os.path.realpath(file) for file in files}
+        for file, file_name in zip(files, output_file_names(files, fmt)):
+            if file_name is None:
+                _report_error(file, 'Output file name is not unique in "{}".'.format(output_dir), output_dir, errors)
+                continue
+            output_path = os.path.join(output_dir, file_name)
+            if os.path.realpath(output_path) in input_paths:
+                _report_error(
+                    file, 'Output file "{}" would overwrite an input file.'.format(output_path), output_dir, errors
+                )
+                continue
+            tasks.append((file, extract, fmt, output_path))
+    else:
+        tasks = [(file, extract, fmt, None) for file in files]
+
+    if workers <= 1:
+        results = map(_convert_file, tasks)
+        _collect_results(tasks, results, output_dir, errors)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_convert_file, tasks, chunksize=CHUNK_SIZE)
+            _collect_results(tasks, results, output_dir, errors)
+
+    return errors
+
+
+def _collect_results(tasks, results, output_dir, errors):
+    for task, (json_line, error) in zip(tasks, results):
+        file = task[0]
+        if error is not None:
+            _report_error(file, error, output_dir, errors)
+        elif output_dir is None:
+            print(json_line, flush=True)
+
+
+def _report_error(file, error, output_dir, errors):
+    errors.append({'file': file, 'error': error})
+    print('{}: {}'.format(file, error), file=sys.stderr)
+    if output_dir is None:
+        print(_json_line({'file': file, 'error': error}), flush=True)
+
+
+def _json_line(record):
+    return json.dumps(record, separators=(',', ':'))
@@ -2,20 +2,44 @@ import io
 import json
 import os
 import tarfile
+import threading
 from typing import List
 
-import docker
-from docker.errors import DockerException, APIError
+from docker.errors import DockerException, APIError, ImageNotFound
 from docker.models.containers import Container
 from docker.types import Ulimit
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, Timeout
 
 from cc_core.commons.docker_utils import create_container_with_gpus, detect_nvidia_docker_gpus
 from cc_core.commons.exceptions import AgentError
 from cc_core.commons.gpu_info import set_nvidia_environment_variables, GPUDevice
 
+from cc_faice.commons.container_backends import DockerBackend, DOCKER_BACKEND
+
 NOFILE_LIMIT = 4096
 
+# the user and group id of the cc user inside the docker container
+CONTAINER_USER_ID = 1000
+
+# seconds to wait for an exec to return, after its container was killed
+KILL_GRACE_PERIOD = 10
+
+# the number of connections kept open to the docker daemon, which is the default of docker-py
+DEFAULT_POOL_SIZE = 10
+
+# the timeout of docker api calls in seconds, which is the default of docker-py
+DEFAULT_TIMEOUT = 60
+
+
+# information about docker daemons keyed by their url, which is stored by DockerManager.cache_daemon_info(). A
+# long running faice server fills this cache once, so the processes forked for every request do not query the docker
+# daemon again.
+_daemon_info_cache = {}
+
+
+class ExecutionTimeoutError(Exception):
+    pass
+
 
 def env_vars(preserve_environment):
     if preserve_environment is None:
@@ -30,6 +54,159 @@ def env_vars(preserve_environment):
     return environment
 
 
+def is_transient_docker_error(exception):
+    """
+    Returns whether the given exception was caused by a transient docker error, like a lost connection to the docker
+    daemon or an internal server error of the docker daemon. Such errors may disappear, if the operation is retried.
+    The chain of exceptions, that were handled while the given exception was raised, is checked as well, because
+    docker errors are often wrapped into other exceptions.
+
+    :param exception: The exception to check
+    :type exception: BaseException
+
+    :return: True, if the given exception or one of its causes is a transient docker error
+    :rtype: bool
+    """
+    while exception is not None:
+        if isinstance(exception, APIError):
+            if exception.is_server_error():
+                return True
+        elif isinstance(exception, (ConnectionError, Timeout)):
+            return True
+        exception = exception.__cause__ or exception.__context__
+    return False
+
+
+def _exec_run_with_timeout(container, exec_kwargs, timeout):
+    """
+    Executes container.exec_run() in a separate thread and waits at most timeout seconds for the execution to end. If
+    the execution did not finish in time, the container is killed, which also terminates the exec.
+
+    :param container: The container to run the command in
+    :type container: Container
+    :param exec_kwargs: The keyword arguments for container.exec_run()
+    :type exec_kwargs: Dict
+    :param timeout: The number of seconds to wait for the execution
+    :type timeout: int or float
+
+    :return: The return value of container.exec_run()
+    :rtype: tuple
+
+    :raise ExecutionTimeoutError: If the execution did not finish within timeout seconds
+    """
+    outcome = {}
+
+    def exec_run():
+        try:
+            outcome['result'] = container.exec_run(**exec_kwargs)
+        except Exception as e:
+            outcome['error'] = e
+
+    exec_thread = threading.Thread(target=exec_run, daemon=True)
+    exec_thread.start()
+    exec_thread.join(timeout)
+
+    if exec_thread.is_alive():
+        try:
+            container.kill()
+        except (DockerException, ConnectionError):
+            pass
+        exec_thread.join(KILL_GRACE_PERIOD)
+        raise ExecutionTimeoutError(
+            'Execution of command "{}" in container "{}" did not finish within {} seconds. The container was killed.'
+            .format(exec_kwargs['cmd'], container.name, timeout)
+        )
+
+    if 'error' in outcome:
+        raise outcome['error']
+
+    return outcome['result']
+
+
+def _wrap_docker_errors(chunks):
+    """
+    Converts docker errors raised while iterating over the given chunks of a docker response to AgentErrors.
+    """
+    try:
+        for chunk in chunks:
+            yield chunk
+    except DockerException as e:
+        raise AgentError(str(e))
+
+
+def container_arguments(name, ram, working_directory, environment, enable_fuse=False, binds=None, cpuset_cpus=None):
+    """
+    Returns the arguments of docker.DockerClient.containers.create() for a container executing a blue agent. The
+    container runs endlessly as the cc user, until it is stopped. The arguments are shared by DockerManager and
+    AsyncDockerManager, so both create equal containers. GPUs are not included, because the way gpus are requested
+    depends on the runtimes of the docker daemon.
+
+    :param name: The name of the container
+    :type name: str
+    :param ram: The ram limit for this container in megabytes
+    :type ram: int or None
+    :param working_directory: The working directory inside the docker container
+    :type working_directory: str
+    :param environment: A dictionary containing environment variables, which should be set inside the container
+    :type environment: Dict[str, Any]
+    :param enable_fuse: If True, SYS_ADMIN capabilities are granted for this container and /dev/fuse is mounted
+    :type enable_fuse: bool
+    :param binds: A dictionary mapping host paths to bind specifications like {'bind': '/cc/outputs', 'mode': 'rw'}
+    :type binds: Dict[str, Dict[str, str]] or None
+    :param cpuset_cpus: The cpus in which the container is allowed to execute, given as cpu list like "0-3,8"
+    :type cpuset_cpus: str or None
+
+    :return: The keyword arguments of containers.create() without image and command
+    :rtype: Dict[str, Any]
+    """
+    mem_limit = None
+    if ram is not None:
+        mem_limit = '{}m'.format(ram)
+
+    # enable fuse
+    devices = []
+    capabilities = []
+    if enable_fuse:
+        devices.append('/dev/fuse')
+        capabilities.append('SYS_ADMIN')
+
+    return {
+        'name': name,
+        'user': '{0}:{0}'.format(CONTAINER_USER_ID),
+        'working_dir': working_directory,
+        'mem_limit': mem_limit,
+        'memswap_limit': mem_limit,
+        'environment': environment,
+        'cap_add': capabilities,
+        'devices': devices,
+        'volumes': binds,
+        'cpuset_cpus': cpuset_cpus,
+        'ulimits': [Ulimit(name='nofile', soft=NOFILE_LIMIT, hard=NOFILE_LIMIT)],
+        # needed to run the container endlessly
+        'tty': True,
+        'stdin_open': True,
+        'auto_remove': False
+    }
+
+
+def prepare_bind_directory(host_directory):
+    """
+    Creates the given host directory, so it can be bind mounted into a docker container and is writable for the cc user
+    inside the container. If faice runs as root, the ownership of the directory is transferred to the cc user.
+    Otherwise, if faice does not run with the user id of the cc user, the directory is made writable for everyone.
+
+    :param host_directory: The absolute path of the directory on the host
+    :type host_directory: str
+    """
+    os.makedirs(host_directory, exist_ok=True)
+
+    euid = os.geteuid()
+    if euid == 0:
+        os.chown(host_directory, CONTAINER_USER_ID, CONTAINER_USER_ID)
+    elif euid != CONTAINER_USER_ID:
+        os.chmod(host_directory, 0o777)
+
+
 class AgentExecutionResult:
     def __init__(self, return_code, stdout, stderr, stats):
         """
@@ -87,16 +264,94 @@ class AgentExecutionResult:
 
 
 class DockerManager:
-    def __init__(self):
-        try:
-            self._client = docker.from_env()
-            info = self._client.info()  # This raises a ConnectionError, if the docker socket was not found
-        except ConnectionError:
-            raise DockerException('Could not connect to docker socket. Is the docker daemon running?')
-        except DockerException:
-            raise DockerException('Could not create docker client from environment.')
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, base_url=None, backend=None):
+        """
+        Creates a new DockerManager. The connection to the docker daemon is established lazily, when the first docker
+        operation is executed.
+
+        :param pool_size: The maximal number of connections kept open to the docker daemon. Should be at least the
+                          number of docker operations executed at the same time.
+        :type pool_size: int
+        :param timeout: The timeout of docker api calls in seconds
+        :type timeout: int
+        :param base_url: The url of the docker daemon, like "tcp://10.0.0.2:2376". If None, the docker daemon is
+                         configured by the environment, like the docker command line client does.
+        :type base_url: str or None
+        :param backend: The container backend creating the docker client. If None, docker-py is used.
+        :type backend: ContainerBackend or None
+        """
+        self._pool_size = pool_size
+        self._backend = backend or DockerBackend()
+        self._timeout = timeout
+        self.base_url = base_url
+        self._client_lock = threading.Lock()
+        self._client_instance = None
+        self._runtimes_instance = None
+
+    @property
+    def _client(self):
+        """
+        :return: The docker client of this DockerManager, which is created on first access
+        :rtype: docker.DockerClient
+
+        :raise DockerException: If the docker client could not be created or the docker daemon is not reachable
+        """
+        if self._client_instance is None:
+            self._connect()
+        return self._client_instance
+
+    @property
+    def _runtimes(self):
+        """
+        :return: The runtimes available in the docker daemon, as given by the docker info call
+        :rtype: Dict
+        """
+        if self._client_instance is None:
+            self._connect()
+        return self._runtimes_instance
 
-        self._runtimes = info.get('Runtimes')
+    def _daemon_key(self):
+        """
+        :return: A key identifying the docker daemon of this DockerManager in the daemon info cache
+        :rtype: str
+        """
+        if self._backend.name != DOCKER_BACKEND:
+            return '{}:{}'.format(self._backend.name, self.base_url)
+        if self.base_url is not None:
+            return self.base_url
+        return os.environ.get('DOCKER_HOST', '')
+
+    def _connect(self):
+        """
+        Creates the docker client and caches the runtimes of the docker daemon.
+
+        :raise DockerException: If the docker client could not be created or the docker daemon is not reachable
+        """
+        with self._client_lock:
+            if self._client_instance is not None:
+                return
+
+            try:
+                client = self._backend.create_client(self.base_url, self._pool_size, self._timeout)
+
+                cached_info = _daemon_info_cache.get(self._daemon_key())
+                if cached_info is not None:
+                    self._runtimes_instance = cached_info['runtimes']
+                    self._client_instance = client
+                    return
+
+                info = client.info()  # This raises a ConnectionError, if the docker socket was not found
+            except ConnectionError:
+                if self.base_url is None:
+                    raise DockerException('Could not connect to docker socket. Is the docker daemon running?')
+                raise DockerException('Could not connect to docker daemon "{}".'.format(self.base_url))
+            except DockerException:
+                if self.base_url is None:
+                    raise DockerException('Could not create docker client from environment.')
+                raise DockerException('Could not create docker client for "{}".'.format(self.base_url))
+
+            self._runtimes_instance = info.get('Runtimes')
+            self._client_instance = client
 
     def get_nvidia_docker_gpus(self):
         """
@@ -110,11 +365,52 @@ class DockerManager:
         :return: A list of GPUDevices
         :rtype: List[GPUDevice]
         """
+        cached_info = _daemon_info_cache.get(self._daemon_key())
+        if cached_info is not None and cached_info['gpus'] is not None:
+            return cached_info['gpus']
         return detect_nvidia_docker_gpus(self._client, self._runtimes)
 
+    def cache_daemon_info(self, detect_gpus=False):
+        """
+        Stores the runtimes and optionally the gpus of the docker daemon in a cache, which is used by all DockerManagers
+        of this process and of processes forked afterwards. Connecting to a cached docker daemon does not query the
+        daemon, so this should only be used by long running processes like the faice server.
+
+        :param detect_gpus: If True, the nvidia gpus of the docker daemon are detected and cached as well
+        :type detect_gpus: bool
+
+        :raise DockerException: If the docker daemon is not reachable or gpus could not be detected
+        """
+        gpus = None
+        if detect_gpus:
+            gpus = detect_nvidia_docker_gpus(self._client, self._runtimes)
+
+        _daemon_info_cache[self._daemon_key()] = {'runtimes': self._runtimes, 'gpus': gpus}
+
     def pull(self, image, auth=None):
         self._client.images.pull(image, auth_config=auth)
 
+    def get_image_digest(self, image):
+        """
+        Returns the digest of the given local image. The repository digest is preferred, because it identifies the
+        image across hosts. Images without repository digest, like locally built images, are identified by their id.
+
+        :param image: The image url
+        :type image: str
+
+        :return: The digest of the image or None, if the image is not present on the docker host
+        :rtype: str or None
+        """
+        try:
+            docker_image = self._client.images.get(image)
+        except ImageNotFound:
+            return None
+
+        repo_digests = docker_image.attrs.get('RepoDigests')
+        if repo_digests:
+            return repo_digests[0]
+        return docker_image.id
+
     def create_container(
             self,
             name,
@@ -123,7 +419,9 @@ class DockerManager:
             working_directory,
             gpus=None,
             environment=None,
-            enable_fuse=False
+            enable_fuse=False,
+            binds=None,
+            cpuset_cpus=None
     ):
         """
         Creates a docker container with the given arguments. This docker container is running endlessly until
@@ -145,6 +443,10 @@ class DockerManager:
         :type environment: Dict[str, Any]
         :param enable_fuse: If True, SYS_ADMIN capabilities are granted for this container and /dev/fuse is mounted
         :type enable_fuse: bool
+        :param binds: A dictionary mapping host paths to bind specifications like {'bind': '/cc/outputs', 'mode': 'rw'}
+        :type binds: Dict[str, Dict[str, str]] or None
+        :param cpuset_cpus: The cpus in which the container is allowed to execute, given as cpu list like "0-3,8"
+        :type cpuset_cpus: str or None
 
         :return: The created container
         :rtype: Container
@@ -154,46 +456,43 @@ class DockerManager:
         if environment is None:
             environment = {}
 
-        mem_limit = None
-        if ram is not None:
-            mem_limit = '{}m'.format(ram)
-
         gpu_ids = None
         if gpus:
             set_nvidia_environment_variables(environment, map(lambda gpu: gpu.device_id, gpus))
             gpu_ids = [gpu.device_id for gpu in gpus]
 
-        # enable fuse
-        devices = []
-        capabilities = []
-        if enable_fuse:
-            devices.append('/dev/fuse')
-            capabilities.append('SYS_ADMIN')
-
         container = create_container_with_gpus(
             self._client,
             image,
             command='/bin/sh',
             gpus=gpu_ids,
             available_runtimes=self._runtimes,
-            name=name,
-            user='1000:1000',
-            working_dir=working_directory,
-            mem_limit=mem_limit,
-            memswap_limit=mem_limit,
-            environment=environment,
-            cap_add=capabilities,
-            devices=devices,
-            ulimits=[Ulimit(name='nofile', soft=NOFILE_LIMIT, hard=NOFILE_LIMIT)],
-            # needed to run the container endlessly
-            tty=True,
-            stdin_open=True,
-            auto_remove=False,
+            **container_arguments(
+                name=name,
+                ram=ram,
+                working_directory=working_directory,
+                environment=environment,
+                enable_fuse=enable_fuse,
+                binds=binds,
+                cpuset_cpus=cpuset_cpus
+            )
         )
         container.start()
 
         return container
 
+    @staticmethod
+    def set_cpuset(container, cpuset_cpus):
+        """
+        Restricts the given running container to the given cpus.
+
+        :param container: The container to restrict
+        :type container: Container
+        :param cpuset_cpus: The cpus in which the container is allowed to execute, given as cpu list like "0-3,8"
+        :type cpuset_cpus: str
+        """
+        container.update(cpuset_cpus=cpuset_cpus)
+
     @staticmethod
     def put_archive(container, archive):
         """
@@ -207,7 +506,7 @@ class DockerManager:
         container.put_archive('/', archive)
 
     @staticmethod
-    def run_command(container, command, user='cc', work_dir=None):
+    def run_command(container, command, user='cc', work_dir=None, timeout=None):
         """
         Runs the given command in the given container and waits for the execution to end.
 
@@ -220,19 +519,30 @@ class DockerManager:
         :type user: str or int
         :param work_dir: The working directory where to execute the command
         :type work_dir: str
+        :param timeout: The number of seconds after which the execution is aborted. If None, the execution is not
+                        limited in time.
+        :type timeout: int or float or None
 
         :return: A agent execution result, representing the result of this container execution
         :rtype: AgentExecutionResult
+
+        :raise ExecutionTimeoutError: If the execution did not finish within timeout seconds. In this case the given
+                                      container is killed.
         """
+        exec_kwargs = {
+            'cmd': command,
+            'user': user,
+            'workdir': work_dir,
+            'stdout': True,
+            'stderr': True,
+            'demux': True
+        }
+
         try:
-            return_code, logs = container.exec_run(
-                cmd=command,
-                user=user,
-                workdir=work_dir,
-                stdout=True,
-                stderr=True,
-                demux=True
-            )
+            if timeout is None:
+                return_code, logs = container.exec_run(**exec_kwargs)
+            else:
+                return_code, logs = _exec_run_with_timeout(container, exec_kwargs, timeout)
         except APIError as e:
             raise ValueError(
                 'could not execute command "{}" in container "{}". Failed with the following message:\n{}'
@@ -280,3 +590,27 @@ class DockerManager:
             raise AgentError(str(e))
 
         return tarfile.TarFile(fileobj=output_archive_bytes)
+
+    @staticmethod
+    def stream_file_archive(container, file_path):
+        """
+        Retrieves the given file path as tar-archive from the internal docker container without keeping the archive in
+        memory.
+
+        :param container: The container to get the archive from
+        :type container: Container
+        :param file_path: A file path inside the docker container
+        :type file_path: str
+
+        :return: The tar archive, which corresponds to the given file path, as iterator of byte chunks
+        :rtype: Iterator[bytes]
+
+        :raise AgentError: If the given file could not be fetched. The error may be raised while iterating.
+        """
+        try:
+            bits, _ = container.get_archive(file_path)
+        except DockerException as e:
+            raise AgentError(str(e))
+
+        return _wrap_docker_errors(bits)
+
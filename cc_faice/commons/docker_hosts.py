@@ -0,0 +1,98 @@
+import threading
+from contextlib import contextmanager
+
+LOCAL_DOCKER_HOST_SCHEME = 'unix://'
+
+
+def read_docker_hosts_file(path):
+    """
+    Reads docker host urls from the given file. The file contains one url per line, like "tcp://10.0.0.2:2376". Empty
+    lines and lines starting with "#" are ignored.
+
+    :param path: The path to the hosts file
+    :type path: str
+
+    :return: The docker host urls in the order of the file
+    :rtype: List[str]
+    """
+    docker_hosts = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                docker_hosts.append(line)
+    return docker_hosts
+
+
+def is_local_docker_host(url):
+    """
+    Returns whether the docker daemon with the given url runs on this machine, so host paths can be bind mounted into
+    its containers. Only daemons reachable via a unix socket are considered local.
+
+    :param url: The docker host url
+    :type url: str
+
+    :rtype: bool
+    """
+    return url.startswith(LOCAL_DOCKER_HOST_SCHEME)
+
+
+class DockerHost:
+    def __init__(self, docker_manager, gpus=None):
+        """
+        A docker daemon, which executes batches, together with the gpus used on this daemon.
+
+        :param docker_manager: The docker manager connected to the docker daemon
+        :type docker_manager: DockerManager
+        :param gpus: The gpus to use for batches executed on this daemon
+        :type gpus: List[GPUDevice] or None
+        """
+        self.docker_manager = docker_manager
+        self.gpus = gpus
+
+
+class DockerHostPool:
+    def __init__(self, docker_hosts, capacity):
+        """
+        Creates a pool of docker hosts. Every batch acquires a docker host for the duration of its execution and the
+        docker host with the fewest acquired batches is chosen. Each docker host executes at most capacity batches at
+        the same time.
+
+        :param docker_hosts: The docker hosts of this pool
+        :type docker_hosts: List[DockerHost]
+        :param capacity: The maximal number of batches executed on a single docker host at the same time
+        :type capacity: int
+        """
+        if not docker_hosts:
+            raise ValueError('At least one docker host is required.')
+        if capacity < 1:
+            raise ValueError('The capacity of a docker host must be at least 1, but found {}.'.format(capacity))
+
+        self._docker_hosts = docker_hosts
+        self._capacity = capacity
+        self._active = [0] * len(docker_hosts)
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return len(self._docker_hosts)
+
+    @contextmanager
+    def acquire(self):
+        """
+        Acquires a docker host with free capacity for the duration of the with block. If all docker hosts are at
+        capacity, this function waits until a batch released its docker host.
+
+        :return: The acquired docker host
+        :rtype: DockerHost
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: min(self._active) < self._capacity)
+            host_index = self._active.index(min(self._active))
+            self._active[host_index] += 1
+
+        try:
+            yield self._docker_hosts[host_index]
+        finally:
+            with self._condition:
+                self._active[host_index] -= 1
+                self._condition.notify_all()
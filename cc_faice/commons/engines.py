@@ -0,0 +1,58 @@
+import jsonschema
+from jsonschema.exceptions import ValidationError
+
+from cc_core.commons.engines import engine_validation
+from cc_core.commons.exceptions import EngineError
+
+# container settings, which are understood by faice in addition to the settings defined in cc-core
+faice_docker_settings_schema = {
+    'type': 'object',
+    'properties': {
+        'batchTimeout': {'type': 'integer', 'minimum': 1},
+        'cpus': {'type': 'integer', 'minimum': 1}
+    }
+}
+
+
+def container_engine_validation(red_data):
+    """
+    Validates the container engine of the given red data. The container settings may contain the additional settings
+    defined in faice_docker_settings_schema, which are removed before the remaining settings are validated against the
+    cc-core schema. The given red data is not modified.
+
+    :param red_data: The red data to validate
+    :type red_data: Dict[str, Any]
+
+    :return: A dictionary containing the additional faice settings found in the container settings
+    :rtype: Dict[str, Any]
+
+    :raise EngineError: If the container engine is not valid
+    """
+    container = red_data.get('container')
+    if not isinstance(container, dict) or not isinstance(container.get('settings'), dict):
+        engine_validation(red_data, 'container', ['docker'], optional=False)
+        return {}
+
+    settings = container['settings']
+    faice_keys = faice_docker_settings_schema['properties'].keys()
+    faice_settings = {key: value for key, value in settings.items() if key in faice_keys}
+
+    core_container = dict(container)
+    core_container['settings'] = {key: value for key, value in settings.items() if key not in faice_keys}
+    core_red_data = dict(red_data)
+    core_red_data['container'] = core_container
+
+    engine_validation(core_red_data, 'container', ['docker'], optional=False)
+
+    try:
+        jsonschema.validate(faice_settings, faice_docker_settings_schema)
+    except ValidationError as e:
+        where = '/'.join([str(s) for s in e.absolute_path]) if e.absolute_path else '/'
+        raise EngineError(
+            'container-engine "{}" specification in REDFILE does not comply with jsonschema:\n'
+            '\tkey in engine settings: {}\n'
+            '\treason: {}'
+            .format(container.get('engine'), where, e.message)
+        )
+
+    return faice_settings
@@ -0,0 +1,116 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def execute_batches(batches, process_batch, workers):
+    """
+    Calls process_batch for every element of batches using at most the given number of worker threads. Elements are
+    taken from batches only when a worker is available, so batches may be a lazy iterator.
+
+    If process_batch raises an exception, no further batches are started. The batches already running are awaited and
+    the first exception is raised afterwards.
+
+    :param batches: An iterable of batches
+    :type batches: Iterable
+    :param process_batch: A function called with a single batch
+    :type process_batch: Callable
+    :param workers: The maximal number of batches processed at the same time
+    :type workers: int
+    """
+    if workers <= 1:
+        for batch in batches:
+            process_batch(batch)
+        return
+
+    error = None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        for batch in batches:
+            if len(running) >= workers:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                error = _first_error(done)
+                if error is not None:
+                    break
+
+            running.add(pool.submit(process_batch, batch))
+
+        done, _ = wait(running)
+        if error is None:
+            error = _first_error(done)
+
+    if error is not None:
+        raise error
+
+
+async def execute_batches_async(batches, process_batch, jobs):
+    """
+    The asyncio counterpart of execute_batches(). Awaits the coroutine process_batch for every element of batches with
+    at most the given number of batches processed at the same time. Elements are taken from batches only when a batch
+    completed, so batches may be a lazy iterator.
+
+    If process_batch raises an exception, no further batches are started. The batches already running are awaited and
+    the first exception is raised afterwards.
+
+    :param batches: An iterable of batches
+    :type batches: Iterable
+    :param process_batch: A coroutine function called with a single batch
+    :type process_batch: Callable[[Any], Awaitable]
+    :param jobs: The maximal number of batches processed at the same time
+    :type jobs: int
+    """
+    error = None
+    running = set()
+    for batch in batches:
+        running.add(asyncio.ensure_future(process_batch(batch)))
+        if len(running) >= jobs:
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            error = _first_error(done)
+            if error is not None:
+                break
+
+    if running:
+        done, _ = await asyncio.wait(running)
+        remaining_error = _first_error(done)
+        if error is None:
+            error = remaining_error
+
+    if error is not None:
+        raise error
+
+
+def _first_error(futures):
+    """
+    :param futures: Completed futures
+    :type futures: Iterable[Future]
+
+    :return: The exception of the first failed future or None, if all futures succeeded
+    :rtype: BaseException or None
+    """
+    first_error = None
+    for future in futures:
+        # the exceptions of all futures are retrieved, so asyncio does not report them as never retrieved
+        error = future.exception()
+        if first_error is None:
+            first_error = error
+    return first_error
+
+
+def longest_first_order(batch_hashes, predicted_durations):
+    """
+    Orders batches by their predicted duration, longest first, so long batches do not extend the total execution time
+    by starting last. Batches without prediction are started first in their original order, because they may take
+    arbitrarily long.
+
+    :param batch_hashes: The stable hashes of the batches in their original order
+    :type batch_hashes: List[str]
+    :param predicted_durations: A dictionary mapping batch hashes to predicted durations
+    :type predicted_durations: Dict[str, float]
+
+    :return: The batch indices in execution order
+    :rtype: List[int]
+    """
+    return sorted(
+        range(len(batch_hashes)),
+        key=lambda batch_index: -predicted_durations.get(batch_hashes[batch_index], float('inf'))
+    )
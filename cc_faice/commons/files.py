@@ -0,0 +1,22 @@
+"""
+Checks of files and directories, which are used by several modules. This module only uses the standard library, so it
+can be imported by the faice server client.
+"""
+import os
+import stat
+
+
+
+def is_private_directory(path):
+    """
+    :param path: The path of a directory
+    :type path: str
+
+    :return: Whether the given path is a directory, which is owned by the current user and not writable by others
+    :rtype: bool
+    """
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(status.st_mode) and status.st_uid == os.getuid() and not status.st_mode & 0o022
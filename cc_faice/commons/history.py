@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+import time
+
+HISTORY_FILE = os.path.join(os.path.expanduser('~'), '.faice_history.sqlite')
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_hash TEXT NOT NULL,
+    image TEXT,
+    image_digest TEXT,
+    state TEXT NOT NULL,
+    duration REAL,
+    peak_memory INTEGER,
+    finished REAL NOT NULL
+)
+"""
+
+HISTORY_INDEX = 'CREATE INDEX IF NOT EXISTS runs_batch_hash ON runs (batch_hash)'
+
+# the number of most recent successful runs of a batch, which are used to predict its duration
+PREDICTION_WINDOW = 5
+
+
+def peak_memory_usage(container_stats):
+    """
+    Returns the peak memory usage of a container as given by the docker stats. Docker only reports max_usage for
+    cgroup v1, so the current usage is used as approximation otherwise.
+
+    :param container_stats: The stats of the container as returned by container.stats(stream=False)
+    :type container_stats: Dict or None
+
+    :return: The peak memory usage in bytes or None, if the stats do not contain memory information
+    :rtype: int or None
+    """
+    if not container_stats:
+        return None
+
+    memory_stats = container_stats.get('memory_stats') or {}
+    return memory_stats.get('max_usage', memory_stats.get('usage'))
+
+
+class BatchHistory:
+    def __init__(self, path):
+        """
+        Opens the run history stored in the given sqlite database file. In contrast to the run journal, the history
+        is kept across runs and records every execution of a batch, identified by its stable hash, with its duration,
+        peak memory usage and the digest of the docker image used.
+
+        :param path: The path to the sqlite database file. The file is created, if it does not exist.
+        :type path: str
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(HISTORY_SCHEMA)
+            self._connection.execute(HISTORY_INDEX)
+
+    def record(self, batch_hash, image, image_digest, state, duration, peak_memory):
+        """
+        Stores an execution of the given batch.
+
+        :param batch_hash: The stable hash of the batch as given by red_batch_hash()
+        :type batch_hash: str
+        :param image: The docker image url
+        :type image: str
+        :param image_digest: The digest of the docker image
+        :type image_digest: str or None
+        :param state: The state of the batch execution
+        :type state: str
+        :param duration: The execution time of the blue agent in seconds
+        :type duration: float or None
+        :param peak_memory: The peak memory usage of the container in bytes
+        :type peak_memory: int or None
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO runs (batch_hash, image, image_digest, state, duration, peak_memory, finished) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (batch_hash, image, image_digest, state, duration, peak_memory, time.time())
+            )
+
+    def predicted_durations(self, batch_hashes):
+        """
+        Predicts the duration of the given batches as mean duration of their most recent successful runs.
+
+        :param batch_hashes: The stable hashes of the batches
+        :type batch_hashes: Iterable[str]
+
+        :return: A dictionary mapping batch hashes to predicted durations in seconds. Batches without successful runs
+                 are missing.
+        :rtype: Dict[str, float]
+        """
+        batch_hashes = set(batch_hashes)
+        durations = {}
+
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT batch_hash, duration FROM runs WHERE state = ? AND duration IS NOT NULL ORDER BY id DESC',
+                ('succeeded',)
+            )
+            for batch_hash, duration in rows:
+                if batch_hash not in batch_hashes:
+                    continue
+                batch_durations = durations.setdefault(batch_hash, [])
+                if len(batch_durations) < PREDICTION_WINDOW:
+                    batch_durations.append(duration)
+
+        return {
+            batch_hash: sum(batch_durations) / len(batch_durations)
+            for batch_hash, batch_durations in durations.items()
+        }
+
+    def runs(self, batch_hash=None, limit=None):
+        """
+        Returns the recorded runs, most recent first.
+
+        :param batch_hash: If given, only runs of the batch with this hash are returned
+        :type batch_hash: str or None
+        :param limit: The maximal number of runs to return. If None, all runs are returned.
+        :type limit: int or None
+
+        :return: The recorded runs as dictionaries
+        :rtype: List[Dict[str, Any]]
+        """
+        query = 'SELECT batch_hash, image, image_digest, state, duration, peak_memory, finished FROM runs'
+        parameters = []
+        if batch_hash is not None:
+            query += ' WHERE batch_hash = ?'
+            parameters.append(batch_hash)
+        query += ' ORDER BY id DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+
+        return [
+            {
+                'batchHash': row[0],
+                'image': row[1],
+                'imageDigest': row[2],
+                'state': row[3],
+                'duration': row[4],
+                'peakMemory': row[5],
+                'finished': row[6]
+            }
+            for row in rows
+        ]
+
+    def summary(self, batch_hash=None):
+        """
+        Aggregates the recorded runs per batch.
+
+        :param batch_hash: If given, only the batch with this hash is summarized
+        :type batch_hash: str or None
+
+        :return: One dictionary per batch containing the number of runs, the mean and maximal duration of successful
+                 runs and the maximal peak memory usage
+        :rtype: List[Dict[str, Any]]
+        """
+        query = 'SELECT batch_hash, COUNT(*), ' \
+                'AVG(CASE WHEN state = ? THEN duration END), MAX(CASE WHEN state = ? THEN duration END), ' \
+                'MAX(peak_memory), MAX(finished) FROM runs'
+        parameters = ['succeeded', 'succeeded']
+        if batch_hash is not None:
+            query += ' WHERE batch_hash = ?'
+            parameters.append(batch_hash)
+        query += ' GROUP BY batch_hash ORDER BY MAX(finished) DESC'
+
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+
+        return [
+            {
+                'batchHash': row[0],
+                'runs': row[1],
+                'meanDuration': row[2],
+                'maxDuration': row[3],
+                'peakMemory': row[4],
+                'lastFinished': row[5]
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,140 @@
+import errno
+import fcntl
+import os
+import stat
+import tempfile
+import time
+from contextlib import contextmanager
+
+from cc_faice.commons.files import is_private_directory
+
+HOST_SLOTS_ENVVAR = 'FAICE_HOST_SLOTS'
+HOST_SLOTS_DIRECTORY_ENVVAR = 'FAICE_HOST_SLOTS_DIR'
+# the default directory is only used by the current user, a directory shared by several users has to be configured
+DEFAULT_HOST_SLOTS_DIRECTORY = os.path.join(tempfile.gettempdir(), 'faice_host_slots-{}'.format(os.getuid()))
+
+# seconds to wait before trying to acquire a slot again, if all slots are in use
+POLL_INTERVAL = 0.5
+
+
+class HostSlots:
+    def __init__(self, limit, directory=DEFAULT_HOST_SLOTS_DIRECTORY):
+        """
+        Creates a host wide semaphore, which limits the number of containers running at the same time across all faice
+        processes on this host. Every slot is represented by a lock file inside the given directory and a slot is held
+        by locking its file. The kernel releases the lock, if the holding process terminates, so slots of crashed
+        processes become available again automatically.
+
+        To share slots between several users, the directory has to be created by root with mode 1777 like /tmp. Other
+        directories have to be owned by the current user and must not be writable by other users, because other users
+        could hold or block the slots otherwise.
+
+        :param limit: The maximal number of slots held at the same time
+        :type limit: int
+        :param directory: The directory containing the lock files. It is created only accessible by the current user,
+                          if it does not exist.
+        :type directory: str
+
+        :raise ValueError: If limit is not positive or the directory could be manipulated by other users
+        """
+        if limit < 1:
+            raise ValueError('The number of host slots must be at least 1, but found {}.'.format(limit))
+
+        self._limit = limit
+        self._directory = directory
+
+        try:
+            os.makedirs(directory, mode=0o700)
+        except FileExistsError:
+            pass
+        _check_slots_directory(directory)
+
+    @staticmethod
+    def from_environment():
+        """
+        Creates host slots configured by the environment variables FAICE_HOST_SLOTS and FAICE_HOST_SLOTS_DIR.
+
+        :return: The configured host slots or None, if FAICE_HOST_SLOTS is not set
+        :rtype: HostSlots or None
+
+        :raise ValueError: If FAICE_HOST_SLOTS is not a positive integer
+        """
+        limit = os.environ.get(HOST_SLOTS_ENVVAR)
+        if not limit:
+            return None
+
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError(
+                'The environment variable {} should be an integer, but found "{}".'.format(HOST_SLOTS_ENVVAR, limit)
+            )
+
+        directory = os.environ.get(HOST_SLOTS_DIRECTORY_ENVVAR, DEFAULT_HOST_SLOTS_DIRECTORY)
+        return HostSlots(limit, directory)
+
+    @contextmanager
+    def acquire(self):
+        """
+        Holds a host slot for the duration of the with block. If all slots are held by other processes or threads,
+        this function waits until a slot becomes available.
+        """
+        slot_fd = None
+        while slot_fd is None:
+            slot_fd = self._try_acquire()
+            if slot_fd is None:
+                time.sleep(POLL_INTERVAL)
+
+        try:
+            yield
+        finally:
+            # closing the file descriptor releases the lock
+            os.close(slot_fd)
+
+    def _try_acquire(self):
+        """
+        Tries to lock one of the slot files.
+
+        :return: The file descriptor of the locked slot file or None, if all slots are in use
+        :rtype: int or None
+        """
+        for slot_index in range(self._limit):
+            slot_path = os.path.join(self._directory, 'slot_{}.lock'.format(slot_index))
+
+            # a read only file descriptor is sufficient for flock and does not require write permissions on lock files
+            # created by other users
+            try:
+                slot_fd = os.open(slot_path, os.O_RDONLY | os.O_CREAT | os.O_NOFOLLOW, 0o644)
+            except OSError as e:
+                # lock files of other users, which are not readable, or symbolic links are never used as slots
+                if e.errno not in (errno.EACCES, errno.EPERM, errno.ELOOP):
+                    raise
+                continue
+            try:
+                fcntl.flock(slot_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (BlockingIOError, PermissionError):
+                os.close(slot_fd)
+                continue
+            return slot_fd
+
+        return None
+
+
+def _check_slots_directory(directory):
+    """
+    Checks that the given directory can not be manipulated by other users. It has to be a private directory of the
+    current user or a directory owned by root with the sticky bit set, so only the owner of a lock file may remove it.
+
+    :raise ValueError: If the given directory could be manipulated by other users
+    """
+    if is_private_directory(directory):
+        return
+
+    status = os.lstat(directory)
+    if not stat.S_ISDIR(status.st_mode):
+        raise ValueError('The host slots directory "{}" is not a directory.'.format(directory))
+    if status.st_uid != 0 or not status.st_mode & stat.S_ISVTX:
+        raise ValueError(
+            'The host slots directory "{}" must be owned by the current user and must not be writable by other users, '
+            'or it must be owned by root and have the sticky bit set.'.format(directory)
+        )
@@ -0,0 +1,399 @@
+"""
+A host-side cache of batch inputs, which are received with the http connector. Batches of an experiment often share
+inputs like a reference dataset, which would otherwise be downloaded by the blue agent of every batch. Shared inputs are
+fetched once into a content-addressed cache directory on the host and bind mounted read-only into the containers. The
+input connectors of these inputs are replaced by a small connector, which links the mounted file to the input path.
+
+Cached files are revalidated with conditional requests, if the http server provides an ETag or Last-Modified header,
+so an unchanged input is only downloaded once across several executions.
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.auth import HTTPBasicAuth, HTTPDigestAuth
+
+INPUT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.faice_input_cache')
+
+# the maximal size of all cached files in megabytes
+DEFAULT_INPUT_CACHE_SIZE = 10240
+
+HTTP_CONNECTOR_COMMANDS = {'red-connector-http'}
+HTTP_ACCESS_KEYS = {'url', 'method', 'auth', 'disableSSLVerification'}
+HTTP_AUTH_METHODS = {'basic': HTTPBasicAuth, 'digest': HTTPDigestAuth}
+
+# inputs used less often are received by the blue agents, because fetching them on the host saves nothing
+MIN_INPUT_USES = 2
+
+# seconds to wait for the connection and for every chunk of an input
+FETCH_TIMEOUT = 60
+FETCH_CHUNK_SIZE = 1024 * 1024
+
+OBJECTS_DIRECTORY = 'objects'
+REQUESTS_DIRECTORY = 'requests'
+CONNECTOR_FILE = 'cache_connector.py'
+
+CONTAINER_INPUT_CACHE_DIR = '/cc/input_cache'
+CONTAINER_CACHE_CONNECTOR_PATH = '/cc/cache_connector.py'
+
+CACHE_CONNECTOR_SOURCE = '''#!/usr/bin/env python3
+"""
+Receives an input file, which was fetched by faice and is mounted into the container, by linking it to the input path.
+"""
+import json
+import os
+import sys
+
+
+def main():
+    if sys.argv[1:] == ['cli-version']:
+        print('1')
+        return 0
+
+    command, access_file = sys.argv[1:3]
+    with open(access_file) as f:
+        path = json.load(f)['path']
+
+    if not os.path.isfile(path):
+        print('The cached input file "{}" is not mounted.'.format(path), file=sys.stderr)
+        return 1
+
+    if command == 'receive-file-validate':
+        return 0
+    if command == 'receive-file':
+        os.symlink(path, sys.argv[3])
+        return 0
+
+    print('The cache connector does not support "{}".'.format(command), file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    exit(main())
+'''
+
+
+def _iter_input_files(batch):
+    """
+    Yields the input key, the list index or None and the value of every input file of the given red or blue batch.
+
+    :param batch: The red or blue batch to analyse
+    :type batch: Dict
+    """
+    for input_key, input_value in batch['inputs'].items():
+        if isinstance(input_value, list):
+            for index, input_value_element in enumerate(input_value):
+                if isinstance(input_value_element, dict):
+                    yield input_key, index, input_value_element
+        elif isinstance(input_value, dict):
+            yield input_key, None, input_value
+
+
+def input_request_key(input_value):
+    """
+    Returns the key identifying the request of the given input, if it is a file received with the http connector,
+    which can be fetched by faice.
+
+    :param input_value: A file or directory input of a red or blue batch
+    :type input_value: Dict
+
+    :return: The sha256 hash of the connector data or None, if the input can not be fetched by faice
+    :rtype: str or None
+    """
+    if input_value.get('class') != 'File':
+        return None
+
+    connector = input_value.get('connector') or {}
+    access = connector.get('access')
+    if connector.get('command') not in HTTP_CONNECTOR_COMMANDS or connector.get('mount', False):
+        return None
+    if not isinstance(access, dict) or not isinstance(access.get('url'), str) or set(access) - HTTP_ACCESS_KEYS:
+        return None
+    if access.get('method', 'GET').upper() != 'GET':
+        return None
+
+    auth = access.get('auth')
+    if auth is not None and str(auth.get('method', 'basic')).lower() not in HTTP_AUTH_METHODS:
+        return None
+
+    request_data = json.dumps([connector['command'], access], sort_keys=True)
+    return hashlib.sha256(request_data.encode('utf-8')).hexdigest()
+
+
+def shared_input_requests(batches, min_uses=MIN_INPUT_USES):
+    """
+    Returns the inputs, which can be fetched by faice and are used at least min_uses times by the given batches.
+
+    :param batches: The red or blue batches to analyse
+    :type batches: Iterable[Dict]
+    :param min_uses: The minimal number of uses of an input
+    :type min_uses: int
+
+    :return: A dictionary mapping request keys to the access information of the inputs
+    :rtype: Dict[str, Dict]
+    """
+    uses = {}
+    accesses = {}
+    for batch in batches:
+        for _, _, input_value in _iter_input_files(batch):
+            request_key = input_request_key(input_value)
+            if request_key is None:
+                continue
+            uses[request_key] = uses.get(request_key, 0) + 1
+            accesses[request_key] = input_value['connector']['access']
+
+    return {request_key: accesses[request_key] for request_key, count in uses.items() if count >= min_uses}
+
+
+class InputCache:
+    def __init__(self, directory, max_size=DEFAULT_INPUT_CACHE_SIZE):
+        """
+        An on-disk cache of input files. Every file is stored under the sha256 hash of its content, so inputs with the
+        same content are stored once. For every request the hash of the received content and the validators of the
+        http response are stored, so unchanged inputs are not downloaded again. Files are evicted in least recently
+        used order, if their total size exceeds max_size.
+
+        The cache directory is only accessible by the current user, because inputs may require credentials.
+
+        :param directory: The cache directory. It is created, if it does not exist.
+        :type directory: str
+        :param max_size: The maximal size of all cached files in megabytes
+        :type max_size: int
+        """
+        if max_size < 1:
+            raise ValueError('The size of the input cache must be at least 1 megabyte, but found {}.'.format(max_size))
+
+        self._directory = os.path.abspath(os.path.expanduser(directory))
+        self._max_size = max_size * 1024 * 1024
+        self._objects_directory = os.path.join(self._directory, OBJECTS_DIRECTORY)
+        self._requests_directory = os.path.join(self._directory, REQUESTS_DIRECTORY)
+
+        # maps the request keys of fetched inputs to the hashes of their content
+        self._digests = {}
+
+        os.makedirs(self._directory, mode=0o700, exist_ok=True)
+        os.makedirs(self._objects_directory, mode=0o700, exist_ok=True)
+        os.makedirs(self._requests_directory, mode=0o700, exist_ok=True)
+
+        self._connector_path = os.path.join(self._directory, CONNECTOR_FILE)
+        self._write_connector()
+
+    def _write_connector(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(CACHE_CONNECTOR_SOURCE)
+            os.chmod(tmp_path, 0o755)
+            os.replace(tmp_path, self._connector_path)
+        except BaseException:
+            _remove(tmp_path)
+            raise
+
+    def _object_path(self, digest):
+        return os.path.join(self._objects_directory, digest)
+
+    def _request_path(self, request_key):
+        return os.path.join(self._requests_directory, request_key + '.json')
+
+    def prefetch(self, batches, workers=1):
+        """
+        Fetches the inputs, which are shared by the given batches, into the cache. Inputs, which can not be fetched,
+        are received by the blue agents as usual, so their errors are reported with the batches.
+
+        :param batches: The red batches of the experiment
+        :type batches: Iterable[Dict]
+        :param workers: The number of inputs fetched at the same time
+        :type workers: int
+
+        :return: The number of inputs available in the cache
+        :rtype: int
+        """
+        shared_inputs = shared_input_requests(batches)
+        if not shared_inputs:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(shared_inputs)))) as executor:
+            futures = {
+                request_key: executor.submit(self._fetch, request_key, access)
+                for request_key, access in shared_inputs.items()
+            }
+
+        for request_key, future in futures.items():
+            try:
+                self._digests[request_key] = future.result()
+            except (requests.RequestException, OSError) as e:
+                print(
+                    'Could not prefetch input "{}", it is received by the blue agents instead: {}'
+                    .format(shared_inputs[request_key]['url'], e),
+                    file=sys.stderr
+                )
+
+        self._evict()
+        return len(self._digests)
+
+    def _fetch(self, request_key, access):
+        """
+        Fetches the input with the given access information, if it is not cached or changed.
+
+        :return: The sha256 hash of the content of the input
+        :rtype: str
+        """
+        request_path = self._request_path(request_key)
+        cached = _read_json(request_path)
+        if cached is not None and not os.path.isfile(self._object_path(cached['digest'])):
+            cached = None
+
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('lastModified'):
+                headers['If-Modified-Since'] = cached['lastModified']
+
+        auth = None
+        auth_data = access.get('auth')
+        if auth_data is not None:
+            auth_class = HTTP_AUTH_METHODS[str(auth_data.get('method', 'basic')).lower()]
+            auth = auth_class(auth_data['username'], auth_data['password'])
+
+        with requests.get(
+                access['url'], headers=headers, auth=auth, verify=not access.get('disableSSLVerification', False),
+                stream=True, timeout=FETCH_TIMEOUT
+        ) as response:
+            if response.status_code == 304 and cached is not None:
+                os.utime(self._object_path(cached['digest']))
+                return cached['digest']
+            response.raise_for_status()
+
+            digest = self._store(response.iter_content(FETCH_CHUNK_SIZE))
+            validators = {'digest': digest}
+            if 'ETag' in response.headers:
+                validators['etag'] = response.headers['ETag']
+            if 'Last-Modified' in response.headers:
+                validators['lastModified'] = response.headers['Last-Modified']
+
+        _write_json(request_path, validators)
+        return digest
+
+    def _store(self, chunks):
+        """
+        Writes the given chunks to the cache.
+
+        :return: The sha256 hash of the written content
+        :rtype: str
+        """
+        content_hash = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self._objects_directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    content_hash.update(chunk)
+                    f.write(chunk)
+            # the file is read by the user of the container
+            os.chmod(tmp_path, 0o644)
+
+            digest = content_hash.hexdigest()
+            object_path = self._object_path(digest)
+            if os.path.isfile(object_path):
+                _remove(tmp_path)
+                os.utime(object_path)
+            else:
+                os.replace(tmp_path, object_path)
+        except BaseException:
+            _remove(tmp_path)
+            raise
+
+        return digest
+
+    def _evict(self):
+        used_digests = set(self._digests.values())
+        entries = []
+        total_size = 0
+        for file_name in os.listdir(self._objects_directory):
+            # files being written by other executions
+            if file_name.endswith('.tmp'):
+                continue
+            path = os.path.join(self._objects_directory, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            total_size += stat.st_size
+            # files used by this execution are kept, even if the cache exceeds its size
+            if file_name not in used_digests:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self._max_size:
+                break
+            _remove(path)
+            total_size -= size
+
+    def localize_batch(self, blue_batch):
+        """
+        Replaces the connectors of the cached inputs of the given blue batch by the cache connector.
+
+        :param blue_batch: The blue batch to execute
+        :type blue_batch: Dict
+
+        :return: A blue batch receiving its cached inputs from the mounted cache files and the binds mounting the cache
+                 connector and these files into the container
+        :rtype: Tuple[Dict, Dict[str, Dict[str, str]]]
+        """
+        binds = {}
+        inputs = dict(blue_batch['inputs'])
+        for input_key, index, input_value in _iter_input_files(blue_batch):
+            digest = self._digests.get(input_request_key(input_value))
+            if digest is None:
+                continue
+
+            container_path = '{}/{}'.format(CONTAINER_INPUT_CACHE_DIR, digest)
+            binds[self._object_path(digest)] = {'bind': container_path, 'mode': 'ro'}
+
+            input_value = dict(input_value)
+            input_value['connector'] = {'command': CONTAINER_CACHE_CONNECTOR_PATH, 'access': {'path': container_path}}
+            if index is None:
+                inputs[input_key] = input_value
+            else:
+                if inputs[input_key] is blue_batch['inputs'][input_key]:
+                    inputs[input_key] = list(inputs[input_key])
+                inputs[input_key][index] = input_value
+
+        if not binds:
+            return blue_batch, {}
+
+        binds[self._connector_path] = {'bind': CONTAINER_CACHE_CONNECTOR_PATH, 'mode': 'ro'}
+        localized_batch = dict(blue_batch)
+        localized_batch['inputs'] = inputs
+        return localized_batch, binds
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
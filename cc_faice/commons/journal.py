@@ -0,0 +1,92 @@
+import json
+import sqlite3
+import threading
+import time
+
+JOURNAL_FILE = 'faice_journal.sqlite'
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_index INTEGER PRIMARY KEY,
+    batch_hash TEXT NOT NULL,
+    state TEXT NOT NULL,
+    result TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+
+class RunJournal:
+    def __init__(self, path):
+        """
+        Opens the run journal stored in the given sqlite database file. The journal records the state and result of
+        every batch of a RED execution as soon as the batch completes, so an interrupted run can be resumed.
+
+        :param path: The path to the sqlite database file. The file is created, if it does not exist.
+        :type path: str
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(JOURNAL_SCHEMA)
+
+    def clear(self):
+        """
+        Removes all batch records from this journal.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM batches')
+
+    def record(self, batch_index, batch_hash, state, result):
+        """
+        Stores the outcome of the given batch. A previous record of the same batch index is replaced.
+
+        :param batch_index: The index of the batch
+        :type batch_index: int
+        :param batch_hash: The stable hash of the batch as given by red_batch_hash()
+        :type batch_hash: str
+        :param state: The state of the batch execution
+        :type state: str
+        :param result: The execution result of the batch as dictionary
+        :type result: Dict or None
+        """
+        serialized_result = json.dumps(result, default=str)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO batches (batch_index, batch_hash, state, result, updated) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (batch_index, batch_hash, state, serialized_result, time.time())
+            )
+
+    def get_succeeded_result(self, batch_index, batch_hash):
+        """
+        Returns the recorded result of the given batch, if the batch succeeded in a previous run and the batch did not
+        change since then.
+
+        :param batch_index: The index of the batch
+        :type batch_index: int
+        :param batch_hash: The stable hash of the batch as given by red_batch_hash()
+        :type batch_hash: str
+
+        :return: The recorded execution result or None, if the batch has to be executed again
+        :rtype: Dict or None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT batch_hash, state, result FROM batches WHERE batch_index = ?',
+                (batch_index,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        recorded_hash, state, serialized_result = row
+        if recorded_hash != batch_hash or state != 'succeeded':
+            return None
+
+        return json.loads(serialized_result)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
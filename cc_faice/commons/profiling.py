@@ -0,0 +1,225 @@
+"""
+Profiling of faice commands. Profiling is enabled with the global options --profile-cpu and --profile-mem, which are
+given before the faice tool, or with the environment variables FAICE_PROFILE_CPU and FAICE_PROFILE_MEM, e.g.:
+
+    faice --profile-cpu red.prof --profile-mem agent red experiment.red.yml
+    FAICE_PROFILE_CPU=red.prof faice agent red experiment.red.yml
+
+The cpu profile is written with cProfile and can be inspected with pstats, snakeviz or similar tools. If its path is
+"-", the most expensive functions are printed to stderr instead. Only the main thread is profiled, so batches executed
+by worker threads (--jobs > 1) are not included. The memory profile is printed to stderr and contains the peak of
+traced memory and the allocation sites holding most memory when the traced memory was highest.
+
+Nothing is imported or wrapped, if profiling is not enabled.
+"""
+import sys
+import threading
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+PROFILE_CPU_OPTION = '--profile-cpu'
+PROFILE_MEM_OPTION = '--profile-mem'
+PROFILE_CPU_ENVVAR = 'FAICE_PROFILE_CPU'
+PROFILE_MEM_ENVVAR = 'FAICE_PROFILE_MEM'
+
+# the cpu profile is printed to stderr, if this path is given
+PRINT_PROFILE = '-'
+PRINTED_FUNCTIONS = 30
+
+TOP_ALLOCATION_SITES = 10
+
+# seconds between checks, whether the traced memory reached a new maximum
+MEMORY_SAMPLE_INTERVAL = 0.5
+
+
+def split_profiling_args(argv, environ):
+    """
+    Removes the leading profiling options from the given command line arguments and creates a profiler, if profiling
+    is enabled by these options or the given environment.
+
+    :param argv: The command line arguments without the script name
+    :type argv: List[str]
+    :param environ: The environment variables
+    :type environ: Mapping[str, str]
+
+    :return: The remaining command line arguments and a profiler or None, if profiling is not enabled
+    :rtype: Tuple[List[str], Profiler or None]
+    """
+    index = 0
+    while index < len(argv):
+        option = argv[index].split('=', 1)[0]
+        if option == PROFILE_MEM_OPTION:
+            index += 1
+        elif option == PROFILE_CPU_OPTION:
+            index += 1 if '=' in argv[index] else 2
+        else:
+            break
+
+    parser = ArgumentParser(prog='faice', add_help=False, allow_abbrev=False)
+    parser.add_argument(
+        PROFILE_CPU_OPTION, action='store', type=str, metavar='FILE',
+        help='Write a cProfile profile of the executed faice tool to FILE or print it to stderr, if FILE is "-".'
+    )
+    parser.add_argument(
+        PROFILE_MEM_OPTION, action='store_true',
+        help='Print the peak memory usage and the top allocation sites of the executed faice tool to stderr.'
+    )
+    args = parser.parse_args(argv[:index])
+
+    cpu_profile = args.profile_cpu or environ.get(PROFILE_CPU_ENVVAR) or None
+    memory = args.profile_mem or bool(environ.get(PROFILE_MEM_ENVVAR))
+    if cpu_profile is None and not memory:
+        return argv[index:], None
+
+    return argv[index:], Profiler(cpu_profile, memory)
+
+
+class _MemorySampler(threading.Thread):
+    def __init__(self, interval):
+        """
+        A daemon thread, which keeps a tracemalloc snapshot of the moment the traced memory was highest.
+
+        :param interval: The seconds between checks of the traced memory
+        :type interval: float
+        """
+        super().__init__(name='faice-memory-profile', daemon=True)
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.snapshot = None
+        self.snapshot_size = -1
+
+    def sample(self):
+        import tracemalloc
+
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self.snapshot_size:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_size = current
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            self.sample()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Profiler:
+    def __init__(self, cpu_profile=None, memory=False):
+        """
+        Profiles the cpu time and memory usage of a faice tool.
+
+        :param cpu_profile: The path of the cpu profile to write, "-" to print it to stderr or None
+        :type cpu_profile: str or None
+        :param memory: If True, memory allocations are traced and reported to stderr
+        :type memory: bool
+        """
+        self._cpu_profile = cpu_profile
+        self._memory = memory
+        self._profile = None
+        self._memory_sampler = None
+
+    def wrap_modes(self, modes):
+        """
+        :param modes: The faice tools as required by cli_modes()
+        :type modes: OrderedDict
+
+        :return: The given faice tools, whose main functions are profiled
+        :rtype: OrderedDict
+        """
+        return OrderedDict(
+            (key, dict(mode, main=self.wrap(mode['main']))) for key, mode in modes.items()
+        )
+
+    def wrap(self, main):
+        """
+        :param main: The main function of a faice tool
+        :type main: Callable[[], int]
+
+        :return: A function calling main, which reports the profiles, when main returns or exits
+        :rtype: Callable[[], int]
+        """
+        def profiled_main():
+            self.start()
+            try:
+                return main()
+            finally:
+                self.stop()
+
+        return profiled_main
+
+    def start(self):
+        if self._memory:
+            import tracemalloc
+
+            tracemalloc.start()
+            self._memory_sampler = _MemorySampler(MEMORY_SAMPLE_INTERVAL)
+            self._memory_sampler.start()
+
+        if self._cpu_profile:
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+
+        # memory is reported first, so writing the cpu profile is not traced
+        if self._memory_sampler is not None:
+            self._memory_sampler.stop()
+            self._report_memory_profile()
+            self._memory_sampler = None
+
+        if self._profile is not None:
+            self._report_cpu_profile()
+            self._profile = None
+
+    def _report_cpu_profile(self):
+        if self._cpu_profile == PRINT_PROFILE:
+            import pstats
+
+            stats = pstats.Stats(self._profile, stream=sys.stderr)
+            stats.sort_stats('cumulative').print_stats(PRINTED_FUNCTIONS)
+            return
+
+        try:
+            self._profile.dump_stats(self._cpu_profile)
+        except OSError as e:
+            print('Could not write cpu profile "{}": {}'.format(self._cpu_profile, e), file=sys.stderr)
+
+    def _report_memory_profile(self):
+        import tracemalloc
+
+        # short commands may finish before the first sample
+        self._memory_sampler.sample()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = self._memory_sampler.snapshot
+        tracemalloc.stop()
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ])
+        statistics = snapshot.statistics('lineno')[:TOP_ALLOCATION_SITES]
+
+        lines = [
+            'Memory profile: peak {}, top allocation sites at {} traced:'
+            .format(_format_size(peak), _format_size(self._memory_sampler.snapshot_size))
+        ]
+        for statistic in statistics:
+            frame = statistic.traceback[0]
+            lines.append('{:>12} {:>9} blocks  {}:{}'.format(
+                _format_size(statistic.size), statistic.count, frame.filename, frame.lineno
+            ))
+        print('\n'.join(lines), file=sys.stderr)
+
+
+def _format_size(size):
+    for unit in ['B', 'KiB', 'MiB']:
+        if abs(size) < 1024:
+            return '{:.1f} {}'.format(size, unit)
+        size /= 1024
+    return '{:.1f} GiB'.format(size)
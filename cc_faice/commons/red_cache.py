@@ -0,0 +1,206 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+from cc_core.commons.files import load
+from cc_core.version import VERSION as CC_CORE_VERSION
+
+from cc_faice.commons.files import is_private_directory
+from cc_faice.commons.serialization import read
+from cc_faice.version import VERSION as CC_FAICE_VERSION
+
+RED_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.faice_red_cache')
+
+# the maximal size of all cache entries in megabytes
+DEFAULT_RED_CACHE_SIZE = 512
+
+CACHE_ENTRY_EXTENSION = '.pickle'
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def red_cache_key(raw_data):
+    """
+    Returns the key of the cache entry for the given REDFILE content. The key changes with the versions of cc-core and
+    cc-faice, so entries parsed or validated by other versions are never used.
+
+    :param raw_data: The content of the REDFILE
+    :type raw_data: str
+
+    :rtype: str
+    """
+    red_hash = hashlib.sha256()
+    red_hash.update('{}\0{}\0{}\0'.format(CC_CORE_VERSION, CC_FAICE_VERSION, PICKLE_PROTOCOL).encode('utf-8'))
+    red_hash.update(raw_data.encode('utf-8'))
+    return red_hash.hexdigest()
+
+
+class RedCache:
+    def __init__(self, directory, max_size=DEFAULT_RED_CACHE_SIZE):
+        """
+        An on-disk cache of parsed and validated REDFILEs. Every entry contains the parsed red data stored with pickle
+        and the results of the validations the red data passed. The entries are evicted in least recently used order,
+        if their total size exceeds max_size.
+
+        Entries contain the REDFILE including all credentials given in it, so the cache directory and the entries are
+        only accessible by the current user. Loading an entry with pickle can execute arbitrary code, so the cache is
+        disabled, if the directory is not owned by the current user or is writable by other users.
+
+        :param directory: The cache directory. It is created, if it does not exist.
+        :type directory: str
+        :param max_size: The maximal size of all cache entries in megabytes
+        :type max_size: int
+        """
+        if max_size < 1:
+            raise ValueError(
+                'The size of the REDFILE cache must be at least 1 megabyte, but found {}.'.format(max_size)
+            )
+
+        self._directory = os.path.expanduser(directory)
+        self._max_size = max_size * 1024 * 1024
+        os.makedirs(self._directory, mode=0o700, exist_ok=True)
+
+        self._enabled = is_private_directory(self._directory)
+        if not self._enabled:
+            print(
+                'The REDFILE cache is disabled, because the directory "{}" is not owned by the current user or is '
+                'writable by other users.'.format(self._directory),
+                file=sys.stderr
+            )
+
+    def _entry_path(self, key):
+        return os.path.join(self._directory, key + CACHE_ENTRY_EXTENSION)
+
+    def get(self, key):
+        """
+        Returns the cache entry with the given key and marks it as recently used.
+
+        :param key: The key of the cache entry as given by red_cache_key()
+        :type key: str
+
+        :return: The red data and a dictionary mapping the names of passed validations to their results, or None, if
+                 the cache does not contain a valid entry with the given key
+        :rtype: Tuple[Dict, Dict[str, Any]] or None
+        """
+        if not self._enabled:
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # the entry is corrupted, for example by an interrupted write of another process
+            self._remove(path)
+            return None
+
+        return entry['redData'], entry['validations']
+
+    def put(self, key, red_data, validations):
+        """
+        Stores the given red data and validation results and evicts least recently used entries, if the cache exceeds
+        its maximal size. Errors writing the entry are ignored, because the cache is optional.
+
+        :param key: The key of the cache entry as given by red_cache_key()
+        :type key: str
+        :param red_data: The parsed red data
+        :type red_data: Dict
+        :param validations: A dictionary mapping the names of passed validations to their results
+        :type validations: Dict[str, Any]
+        """
+        if not self._enabled:
+            return
+
+        entry = {'redData': red_data, 'validations': validations}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(entry, f, protocol=PICKLE_PROTOCOL)
+                os.replace(tmp_path, self._entry_path(key))
+            except BaseException:
+                self._remove(tmp_path)
+                raise
+        except (OSError, pickle.PicklingError):
+            return
+
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total_size = 0
+        for file_name in os.listdir(self._directory):
+            if not file_name.endswith(CACHE_ENTRY_EXTENSION):
+                continue
+            path = os.path.join(self._directory, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self._max_size:
+                break
+            self._remove(path)
+            total_size -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def load_validated_red(location, validations, red_cache=None):
+    """
+    Loads the REDFILE at the given location and applies the given validations. If a red cache is given, parsing and
+    validations already passed by an unchanged REDFILE are skipped.
+
+    :param location: The path to the REDFILE
+    :type location: str
+    :param validations: A list of tuples containing a name and a function validating red data. The name has to identify
+                        the validation including its arguments. The function raises an exception, if the red data is
+                        invalid, and may return a result, which is cached together with the red data.
+    :type validations: List[Tuple[str, Callable[[Dict], Any]]]
+    :param red_cache: The cache to use or None
+    :type red_cache: RedCache or None
+
+    :return: The red data, which may be modified by the caller, and a dictionary mapping the names of the validations
+             to their results
+    :rtype: Tuple[Dict, Dict[str, Any]]
+
+    :raise AgentError: If the REDFILE could not be loaded or parsed
+    """
+    raw_data = load(location, 'REDFILE')
+
+    if red_cache is None:
+        red_data = read(raw_data, 'REDFILE')
+        return red_data, {name: validate(red_data) for name, validate in validations}
+
+    key = red_cache_key(raw_data)
+    entry = red_cache.get(key)
+    if entry is None:
+        red_data, results = read(raw_data, 'REDFILE'), {}
+    else:
+        red_data, results = entry
+
+    missing_validations = [(name, validate) for name, validate in validations if name not in results]
+    if entry is not None and not missing_validations:
+        return red_data, results
+
+    # validations do not modify the red data, so it can be cached after validating
+    try:
+        for name, validate in missing_validations:
+            results[name] = validate(red_data)
+    finally:
+        red_cache.put(key, red_data, results)
+
+    return red_data, results
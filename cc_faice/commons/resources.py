@@ -0,0 +1,246 @@
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+MEMINFO_PATH = '/proc/meminfo'
+NODE_DIRECTORY = '/sys/devices/system/node'
+
+# the amount of memory in megabytes reserved for a batch, if the container settings do not specify ram
+DEFAULT_BATCH_RAM = 1024
+
+
+def host_memory_budget(meminfo_path=MEMINFO_PATH):
+    """
+    Returns the memory of the host, which is available for containers, as found in /proc/meminfo. MemAvailable is
+    preferred and MemTotal is used, if the kernel does not provide MemAvailable.
+
+    :param meminfo_path: The path to the meminfo file
+    :type meminfo_path: str
+
+    :return: The available memory in megabytes
+    :rtype: int
+
+    :raise OSError: If the meminfo file could not be read
+    :raise ValueError: If the meminfo file does not contain the required information
+    """
+    values = {}
+    with open(meminfo_path) as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            parts = value.split()
+            if parts:
+                values[key.strip()] = parts[0]
+
+    for key in ('MemAvailable', 'MemTotal'):
+        if key in values:
+            # values are given in kB
+            return int(values[key]) // 1024
+
+    raise ValueError('Could not determine host memory from "{}".'.format(meminfo_path))
+
+
+class MemoryAdmissionController:
+    def __init__(self, budget, default_ram=DEFAULT_BATCH_RAM):
+        """
+        Creates a memory admission controller. Every batch reserves its ram against the given budget before its
+        container is created and releases the reservation after the container was removed. If the reservation does not
+        fit into the budget, the batch waits until enough memory was released by other batches.
+
+        :param budget: The memory budget in megabytes
+        :type budget: int
+        :param default_ram: The memory in megabytes reserved for batches without ram setting
+        :type default_ram: int
+        """
+        self._budget = budget
+        self._default_ram = default_ram
+        self._reserved = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, ram):
+        """
+        Reserves the given amount of memory for the duration of the with block.
+
+        :param ram: The memory in megabytes to reserve. If None, the default ram is reserved.
+        :type ram: int or None
+
+        :raise ValueError: If the reservation can never fit into the memory budget
+        """
+        if ram is None:
+            ram = self._default_ram
+
+        if ram > self._budget:
+            raise ValueError(
+                'The batch requires {} MB of memory, but the memory budget for containers is only {} MB.'
+                .format(ram, self._budget)
+            )
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._reserved + ram <= self._budget)
+            self._reserved += ram
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._reserved -= ram
+                self._condition.notify_all()
+
+
+def parse_cpu_list(cpu_list):
+    """
+    Parses a cpu list as found in /sys/devices/system/node/node*/cpulist, like "0-3,8,10-11".
+
+    :param cpu_list: The cpu list to parse
+    :type cpu_list: str
+
+    :return: The ids of the cpus in the given list
+    :rtype: List[int]
+    """
+    cpus = []
+    for part in cpu_list.strip().split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        if last:
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(first))
+    return cpus
+
+
+def format_cpu_list(cpus):
+    """
+    Formats the given cpu ids as cpu list, which can be used as cpuset of a docker container.
+
+    :param cpus: The cpu ids to format
+    :type cpus: Iterable[int]
+
+    :return: A cpu list like "0-3,8"
+    :rtype: str
+    """
+    parts = []
+    start = previous = None
+    for cpu in sorted(cpus):
+        if previous is not None and cpu == previous + 1:
+            previous = cpu
+            continue
+        if start is not None:
+            parts.append(str(start) if start == previous else '{}-{}'.format(start, previous))
+        start = previous = cpu
+    if start is not None:
+        parts.append(str(start) if start == previous else '{}-{}'.format(start, previous))
+    return ','.join(parts)
+
+
+def numa_nodes(node_directory=NODE_DIRECTORY):
+    """
+    Returns the cpus of every numa node of the host, which are available to this process. If the numa topology can not
+    be read, all available cpus are returned as a single node.
+
+    :param node_directory: The sysfs directory containing the numa nodes
+    :type node_directory: str
+
+    :return: A list of numa nodes, each given as list of cpu ids
+    :rtype: List[List[int]]
+    """
+    try:
+        available_cpus = os.sched_getaffinity(0)
+    except AttributeError:
+        available_cpus = set(range(os.cpu_count() or 1))
+
+    nodes = []
+    try:
+        node_names = [name for name in os.listdir(node_directory) if re.match(r'^node\d+$', name)]
+        for node_name in sorted(node_names, key=lambda name: int(name[4:])):
+            with open(os.path.join(node_directory, node_name, 'cpulist')) as f:
+                node_cpus = [cpu for cpu in parse_cpu_list(f.read()) if cpu in available_cpus]
+            if node_cpus:
+                nodes.append(node_cpus)
+    except (OSError, ValueError):
+        nodes = []
+
+    if not nodes:
+        nodes = [sorted(available_cpus)]
+
+    return nodes
+
+
+class CpuAllocator:
+    def __init__(self, nodes):
+        """
+        Creates a cpu allocator, which assigns disjoint sets of cpus to batches. Cpus of the same numa node are
+        preferred for a single batch.
+
+        :param nodes: The cpus of every numa node as returned by numa_nodes()
+        :type nodes: List[List[int]]
+        """
+        self._nodes = [list(node) for node in nodes]
+        self._free = [set(node) for node in nodes]
+        self._condition = threading.Condition()
+
+    def cpu_count(self):
+        """
+        :return: The number of cpus managed by this allocator
+        :rtype: int
+        """
+        return sum(len(node) for node in self._nodes)
+
+    @contextmanager
+    def allocate(self, count):
+        """
+        Allocates the given number of cpus for the duration of the with block. If not enough cpus are free, this
+        function waits until other batches released their cpus.
+
+        :param count: The number of cpus to allocate
+        :type count: int
+
+        :return: The allocated cpus formatted as cpu list
+        :rtype: str
+
+        :raise ValueError: If count exceeds the number of cpus managed by this allocator
+        """
+        if count > self.cpu_count():
+            raise ValueError(
+                'The batch requires {} cpus, but only {} cpus are available.'.format(count, self.cpu_count())
+            )
+
+        with self._condition:
+            self._condition.wait_for(lambda: sum(len(free) for free in self._free) >= count)
+            cpus = self._take(count)
+
+        try:
+            yield format_cpu_list(cpus)
+        finally:
+            with self._condition:
+                for node_index, node in enumerate(self._nodes):
+                    self._free[node_index].update(cpu for cpu in cpus if cpu in node)
+                self._condition.notify_all()
+
+    def _take(self, count):
+        """
+        Removes the given number of cpus from the free cpus. If a single numa node has enough free cpus, the node with
+        the fewest free cpus that fits is used. Otherwise the cpus are taken from the nodes with the most free cpus.
+
+        :param count: The number of cpus to take. Enough cpus have to be free.
+        :type count: int
+
+        :return: The taken cpus
+        :rtype: List[int]
+        """
+        fitting_nodes = [free for free in self._free if len(free) >= count]
+        if fitting_nodes:
+            free = min(fitting_nodes, key=len)
+            cpus = sorted(free)[:count]
+            free.difference_update(cpus)
+            return cpus
+
+        cpus = []
+        for free in sorted(self._free, key=len, reverse=True):
+            taken = sorted(free)[:count - len(cpus)]
+            free.difference_update(taken)
+            cpus.extend(taken)
+            if len(cpus) == count:
+                break
+        return cpus
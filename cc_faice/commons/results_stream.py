@@ -0,0 +1,47 @@
+import json
+import sys
+import threading
+
+STDOUT_PATH = '-'
+
+
+class ResultsStream:
+    def __init__(self, path):
+        """
+        Opens a results stream, which writes one compact json document per line (NDJSON). Every line is flushed as
+        soon as it is written, so the stream can be followed while a RED execution is running.
+
+        :param path: The path of the file to write. The file is truncated, if it exists. If path is "-", the results
+                     are written to stdout.
+        :type path: str
+        """
+        self._lock = threading.Lock()
+        if path == STDOUT_PATH:
+            self._file = sys.stdout
+            self._close_file = False
+        else:
+            self._file = open(path, 'w')
+            self._close_file = True
+
+    def write(self, record):
+        """
+        Writes the given record as single line to this stream.
+
+        :param record: The record to write. Values, which are not json serializable, are written as strings.
+        :type record: Dict[str, Any]
+        """
+        line = json.dumps(record, separators=(',', ':'), default=str)
+        with self._lock:
+            self._file.write(line)
+            self._file.write('\n')
+            self._file.flush()
+
+    def close(self):
+        """
+        Closes the underlying file, if it is not stdout.
+        """
+        with self._lock:
+            if self._close_file:
+                self._file.close()
+            else:
+                self._file.flush()
@@ -0,0 +1,433 @@
+"""
+Serialization backends for reading and writing json and yaml data. The functions of this module can be used instead of
+load_and_read(), dump() and dump_print() of cc_core.commons.files.
+
+The accelerated backend parses json with orjson and yaml with the libyaml bindings of PyYAML, if these libraries are
+installed. It loads yaml according to YAML 1.2 like the ruamel loader of cc-core and dumps data byte-compatible to
+cc-core. Data, which can not be dumped byte-compatible by the accelerated backend, is dumped by the cc-core backend.
+The backend can be selected with the environment variable FAICE_SERIALIZATION.
+"""
+import datetime
+import json
+import os
+import re
+import sys
+from io import StringIO
+
+from cc_core.commons.exceptions import AgentError
+from cc_core.commons.files import load, read as cc_core_read, dump as cc_core_dump, \
+    dump_print as cc_core_dump_print, JSON_INDENT, yaml as cc_core_yaml
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import yaml
+    from yaml import CSafeLoader, CSafeDumper
+except ImportError:
+    yaml = None
+
+SERIALIZATION_ENVVAR = 'FAICE_SERIALIZATION'
+ACCELERATED_BACKEND = 'accelerated'
+CC_CORE_BACKEND = 'cc-core'
+BACKENDS = [ACCELERATED_BACKEND, CC_CORE_BACKEND]
+
+# orjson only supports an indentation of two spaces, which is widened afterwards
+ORJSON_INDENT = 2
+
+# floats in this range are formatted equally by orjson and the json module
+ORJSON_FLOAT_RANGE = (1e-4, 1e16)
+
+PRINTABLE_ASCII_PATTERN = re.compile(r'^[ -~]*\Z')
+LEADING_SPACES_PATTERN = re.compile(r'^( +)', re.MULTILINE)
+# libyaml escapes characters outside of the basic multilingual plane and handles line breaks other than line feeds
+# differently than ruamel
+LIBYAML_INCOMPATIBLE_PATTERN = re.compile('[\r\x85\u2028\u2029\U00010000-\U0010FFFF]')
+
+# libyaml and ruamel wrap quoted strings at spaces and choose the style of long mapping keys differently, so quoted
+# strings containing spaces and long keys are not dumped by libyaml
+LIBYAML_MAX_KEY_LENGTH = 100
+
+# orjson parses integers exceeding 64 bit as floats
+BIG_INTEGER_PATTERN = re.compile(r'[0-9]{19}')
+# matches every json string and captures the colon following mapping keys, strings are matched from left to right, so
+# quotes inside of strings are never mistaken for the beginning of a key
+JSON_STRING_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"(?:\s*(:))?', re.DOTALL)
+
+
+def serialization_backend():
+    """
+    Returns the serialization backend selected by the environment variable FAICE_SERIALIZATION. The accelerated backend
+    is used by default.
+
+    :return: Either "accelerated" or "cc-core"
+    :rtype: str
+
+    :raise ValueError: If FAICE_SERIALIZATION contains an unknown backend
+    """
+    backend = os.environ.get(SERIALIZATION_ENVVAR) or ACCELERATED_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(
+            'The environment variable {} should be one of [{}], but found "{}".'
+            .format(SERIALIZATION_ENVVAR, ', '.join(BACKENDS), backend)
+        )
+    return backend
+
+
+def load_and_read(location, var_name):
+    """
+    Reads a local file and parses it as yaml or json.
+
+    :param location: The path of the file
+    :type location: str
+    :param var_name: The name of the argument, which is used in error messages
+    :type var_name: str
+
+    :return: The parsed data
+    :rtype: Dict or None
+
+    :raise AgentError: If the file could not be read or does not contain a dictionary
+    """
+    if not location:
+        return None
+    raw_data = load(location, var_name)
+    return read(raw_data, var_name)
+
+
+def read(raw_data, var_name):
+    """
+    Parses the given yaml or json string.
+
+    :param raw_data: The string to parse
+    :type raw_data: str
+    :param var_name: The name of the argument, which is used in error messages
+    :type var_name: str
+
+    :return: The parsed data
+    :rtype: Dict
+
+    :raise AgentError: If the string is neither yaml nor json or does not contain a dictionary
+    """
+    if serialization_backend() == CC_CORE_BACKEND:
+        return cc_core_read(raw_data, var_name)
+
+    data = _read_json(raw_data)
+    if data is None:
+        try:
+            data = _read_yaml(raw_data)
+        except Exception as e:
+            raise AgentError(
+                'data for argument "{}" is neither json nor yaml formatted. Failed with the following message:'
+                '\n{}'.format(var_name, str(e))
+            )
+
+    if not isinstance(data, dict):
+        raise AgentError('data for argument "{}" does not contain a dictionary.\ndata: "{}"'.format(var_name, data))
+
+    return data
+
+
+def dumps(stream, dump_format):
+    """
+    Serializes the given data like dump() of cc-core.
+
+    :param stream: The data to serialize
+    :param dump_format: One of [json, yaml, yml]
+    :type dump_format: str
+
+    :return: The serialized data
+    :rtype: str
+
+    :raise AgentError: If the dump format is invalid
+    """
+    if dump_format == 'json':
+        if serialization_backend() == ACCELERATED_BACKEND:
+            text = _dumps_orjson(stream)
+            if text is not None:
+                return text
+        return json.dumps(stream, indent=JSON_INDENT)
+
+    if dump_format in ['yaml', 'yml']:
+        if serialization_backend() == ACCELERATED_BACKEND:
+            text = _dumps_libyaml(stream)
+            if text is not None:
+                return text
+        return _dumps_cc_core_yaml(stream)
+
+    raise AgentError('invalid dump format "{}"'.format(dump_format))
+
+
+def dump(stream, dump_format, file_name):
+    """
+    Writes the given data to a file like dump() of cc-core.
+    """
+    if serialization_backend() == CC_CORE_BACKEND:
+        cc_core_dump(stream, dump_format, file_name)
+        return
+
+    text = dumps(stream, dump_format)
+    with open(file_name, 'w') as f:
+        f.write(text)
+
+
+def dump_print(stream, dump_format, error=False):
+    """
+    Prints the given data to stdout or stderr like dump_print() of cc-core.
+    """
+    if serialization_backend() == CC_CORE_BACKEND or dump_format not in ['json', 'yaml', 'yml']:
+        cc_core_dump_print(stream, dump_format, error)
+        return
+
+    text = dumps(stream, dump_format)
+    if dump_format == 'json':
+        # print() appends a line break to json
+        text += '\n'
+
+    out = sys.stderr if error else sys.stdout
+    out.write(text)
+    out.flush()
+
+
+def _read_json(raw_data):
+    """
+    :return: The data parsed with the fastest available json parser or None, if raw_data is not a json object or could
+             be parsed differently by cc-core. Duplicate keys and the constants NaN and Infinity are left to the yaml
+             parser, which rejects duplicate keys and reads these constants as strings like cc-core.
+    """
+    if not raw_data.lstrip().startswith('{'):
+        return None
+
+    data = None
+    if orjson is not None and not BIG_INTEGER_PATTERN.search(raw_data):
+        try:
+            data = orjson.loads(raw_data)
+        except orjson.JSONDecodeError:
+            pass
+
+    if data is None:
+        try:
+            data = json.loads(raw_data, parse_constant=_reject_json_constant)
+        except ValueError:
+            # flow style yaml mappings also start with a curly bracket
+            return None
+
+    # json parsers keep the last value of duplicate keys silently
+    if _count_keys(data) != _count_json_keys(raw_data):
+        return None
+
+    return data
+
+
+def _reject_json_constant(constant):
+    raise ValueError('json constant "{}" is not supported'.format(constant))
+
+
+def _count_keys(data):
+    """
+    :return: The number of keys of all dictionaries contained in the given data
+    :rtype: int
+    """
+    count = 0
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            count += len(value)
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+    return count
+
+
+def _count_json_keys(raw_data):
+    """
+    :return: The number of mapping keys in the given valid json string including duplicates
+    :rtype: int
+    """
+    matches = JSON_STRING_PATTERN.findall(raw_data)
+    return len(matches) - matches.count('')
+
+
+def _read_yaml(raw_data):
+    if yaml is None:
+        return cc_core_yaml.load(raw_data)
+    return yaml.load(raw_data, Loader=_YamlLoader)
+
+
+def _dumps_orjson(stream):
+    """
+    :return: The data serialized by orjson equal to json.dumps(stream, indent=4) or None, if the data contains values,
+             which are serialized differently by orjson
+    """
+    if orjson is None or not _is_orjson_compatible(stream):
+        return None
+
+    text = orjson.dumps(stream, option=orjson.OPT_INDENT_2).decode('utf-8')
+    if JSON_INDENT == ORJSON_INDENT:
+        return text
+
+    # json strings can not contain line breaks, so every line starts with indentation only
+    factor = JSON_INDENT // ORJSON_INDENT
+    return LEADING_SPACES_PATTERN.sub(lambda match: match.group(1) * factor, text)
+
+
+def _is_orjson_compatible(stream):
+    """
+    Checks whether orjson serializes the given data equally to the json module with default arguments. Non ascii and
+    control characters are escaped by the json module only, some floats are formatted differently and orjson rejects
+    big integers and non string keys.
+    """
+    stack = [stream]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            if not PRINTABLE_ASCII_PATTERN.match(value):
+                return False
+        elif isinstance(value, bool) or value is None:
+            continue
+        elif isinstance(value, int):
+            if not -2 ** 63 <= value < 2 ** 64:
+                return False
+        elif isinstance(value, float):
+            if value != 0.0 and not ORJSON_FLOAT_RANGE[0] <= abs(value) < ORJSON_FLOAT_RANGE[1]:
+                return False
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                if not isinstance(key, str) or not PRINTABLE_ASCII_PATTERN.match(key):
+                    return False
+                stack.append(item)
+        elif isinstance(value, list):
+            stack.extend(value)
+        else:
+            return False
+    return True
+
+
+def _dumps_cc_core_yaml(stream):
+    text = StringIO()
+    cc_core_yaml.dump(stream, text)
+    return text.getvalue()
+
+
+def _dumps_libyaml(stream):
+    """
+    :return: The data serialized by libyaml equal to the output of cc-core or None, if the data can not be serialized
+             equally
+    """
+    # ruamel terminates documents consisting of a single scalar with "..."
+    if yaml is None or not isinstance(stream, (dict, list)):
+        return None
+
+    try:
+        return yaml.dump(stream, Dumper=_YamlDumper, default_flow_style=False, allow_unicode=True)
+    except _IncompatibleYamlError:
+        return None
+
+
+if yaml is not None:
+    from ruamel.yaml.resolver import implicit_resolvers as ruamel_implicit_resolvers
+    from yaml.constructor import ConstructorError
+    from yaml.emitter import Emitter
+
+    class _IncompatibleYamlError(Exception):
+        pass
+
+    def _yaml_12_resolvers():
+        """
+        :return: The implicit resolvers of the ruamel loader used by cc-core for YAML 1.2 in the format of PyYAML. In
+                 contrast to YAML 1.1, values like "yes", "on" or "010" are not resolved to booleans or octal numbers.
+        :rtype: Dict[str, List[Tuple[str, Pattern]]]
+        """
+        resolvers = {}
+        for versions, tag, regexp, first in ruamel_implicit_resolvers:
+            if (1, 2) in versions:
+                for ch in first:
+                    resolvers.setdefault(ch, []).append((tag, regexp))
+        return resolvers
+
+    class _YamlLoader(CSafeLoader):
+        yaml_implicit_resolvers = _yaml_12_resolvers()
+
+        def construct_mapping(self, node, deep=False):
+            # ruamel rejects duplicate keys, while PyYAML keeps the last value
+            keys = set()
+            for key_node, _ in node.value:
+                key = self.construct_object(key_node, deep=deep)
+                try:
+                    duplicate = key in keys
+                    keys.add(key)
+                except TypeError:
+                    continue
+                if duplicate:
+                    raise ConstructorError(
+                        'while constructing a mapping', node.start_mark,
+                        'found duplicate key "{}"'.format(key), key_node.start_mark
+                    )
+            return super().construct_mapping(node, deep=deep)
+
+        def construct_yaml_int(self, node):
+            # YAML 1.2 integers with leading zeros are decimal
+            value = self.construct_scalar(node).replace('_', '')
+            sign = 1
+            if value[0] == '-':
+                sign = -1
+            if value[0] in '+-':
+                value = value[1:]
+            for prefix, base in (('0b', 2), ('0x', 16), ('0o', 8)):
+                if value.startswith(prefix):
+                    return sign * int(value[2:], base)
+            return sign * int(value)
+
+        def construct_yaml_timestamp(self, node):
+            # ruamel converts timestamps with time zone to naive utc timestamps
+            value = super().construct_yaml_timestamp(node)
+            if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+                value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            return value
+
+    _YamlLoader.add_constructor('tag:yaml.org,2002:int', _YamlLoader.construct_yaml_int)
+    _YamlLoader.add_constructor('tag:yaml.org,2002:timestamp', _YamlLoader.construct_yaml_timestamp)
+
+    class _YamlDumper(CSafeDumper):
+        yaml_implicit_resolvers = _yaml_12_resolvers()
+
+        # analyzes scalars like the emitter of ruamel to choose the same quoting style
+        _scalar_analyzer = Emitter(None, allow_unicode=True)
+
+        def represent_str(self, data):
+            if LIBYAML_INCOMPATIBLE_PATTERN.search(data):
+                raise _IncompatibleYamlError()
+
+            # ruamel prefers double quotes for strings containing quotes or line breaks, which can not be plain
+            style = None
+            may_wrap = ' ' in data
+            if may_wrap or "'" in data or '\n' in data:
+                if not self._scalar_analyzer.analyze_scalar(data).allow_block_plain:
+                    if may_wrap:
+                        raise _IncompatibleYamlError()
+                    style = '"'
+            return self.represent_scalar('tag:yaml.org,2002:str', data, style=style)
+
+        def represent_dict(self, data):
+            for key in data:
+                if isinstance(key, str) and len(key) > LIBYAML_MAX_KEY_LENGTH:
+                    raise _IncompatibleYamlError()
+            return super().represent_dict(data)
+
+        def represent_float(self, data):
+            # YAML 1.2 does not require a fraction before the exponent like YAML 1.1
+            if data != data:
+                value = '.nan'
+            elif data == float('inf'):
+                value = '.inf'
+            elif data == float('-inf'):
+                value = '-.inf'
+            else:
+                value = repr(data).lower()
+            return self.represent_scalar('tag:yaml.org,2002:float', value)
+
+    _YamlDumper.add_representer(str, _YamlDumper.represent_str)
+    _YamlDumper.add_representer(dict, _YamlDumper.represent_dict)
+    _YamlDumper.add_representer(float, _YamlDumper.represent_float)
@@ -0,0 +1,398 @@
+"""
+Protocol between a long running faice server and the faice command line client. This module only uses the standard
+library, so the client does not pay for importing cc-core, docker or keyring, if a server is running.
+
+A client connects to the unix socket of the server and sends a request, which contains the command line arguments, the
+working directory and the environment of the client. Because the environment may contain credentials, clients only use
+a server, if this is enabled with the environment variable FAICE_SERVER, and both sides verify with SO_PEERCRED, that
+the other side runs as the same user. The default socket is created in a directory, which is only accessible by the
+user. The stdin, stdout and stderr file descriptors of the client are passed along with the request, so the server can
+write to the terminal of the client directly. The server forks a process for every request, which inherits all modules,
+connections and caches prepared by the server. The forked process sends its pid and afterwards the exit code of the
+command to the client as json lines.
+"""
+import array
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import traceback
+
+from cc_faice.commons.files import is_private_directory
+
+SOCKET_ENVVAR = 'FAICE_SOCKET'
+SERVER_ENVVAR = 'FAICE_SERVER'
+NO_SERVER_ENVVAR = 'FAICE_NO_SERVER'
+
+SOCKET_FILE = 'server.sock'
+
+# commands, which are executed by a running server. The prefixes are compared with the command line arguments.
+SERVED_COMMANDS = [
+    ['agent', 'red'],
+    ['exec'],
+    ['schema', 'validate'],
+    ['convert'],
+]
+
+STDIO_FDS = [0, 1, 2]
+REQUEST_HEADER = struct.Struct('!I')
+
+# pid, uid and gid of the peer of a unix socket as returned by SO_PEERCRED
+PEER_CREDENTIALS = struct.Struct('3i')
+
+# seconds the server waits for a client to send its request
+REQUEST_TIMEOUT = 10
+
+# seconds between checks for terminated request processes
+REAP_INTERVAL = 1.0
+
+
+def socket_path():
+    """
+    Returns the path of the unix socket of the faice server. The path can be set with the environment variable
+    FAICE_SOCKET. Otherwise a socket inside a directory per user in XDG_RUNTIME_DIR or the temp directory is used.
+
+    :rtype: str
+    """
+    path = os.environ.get(SOCKET_ENVVAR)
+    if path:
+        return path
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, 'faice-{}'.format(os.getuid()), SOCKET_FILE)
+
+
+def _is_own_socket(path):
+    """
+    :return: Whether the given path is a unix socket owned by the current user inside a directory, which can not be
+             modified by other users
+    :rtype: bool
+    """
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(status.st_mode) and status.st_uid == os.getuid() and \
+        is_private_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def _peer_uid(connection):
+    """
+    :return: The user id of the process on the other side of the given unix socket connection
+    :rtype: int
+    """
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEER_CREDENTIALS.size)
+    _, uid, _ = PEER_CREDENTIALS.unpack(credentials)
+    return uid
+
+
+def _prepare_socket_directory(path):
+    """
+    Creates the directory of the given socket path only accessible by the current user, if it does not exist.
+
+    :raise RuntimeError: If the directory is accessible by other users
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+
+    if not is_private_directory(directory):
+        raise RuntimeError(
+            'The directory "{}" of the faice server socket must be owned by the current user and must not be writable '
+            'by other users.'.format(directory)
+        )
+
+
+def is_served_command(argv):
+    """
+    :param argv: The command line arguments without the script name
+    :type argv: List[str]
+
+    :return: Whether the given command can be executed by a faice server
+    :rtype: bool
+    """
+    return any(argv[:len(command)] == command for command in SERVED_COMMANDS)
+
+
+def run_on_server(argv):
+    """
+    Executes the given command on a running faice server. The stdin, stdout and stderr of this process are used by the
+    server. If this process receives SIGINT while the command is running, the signal is forwarded to the server
+    process executing the command.
+
+    :param argv: The command line arguments without the script name
+    :type argv: List[str]
+
+    :return: The exit code of the command or None, if the command has to be executed locally, because FAICE_SERVER is
+             not set, FAICE_NO_SERVER is set, the command is not served or no server of the current user is running
+    :rtype: int or None
+    """
+    if not os.environ.get(SERVER_ENVVAR) or os.environ.get(NO_SERVER_ENVVAR) or not is_served_command(argv):
+        return None
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+
+    # the environment is only sent to a server of the current user
+    path = socket_path()
+    if not _is_own_socket(path):
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            connection.connect(path)
+            if _peer_uid(connection) != os.getuid():
+                return None
+            sys.stdout.flush()
+            sys.stderr.flush()
+            _send_request(connection, {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}, STDIO_FDS)
+        except OSError:
+            # the socket is stale or the server is not accepting requests
+            return None
+
+        return _await_exit_code(connection)
+    finally:
+        connection.close()
+
+
+def _send_request(connection, request, fds):
+    payload = json.dumps(request).encode('utf-8')
+    connection.sendmsg(
+        [REQUEST_HEADER.pack(len(payload))],
+        [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+    )
+    connection.sendall(payload)
+
+
+def _await_exit_code(connection):
+    pid = None
+    with connection.makefile('r', encoding='utf-8') as messages:
+        while True:
+            try:
+                line = messages.readline()
+            except KeyboardInterrupt:
+                if pid is not None:
+                    os.kill(pid, signal.SIGINT)
+                continue
+
+            if not line:
+                print('faice server closed the connection unexpectedly.', file=sys.stderr)
+                return 1
+
+            message = json.loads(line)
+            if 'pid' in message:
+                pid = message['pid']
+            if 'exitCode' in message:
+                return message['exitCode']
+
+
+def _recv_exactly(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('Connection closed before the request was complete.')
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _receive_request(connection):
+    """
+    :return: The request and the file descriptors passed with the request
+    :rtype: Tuple[Dict, List[int]]
+    """
+    fds = array.array('i')
+    header, ancdata, _, _ = connection.recvmsg(
+        REQUEST_HEADER.size, socket.CMSG_SPACE(len(STDIO_FDS) * fds.itemsize)
+    )
+    for level, message_type, data in ancdata:
+        if level == socket.SOL_SOCKET and message_type == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+
+    try:
+        if len(header) < REQUEST_HEADER.size:
+            header += _recv_exactly(connection, REQUEST_HEADER.size - len(header))
+        size, = REQUEST_HEADER.unpack(header)
+        request = json.loads(_recv_exactly(connection, size).decode('utf-8'))
+        if len(fds) != len(STDIO_FDS):
+            raise ValueError('Expected {} file descriptors, but received {}.'.format(len(STDIO_FDS), len(fds)))
+    except Exception:
+        for fd in fds:
+            os.close(fd)
+        raise
+
+    return request, list(fds)
+
+
+def _send_message(connection, message):
+    connection.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+
+def _exit_code(code):
+    """
+    Converts the code of a SystemExit to an exit code like the python interpreter does.
+    """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _handle_request(connection, request, fds, handle_command):
+    """
+    Executes a request inside the forked process. The passed file descriptors replace stdin, stdout and stderr and the
+    working directory and environment of the client are applied.
+
+    :return: The exit code of the command
+    :rtype: int
+    """
+    for target_fd, fd in zip(STDIO_FDS, fds):
+        if fd != target_fd:
+            os.dup2(fd, target_fd)
+            os.close(fd)
+
+    # recreate the streams, so buffering matches the terminal of the client
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', closefd=False)
+    sys.stderr = open(2, 'w', closefd=False)
+
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    _send_message(connection, {'pid': os.getpid()})
+
+    try:
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        exit_code = _exit_code(handle_command(request['argv']))
+    except SystemExit as e:
+        exit_code = _exit_code(e.code)
+    except KeyboardInterrupt:
+        exit_code = 128 + signal.SIGINT
+    except Exception:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    return exit_code
+
+
+def _reap_children():
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _bind_socket(path):
+    """
+    Binds a unix socket to the given path, which is only accessible by the current user. A stale socket file of a
+    terminated server is replaced.
+
+    :raise RuntimeError: If another server is listening on the given path or the directory of the path is accessible
+                         by other users
+    """
+    _prepare_socket_directory(path)
+
+    if os.path.lexists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.remove(path)
+        else:
+            raise RuntimeError('A faice server is already listening on "{}".'.format(path))
+        finally:
+            probe.close()
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    previous_umask = os.umask(0o177)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(previous_umask)
+    listener.listen()
+    return listener
+
+
+def serve_forever(path, handle_command):
+    """
+    Accepts requests on the unix socket with the given path until the process is terminated. Every request is executed
+    in a forked process by calling handle_command with the command line arguments of the request.
+
+    :param path: The path of the unix socket
+    :type path: str
+    :param handle_command: A function executing a command given as command line arguments without script name. Its
+                           return value or SystemExit code is used as exit code.
+    :type handle_command: Callable[[List[str]], int]
+
+    :raise RuntimeError: If another server is listening on the given path, the directory of the path is accessible by
+                         other users or the peer credentials of unix sockets are not available on this platform
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        raise RuntimeError('The faice server requires SO_PEERCRED to verify its clients, which is not available.')
+
+    listener = _bind_socket(path)
+    listener.settimeout(REAP_INTERVAL)
+
+    def terminate(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+
+    try:
+        while True:
+            _reap_children()
+            try:
+                connection, _ = listener.accept()
+            except socket.timeout:
+                continue
+
+            try:
+                # only the user running the server may execute commands
+                peer_uid = _peer_uid(connection)
+                if peer_uid != os.getuid():
+                    raise ValueError('Rejected client of user {}.'.format(peer_uid))
+
+                connection.settimeout(REQUEST_TIMEOUT)
+                request, fds = _receive_request(connection)
+                connection.settimeout(None)
+            except (OSError, ValueError) as e:
+                print('Invalid request: {}'.format(e), file=sys.stderr)
+                connection.close()
+                continue
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                exit_code = 1
+                try:
+                    listener.close()
+                    exit_code = _handle_request(connection, request, fds, handle_command)
+                    _send_message(connection, {'exitCode': exit_code})
+                except BaseException:
+                    pass
+                finally:
+                    os._exit(exit_code)
+
+            for fd in fds:
+                os.close(fd)
+            connection.close()
+    finally:
+        listener.close()
+        if os.path.exists(path):
+            os.remove(path)
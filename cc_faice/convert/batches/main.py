@@ -1,10 +1,13 @@
 from argparse import ArgumentParser
 
 from cc_core.commons.exceptions import print_exception, exception_format
-from cc_core.commons.files import load_and_read, file_extension, wrapped_print, dump, dump_print
+from cc_core.commons.files import file_extension, wrapped_print
 from cc_core.commons.red import red_validation, convert_batch_experiment
 from cc_core.commons.templates import get_secret_values
 
+from cc_faice.commons.serialization import dump, dump_print
+from cc_faice.commons.red_cache import RedCache, RED_CACHE_DIR, DEFAULT_RED_CACHE_SIZE, load_validated_red
+
 DESCRIPTION = 'Convert batches from a single REDFILE into separate files containing only one batch each.'
 
 
@@ -25,6 +28,17 @@ def attach_args(parser):
         '-d', '--debug', action='store_true',
         help='Write debug info, including detailed exceptions, to stdout.'
     )
+    parser.add_argument(
+        '--red-cache', action='store', type=str, metavar='CACHE_DIR', nargs='?', const=RED_CACHE_DIR,
+        help='Cache the parsed and validated REDFILE in CACHE_DIR, so parsing and validation are skipped, if the '
+             'REDFILE did not change. If CACHE_DIR is omitted, "{}" is used. The cache contains the REDFILE including '
+             'all credentials given in it.'.format(RED_CACHE_DIR)
+    )
+    parser.add_argument(
+        '--red-cache-size', action='store', type=int, metavar='MEGABYTES', default=DEFAULT_RED_CACHE_SIZE,
+        help='The maximal size of the REDFILE cache in MEGABYTES. Least recently used REDFILEs are removed from the '
+             'cache, if it exceeds this size, default is {}.'.format(DEFAULT_RED_CACHE_SIZE)
+    )
 
 
 def main():
@@ -43,7 +57,7 @@ def main():
     return 0
 
 
-def run(red_file, fmt, prefix, **_):
+def run(red_file, fmt, prefix, red_cache=None, red_cache_size=DEFAULT_RED_CACHE_SIZE, **_):
     secret_values = None
     result = {
         'state': 'succeeded',
@@ -52,10 +66,19 @@ def run(red_file, fmt, prefix, **_):
     try:
         ext = file_extension(fmt)
 
-        red_data = load_and_read(red_file, 'REDFILE')
-        secret_values = get_secret_values(red_data)
+        # secret values are collected before the validation, so they are hidden in validation errors
+        secret_values = []
 
-        red_validation(red_data, False)
+        def validate(data):
+            secret_values.extend(get_secret_values(data))
+            red_validation(data, False)
+
+        red_data, _ = load_validated_red(
+            red_file,
+            [('red', validate)],
+            RedCache(red_cache, red_cache_size) if red_cache else None
+        )
+        secret_values = get_secret_values(red_data)
 
         if 'batches' not in red_data:
             wrapped_print([
@@ -1,10 +1,13 @@
+import os
 from argparse import ArgumentParser
 
 from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 
 from cc_core.commons.exceptions import AgentError, print_exception, exception_format, RedSpecificationError
-from cc_core.commons.files import dump_print, load_and_read
+
+from cc_faice.commons.serialization import dump_print, load_and_read
+from cc_faice.commons.conversion import expand_inputs, convert_files
 
 
 DESCRIPTION = 'Read cli section of a REDFILE and write it to stdout in the specified format.'
@@ -12,8 +15,10 @@ DESCRIPTION = 'Read cli section of a REDFILE and write it to stdout in the speci
 
 def attach_args(parser):
     parser.add_argument(
-        'red_file', action='store', type=str, metavar='REDFILE',
-        help='REDFILE (json or yaml) containing an experiment description as local PATH or http URL.'
+        'red_files', action='store', type=str, metavar='REDFILE', nargs='+',
+        help='REDFILE (json or yaml) containing an experiment description as local PATH or http URL. Several REDFILEs, '
+             'glob patterns and directories containing REDFILEs can be given together with --output-dir or '
+             '--json-lines.'
     )
     parser.add_argument(
         '--format', action='store', type=str, metavar='FORMAT', choices=['json', 'yaml', 'yml'], default='yaml',
@@ -23,6 +28,19 @@ def attach_args(parser):
         '-d', '--debug', action='store_true',
         help='Write debug info, including detailed exceptions, to stdout.'
     )
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument(
+        '--output-dir', action='store', type=str, metavar='OUTPUT_DIR',
+        help='Write the cli section of each REDFILE to a file in OUTPUT_DIR, which is named like the REDFILE.'
+    )
+    output_group.add_argument(
+        '--json-lines', action='store_true',
+        help='Write the cli section of each REDFILE as json line together with the name of the REDFILE to stdout.'
+    )
+    parser.add_argument(
+        '--workers', action='store', type=int, metavar='WORKERS', default=os.cpu_count() or 1,
+        help='Convert several REDFILEs in WORKERS processes, default is the number of cpus.'
+    )
 
 
 def main():
@@ -30,7 +48,12 @@ def main():
     attach_args(parser)
     args = parser.parse_args()
 
-    result = run(**args.__dict__, fmt=args.format)
+    if args.output_dir or args.json_lines:
+        result = run_files(**args.__dict__, fmt=args.format)
+    elif len(args.red_files) == 1:
+        result = run(red_file=args.red_files[0], fmt=args.format)
+    else:
+        parser.error('converting several REDFILEs requires --output-dir or --json-lines')
 
     if args.debug and (result['state'] != 'succeeded'):
         dump_print(result, args.format)
@@ -66,3 +89,44 @@ def run(red_file, fmt, **_):
     dump_print(cli, fmt)
 
     return result
+
+
+def _extract_cli(red_data):
+    """
+    :raise RedSpecificationError: If the given red data does not contain a cli section
+    """
+    if 'cli' not in red_data:
+        raise RedSpecificationError('ERROR: REDFILE does not contain cli section.')
+    return red_data['cli']
+
+
+def run_files(red_files, fmt, output_dir=None, workers=1, **_):
+    """
+    Extracts the cli sections of several REDFILEs. See convert_files() for a description of the outputs.
+
+    :param red_files: Paths, glob patterns or directories of REDFILEs
+    :type red_files: List[str]
+    :param fmt: The format of the files written to output_dir
+    :type fmt: str
+    :param output_dir: The directory to write the cli sections to. If None, json lines are written to stdout.
+    :type output_dir: str or None
+    :param workers: The number of worker processes
+    :type workers: int
+    """
+    result = {
+        'state': 'succeeded',
+        'debugInfo': None,
+        'errors': []
+    }
+
+    try:
+        result['errors'] = convert_files(expand_inputs(red_files), _extract_cli, fmt, output_dir, workers)
+    except Exception as e:
+        print_exception(e)
+        result['debugInfo'] = exception_format()
+        result['state'] = 'failed'
+
+    if result['errors']:
+        result['state'] = 'failed'
+
+    return result
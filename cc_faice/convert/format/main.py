@@ -1,7 +1,10 @@
+import os
 from argparse import ArgumentParser
 
 from cc_core.commons.exceptions import print_exception, AgentError, exception_format
-from cc_core.commons.files import dump_print, load_and_read
+
+from cc_faice.commons.serialization import dump_print, load_and_read
+from cc_faice.commons.conversion import expand_inputs, convert_files
 
 
 DESCRIPTION = 'Read an arbitrary JSON or YAML file and convert it into the specified format.'
@@ -9,8 +12,10 @@ DESCRIPTION = 'Read an arbitrary JSON or YAML file and convert it into the speci
 
 def attach_args(parser):
     parser.add_argument(
-        'file', action='store', type=str, metavar='FILE',
-        help='FILE (json or yaml) to be converted into specified FORMAT as local path or http url.'
+        'files', action='store', type=str, metavar='FILE', nargs='+',
+        help='FILE (json or yaml) to be converted into specified FORMAT as local path or http url. Several FILEs, glob '
+             'patterns and directories containing json or yaml files can be given together with --output-dir or '
+             '--json-lines.'
     )
     parser.add_argument(
         '--format', action='store', type=str, metavar='FORMAT', choices=['json', 'yaml', 'yml'], default='yaml',
@@ -20,6 +25,20 @@ def attach_args(parser):
         '-d', '--debug', action='store_true',
         help='Write debug info, including detailed exceptions, to stdout.'
     )
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument(
+        '--output-dir', action='store', type=str, metavar='OUTPUT_DIR',
+        help='Write each converted FILE to a file in OUTPUT_DIR, which is named like FILE with the extension of '
+             'FORMAT.'
+    )
+    output_group.add_argument(
+        '--json-lines', action='store_true',
+        help='Write the content of each FILE as json line together with the name of FILE to stdout.'
+    )
+    parser.add_argument(
+        '--workers', action='store', type=int, metavar='WORKERS', default=os.cpu_count() or 1,
+        help='Convert several FILEs in WORKERS processes, default is the number of cpus.'
+    )
 
 
 def main():
@@ -27,7 +46,12 @@ def main():
     attach_args(parser)
     args = parser.parse_args()
 
-    result = run(**args.__dict__, fmt=args.format)
+    if args.output_dir or args.json_lines:
+        result = run_files(**args.__dict__, fmt=args.format)
+    elif len(args.files) == 1:
+        result = run(file=args.files[0], fmt=args.format)
+    else:
+        parser.error('converting several FILEs requires --output-dir or --json-lines')
 
     if result['state'] == 'succeeded':
         return 0
@@ -53,3 +77,39 @@ def run(file, fmt, **_):
         result['state'] = 'failed'
 
     return result
+
+
+def _extract_data(data):
+    return data
+
+
+def run_files(files, fmt, output_dir=None, workers=1, **_):
+    """
+    Converts several files. See convert_files() for a description of the outputs.
+
+    :param files: Paths, glob patterns or directories of json or yaml files
+    :type files: List[str]
+    :param fmt: The format of the files written to output_dir
+    :type fmt: str
+    :param output_dir: The directory to write the converted files to. If None, json lines are written to stdout.
+    :type output_dir: str or None
+    :param workers: The number of worker processes
+    :type workers: int
+    """
+    result = {
+        'state': 'succeeded',
+        'debugInfo': None,
+        'errors': []
+    }
+
+    try:
+        result['errors'] = convert_files(expand_inputs(files), _extract_data, fmt, output_dir, workers)
+    except Exception as e:
+        print_exception(e)
+        result['debugInfo'] = exception_format()
+        result['state'] = 'failed'
+
+    if result['errors']:
+        result['state'] = 'failed'
+
+    return result
@@ -5,13 +5,14 @@ from pprint import pprint
 import requests
 
 from cc_core.commons.exceptions import print_exception, exception_format
-from cc_core.commons.files import load_and_read, dump_print
 from cc_core.commons.red import red_validation
 from cc_core.commons.engines import engine_validation
 from cc_core.commons.templates import normalize_keys, get_secret_values
 
+from cc_faice.commons.serialization import dump_print
 from cc_faice.agent.red.main import run as run_faice_agent_red, OutputMode
 from cc_faice.commons.templates import complete_red_templates
+from cc_faice.commons.red_cache import RedCache, RED_CACHE_DIR, DEFAULT_RED_CACHE_SIZE, load_validated_red
 
 DESCRIPTION = 'Execute experiment according to execution engine defined in REDFILE.'
 
@@ -42,6 +43,17 @@ def attach_args(parser):
         '--keyring-service', action='store', type=str, metavar='KEYRING_SERVICE', default='red',
         help='Keyring service to resolve template values, default is "red".'
     )
+    parser.add_argument(
+        '--red-cache', action='store', type=str, metavar='CACHE_DIR', nargs='?', const=RED_CACHE_DIR,
+        help='Cache the parsed and validated REDFILE in CACHE_DIR, so parsing and validation are skipped, if the '
+             'REDFILE did not change. If CACHE_DIR is omitted, "{}" is used. The cache contains the REDFILE including '
+             'all credentials given in it.'.format(RED_CACHE_DIR)
+    )
+    parser.add_argument(
+        '--red-cache-size', action='store', type=int, metavar='MEGABYTES', default=DEFAULT_RED_CACHE_SIZE,
+        help='The maximal size of the REDFILE cache in MEGABYTES. Least recently used REDFILEs are removed from the '
+             'cache, if it exceeds this size, default is {}.'.format(DEFAULT_RED_CACHE_SIZE)
+    )
 
 
 def main():
@@ -81,16 +93,25 @@ def _has_outputs(red_data):
     return False
 
 
-def run(red_file, non_interactive, fmt, insecure, keyring_service, **_):
+def run(red_file, non_interactive, fmt, insecure, keyring_service, red_cache=None, red_cache_size=DEFAULT_RED_CACHE_SIZE,
+        **_):
     secret_values = None
     result = {
         'state': 'succeeded',
         'debugInfo': None
     }
     try:
-        red_data = load_and_read(red_file, 'REDFILE')
-        red_validation(red_data, False)
-        engine_validation(red_data, 'execution', ['ccfaice', 'ccagency'], 'faice exec')
+        red_data, _ = load_validated_red(
+            red_file,
+            [
+                ('red', lambda data: red_validation(data, False)),
+                (
+                    'execution-engine',
+                    lambda data: engine_validation(data, 'execution', ['ccfaice', 'ccagency'], 'faice exec')
+                )
+            ],
+            RedCache(red_cache, red_cache_size) if red_cache else None
+        )
 
         secret_values = get_secret_values(red_data)
 
@@ -114,7 +135,9 @@ def run(red_file, non_interactive, fmt, insecure, keyring_service, **_):
                 insecure=insecure,
                 output_mode=faice_output_mode,
                 keyring_service=keyring_service,
-                gpu_ids=None
+                gpu_ids=None,
+                red_cache=red_cache,
+                red_cache_size=red_cache_size
             )
             return result
 
@@ -1,33 +1,65 @@
+import os
+import sys
 from collections import OrderedDict
 
 from cc_faice.version import VERSION
-from cc_faice.commons.compatibility import version_validation
-
-from cc_faice.agent.main import main as agent_main
-from cc_faice.exec.main import main as exec_main
-from cc_faice.schema.main import main as schema_main
-from cc_faice.convert.main import main as convert_main
-
-from cc_faice.agent.main import DESCRIPTION as AGENT_DESCRIPTION
-from cc_faice.exec.main import DESCRIPTION as EXEC_DESCRIPTION
-from cc_faice.schema.main import DESCRIPTION as SCHEMA_DESCRIPTION
-from cc_faice.convert.main import DESCRIPTION as CONVERT_DESCRIPTION
-
-from cc_core.commons.cli_modes import cli_modes
+from cc_faice.commons.server import run_on_server
 
 
 SCRIPT_NAME = 'faice'
 TITLE = 'tools'
 DESCRIPTION = 'FAICE Copyright (C) 2018  Christoph Jansen. This software is distributed under the AGPL-3.0 ' \
               'LICENSE and is part of the Curious Containers project (https://www.curious-containers.cc).'
-MODES = OrderedDict([
-    ('agent', {'main': agent_main, 'description': AGENT_DESCRIPTION}),
-    ('exec', {'main': exec_main, 'description': EXEC_DESCRIPTION}),
-    ('schema', {'main': schema_main, 'description': SCHEMA_DESCRIPTION}),
-    ('convert', {'main': convert_main, 'description': CONVERT_DESCRIPTION}),
-])
 
 
-def main():
+def load_modes():
+    """
+    Imports all faice tools. The imports are deferred until a command is executed locally, so commands executed by a
+    faice server do not pay for importing cc-core, docker and keyring.
+
+    :return: The faice tools as required by cli_modes()
+    :rtype: OrderedDict
+    """
+    from cc_faice.agent.main import main as agent_main
+    from cc_faice.exec.main import main as exec_main
+    from cc_faice.schema.main import main as schema_main
+    from cc_faice.convert.main import main as convert_main
+    from cc_faice.serve.main import main as serve_main
+
+    from cc_faice.agent.main import DESCRIPTION as AGENT_DESCRIPTION
+    from cc_faice.exec.main import DESCRIPTION as EXEC_DESCRIPTION
+    from cc_faice.schema.main import DESCRIPTION as SCHEMA_DESCRIPTION
+    from cc_faice.convert.main import DESCRIPTION as CONVERT_DESCRIPTION
+    from cc_faice.serve.main import DESCRIPTION as SERVE_DESCRIPTION
+
+    return OrderedDict([
+        ('agent', {'main': agent_main, 'description': AGENT_DESCRIPTION}),
+        ('exec', {'main': exec_main, 'description': EXEC_DESCRIPTION}),
+        ('schema', {'main': schema_main, 'description': SCHEMA_DESCRIPTION}),
+        ('convert', {'main': convert_main, 'description': CONVERT_DESCRIPTION}),
+        ('serve', {'main': serve_main, 'description': SERVE_DESCRIPTION}),
+    ])
+
+
+def run_modes():
+    from cc_faice.commons.compatibility import version_validation
+    from cc_faice.commons.profiling import split_profiling_args
+    from cc_core.commons.cli_modes import cli_modes
+
+    # profiling options are removed, before the faice tool parses the command line arguments
+    sys.argv[1:], profiler = split_profiling_args(sys.argv[1:], os.environ)
+
+    modes = load_modes()
+    if profiler is not None:
+        modes = profiler.wrap_modes(modes)
     version_validation()
-    cli_modes(SCRIPT_NAME, TITLE, DESCRIPTION, MODES, VERSION)
+    cli_modes(SCRIPT_NAME, TITLE, DESCRIPTION, modes, VERSION)
+
+
+def main():
+    # use a running faice server, if enabled and available
+    exit_code = run_on_server(sys.argv[1:])
+    if exit_code is not None:
+        exit(exit_code)
+
+    run_modes()
@@ -1,7 +1,8 @@
 from argparse import ArgumentParser
 
 from cc_core.commons.schema_map import schemas
-from cc_core.commons.files import dump_print
+
+from cc_faice.commons.serialization import dump_print
 
 
 DESCRIPTION = 'List of all available jsonschemas defined in cc-core.'
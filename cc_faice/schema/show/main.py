@@ -2,7 +2,8 @@ import sys
 from argparse import ArgumentParser
 
 from cc_core.commons.schema_map import schemas
-from cc_core.commons.files import dump_print
+
+from cc_faice.commons.serialization import dump_print
 
 
 DESCRIPTION = 'Write a jsonschema to stdout.'
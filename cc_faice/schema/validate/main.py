@@ -6,7 +6,8 @@ from jsonschema import ValidationError
 
 from cc_core.commons.exceptions import print_exception, exception_format, RedValidationError
 from cc_core.commons.schema_map import schemas
-from cc_core.commons.files import load_and_read, dump_print
+
+from cc_faice.commons.serialization import load_and_read, dump_print
 
 DESCRIPTION = 'Validate data against schema. Returns code 0 if data is valid.'
 
@@ -0,0 +1,81 @@
+import sys
+from argparse import ArgumentParser
+
+import keyring
+from docker.errors import DockerException
+
+from cc_core.commons.exceptions import print_exception
+
+from cc_faice.commons.docker import DockerManager
+from cc_faice.commons.server import serve_forever, socket_path, SOCKET_ENVVAR, SERVER_ENVVAR, NO_SERVER_ENVVAR
+from cc_faice.main import load_modes, run_modes
+
+DESCRIPTION = 'Run a faice server, which executes "agent red", "exec", "schema validate" and "convert" commands of ' \
+              'the faice command line client without repeating the startup costs.'
+
+
+def attach_args(parser):
+    parser.add_argument(
+        '--socket', action='store', type=str, metavar='SOCKET_PATH',
+        help='Listen on the unix socket SOCKET_PATH. The faice client only uses a server, if the environment variable '
+             '{} is set, and connects to the socket given by the environment variable {}, default is "{}". Set {} to '
+             'execute commands without server.'.format(SERVER_ENVVAR, SOCKET_ENVVAR, socket_path(), NO_SERVER_ENVVAR)
+    )
+    parser.add_argument(
+        '--detect-gpus', action='store_true',
+        help='Detect the nvidia gpus of the docker daemon once at startup instead of for every command. Gpus, which '
+             'are added or removed while the server is running, are not recognized.'
+    )
+    parser.add_argument(
+        '--disable-docker', action='store_true',
+        help='Do not connect to the docker daemon at startup.'
+    )
+
+
+def main():
+    parser = ArgumentParser(description=DESCRIPTION)
+    attach_args(parser)
+    args = parser.parse_args()
+
+    try:
+        run(**args.__dict__)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print_exception(e)
+        return 1
+
+    return 0
+
+
+def run(socket=None, detect_gpus=False, disable_docker=False, **_):
+    """
+    Prepares all faice tools and executes requests of faice clients until the server is terminated.
+
+    :param socket: The path of the unix socket. If None, the default socket path is used.
+    :type socket: str or None
+    :param detect_gpus: If True, the gpus of the docker daemon are detected once at startup
+    :type detect_gpus: bool
+    :param disable_docker: If True, the docker daemon is not queried at startup
+    :type disable_docker: bool
+    """
+    if socket is None:
+        socket = socket_path()
+
+    # import all tools and initialize the keyring backend, so forked requests inherit them
+    load_modes()
+    keyring.get_keyring()
+
+    if not disable_docker:
+        try:
+            DockerManager().cache_daemon_info(detect_gpus)
+        except DockerException as e:
+            print('Docker daemon information is not cached: {}'.format(e), file=sys.stderr)
+
+    print('faice server listening on "{}"'.format(socket), file=sys.stderr)
+    serve_forever(socket, _execute_command)
+
+
+def _execute_command(argv):
+    sys.argv = ['faice'] + argv
+    run_modes()
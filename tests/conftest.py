@@ -0,0 +1,182 @@
+import json
+import threading
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from cc_core.commons.red_to_blue import CONTAINER_AGENT_PATH
+
+from cc_faice.agent.red.main import run as run_red, OutputMode
+from cc_faice.commons.container_backends import FakeBackend
+
+DOCKER_IMAGE = 'docker.io/curiouscontainers/cc-core-example:latest'
+
+
+def create_red_data(batch_inputs, cli_inputs=None, base_command='echo'):
+    """
+    Creates red data, whose cli prints its inputs and has the output file out.txt.
+
+    :param batch_inputs: The inputs of every batch
+    :type batch_inputs: List[Dict]
+    :param cli_inputs: The cli inputs. If None, every input is a string.
+    :type cli_inputs: Dict or None
+    :param base_command: The base command of the cli
+    :type base_command: str or List[str]
+
+    :rtype: Dict
+    """
+    if cli_inputs is None:
+        cli_inputs = {}
+        for inputs in batch_inputs:
+            for key in inputs:
+                cli_inputs[key] = {'type': 'string', 'inputBinding': {'position': len(cli_inputs)}}
+
+    return {
+        'redVersion': '8',
+        'cli': {
+            'cwlVersion': 'v1.0',
+            'class': 'CommandLineTool',
+            'baseCommand': base_command,
+            'inputs': cli_inputs,
+            'outputs': {
+                'out': {'type': 'File', 'outputBinding': {'glob': 'out.txt'}}
+            }
+        },
+        'batches': [{'inputs': inputs, 'outputs': {}} for inputs in batch_inputs],
+        'container': {
+            'engine': 'docker',
+            'settings': {
+                'image': {'url': DOCKER_IMAGE},
+                'ram': 256
+            }
+        }
+    }
+
+
+# the arguments of faice agent red without REDFILE, which are not changed by the tests
+RUN_ARGUMENTS = {
+    'disable_pull': False,
+    'leave_container': False,
+    'preserve_environment': None,
+    'non_interactive': True,
+    'insecure': False,
+    'output_mode': OutputMode.Directory,
+    'keyring_service': 'red',
+    'gpu_ids': None
+}
+
+
+class RecordingBackend(FakeBackend):
+    """
+    A fake backend, which records the docker host and the arguments of every created container and counts the blue
+    agents running at the same time. The simulated blue agent depends on the last argument of the batch command: it
+    fails for "fail" and the first execution of a batch with "flaky" loses the connection to the docker daemon.
+    """
+    def __init__(self, latencies=None):
+        super().__init__(latencies)
+        self.containers = []
+        self.flaky_executions = 0
+        self.running_agents = 0
+        self.max_running_agents = 0
+        # the number of containers created while a blue agent was running
+        self.created_during_execution = 0
+        self._lock = threading.Lock()
+
+    def create_client(self, base_url, pool_size, timeout):
+        client = super().create_client(base_url, pool_size, timeout)
+        create = client.containers.create
+
+        def recording_create(image, command, **kwargs):
+            with self._lock:
+                self.containers.append((base_url, kwargs))
+                if self.running_agents:
+                    self.created_during_execution += 1
+            container = create(image, command, **kwargs)
+            container.exec_run = self._scripted_exec_run(container)
+            return container
+
+        client.containers.create = recording_create
+        return client
+
+    def _scripted_exec_run(self, container):
+        exec_run = container.exec_run
+
+        def run_agent(cmd, **kwargs):
+            blue_batch = container._blue_batch
+            message = blue_batch['command'][-1] if blue_batch else None
+
+            if message == 'fail':
+                agent_result = {
+                    'state': 'failed', 'command': blue_batch['command'], 'outputs': {}, 'debugInfo': ['failed']
+                }
+                return 1, (json.dumps(agent_result).encode('utf-8'), b'')
+
+            if message == 'flaky':
+                with self._lock:
+                    self.flaky_executions += 1
+                    first_execution = self.flaky_executions == 1
+                if first_execution:
+                    raise ConnectionError('Connection aborted.')
+
+            return exec_run(cmd, **kwargs)
+
+        def scripted_exec_run(cmd, **kwargs):
+            if CONTAINER_AGENT_PATH not in cmd:
+                return exec_run(cmd, **kwargs)
+
+            with self._lock:
+                self.running_agents += 1
+                self.max_running_agents = max(self.max_running_agents, self.running_agents)
+            try:
+                return run_agent(cmd, **kwargs)
+            finally:
+                with self._lock:
+                    self.running_agents -= 1
+
+        return scripted_exec_run
+
+
+@pytest.fixture
+def fake_backend():
+    """
+    Returns a fake container backend, which records the created containers.
+    """
+    return RecordingBackend()
+
+
+@pytest.fixture
+def run_experiment(fake_backend):
+    """
+    Returns a function, which executes a REDFILE like faice agent red with the fake backend. Arguments of run() can be
+    given as keyword arguments.
+    """
+    def run(red_file, **kwargs):
+        arguments = dict(RUN_ARGUMENTS, red_file=red_file, container_backend=fake_backend)
+        arguments.update(kwargs)
+        return run_red(**arguments)
+
+    return run
+
+
+@pytest.fixture
+def write_red_file(tmp_path):
+    """
+    Returns a function, which writes red data created by create_red_data() to a REDFILE and returns its path.
+    """
+    def write(batch_inputs, cli_inputs=None, base_command='echo'):
+        path = tmp_path / 'experiment.red.json'
+        path.write_text(json.dumps(create_red_data(batch_inputs, cli_inputs, base_command)))
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def run_directory(tmp_path, monkeypatch):
+    """
+    Changes the working directory to an empty directory, in which faice agent red writes its outputs.
+    """
+    directory = tmp_path / 'run'
+    directory.mkdir()
+    monkeypatch.chdir(directory)
+    return directory
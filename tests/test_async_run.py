@@ -0,0 +1,167 @@
+import asyncio
+import io
+import json
+import struct
+import tarfile
+from urllib.parse import urlsplit, parse_qsl
+
+from cc_faice.agent.red.async_run import run
+from cc_faice.commons.async_docker import AsyncDockerManager
+
+
+class FakeDockerApi:
+    """
+    A fake docker engine api served on a unix socket. The blue agent of every container succeeds and creates the file
+    out.txt containing the last argument of its command, if this argument is not "fail". Batches with the argument
+    "sleep" run until their container is killed.
+    """
+    def __init__(self):
+        self.containers = {}
+        self.execs = {}
+        self.requests = []
+
+    async def handle(self, reader, writer):
+        method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', ''):
+                break
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+        url = urlsplit(target)
+        path = '/' + url.path.split('/', 2)[2]
+        params = dict(parse_qsl(url.query))
+        self.requests.append((method, path))
+
+        status, payload = await self._respond(method, path.strip('/').split('/'), params, body)
+        if isinstance(payload, dict):
+            payload = json.dumps(payload).encode('utf-8')
+        writer.write('HTTP/1.1 {} Fake\r\nContent-Length: {}\r\n\r\n'.format(status, len(payload)).encode('latin-1'))
+        writer.write(payload)
+        await writer.drain()
+        writer.close()
+
+    async def _respond(self, method, parts, params, body):
+        if parts == ['containers', 'create']:
+            container_id = 'container{}'.format(len(self.containers))
+            self.containers[container_id] = {
+                'name': params['name'], 'config': json.loads(body.decode('utf-8')), 'killed': asyncio.Event()
+            }
+            return 201, {'Id': container_id}
+
+        if parts[0] == 'containers' and parts[-1] == 'archive' and method == 'PUT':
+            archive = tarfile.open(fileobj=io.BytesIO(body))
+            blue_file = json.loads(archive.extractfile('/cc/blue_file.json').read().decode('utf-8'))
+            self.containers[parts[1]]['message'] = blue_file['command'][-1]
+            return 200, b''
+
+        if parts[0] == 'containers' and parts[-1] == 'archive' and method == 'GET':
+            if params['path'] != '/cc/outputs/out.txt':
+                return 404, {'message': 'Could not find the file {} in container'.format(params['path'])}
+            data = self.containers[parts[1]]['message'].encode('utf-8')
+            archive = io.BytesIO()
+            with tarfile.open(fileobj=archive, mode='w') as tar:
+                info = tarfile.TarInfo('out.txt')
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            return 200, archive.getvalue()
+
+        if parts[0] == 'containers' and parts[-1] == 'exec':
+            exec_id = 'exec{}'.format(len(self.execs))
+            self.execs[exec_id] = {'container': parts[1], 'command': json.loads(body.decode('utf-8'))['Cmd']}
+            return 201, {'Id': exec_id}
+
+        if parts[0] == 'exec' and parts[-1] == 'start':
+            execution = self.execs[parts[1]]
+            message = self.containers[execution['container']]['message']
+            if message == 'sleep':
+                await self.containers[execution['container']]['killed'].wait()
+            state = 'failed' if message == 'fail' else 'succeeded'
+            agent_result = json.dumps({'state': state, 'outputs': {'out': {'path': 'out.txt'}}}).encode('utf-8')
+            execution['code'] = 0 if state == 'succeeded' else 1
+            return 200, struct.pack('>BxxxL', 1, len(agent_result)) + agent_result
+
+        if parts[0] == 'exec' and parts[-1] == 'json':
+            return 200, {'ExitCode': self.execs[parts[1]]['code']}
+
+        if parts[0] == 'containers' and parts[-1] == 'stats':
+            return 200, {'memory_stats': {'max_usage': 1024}}
+
+        if parts[0] == 'containers' and parts[-1] == 'kill':
+            self.containers[parts[1]]['killed'].set()
+            return 204, b''
+
+        if parts[0] == 'containers' and parts[-1] in ('start', 'stop') or method == 'DELETE':
+            return 204, b''
+
+        return 404, {'message': 'unknown api call'}
+
+
+def _run_with_fake_api(tmp_path, red_file, **kwargs):
+    """
+    Executes the given REDFILE with the asyncio api against a fake docker engine api.
+
+    :return: The result of the experiment and the fake docker engine api
+    :rtype: Tuple[Dict, FakeDockerApi]
+    """
+    socket_path = str(tmp_path / 'docker.sock')
+    docker_api = FakeDockerApi()
+
+    async def run_experiment():
+        server = await asyncio.start_unix_server(docker_api.handle, socket_path)
+        try:
+            docker_manager = AsyncDockerManager(socket_path=socket_path, timeout=5)
+            return await run(red_file, docker_manager=docker_manager, disable_pull=True, **kwargs)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(run_experiment()), docker_api
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_batches_are_executed_in_containers(tmp_path, write_red_file, run_directory):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'second'}])
+
+    result, docker_api = _run_with_fake_api(tmp_path, red_file, jobs=2)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert [batch['state'] for batch in result['batches']] == ['succeeded', 'succeeded']
+    assert (run_directory / 'outputs_0' / 'out.txt').read_text() == 'first'
+    assert (run_directory / 'outputs_1' / 'out.txt').read_text() == 'second'
+    assert ('DELETE', '/containers/container0') in docker_api.requests
+
+    # containers are configured like the containers of the threaded execution
+    config = docker_api.containers['container0']['config']
+    assert config['User'] == '1000:1000'
+    assert config['WorkingDir'] == '/cc/outputs'
+    assert config['Tty'] and config['OpenStdin']
+    assert config['HostConfig']['Memory'] == config['HostConfig']['MemorySwap'] == 256 * 1024 * 1024
+    assert config['HostConfig']['Ulimits'] == [{'Name': 'nofile', 'Soft': 4096, 'Hard': 4096}]
+
+
+def test_failed_batches_with_keep_going(tmp_path, write_red_file, run_directory):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'fail'}, {'message': 'third'}])
+
+    result, _ = _run_with_fake_api(tmp_path, red_file, jobs=1, keep_going=True)
+
+    assert result['state'] == 'failed'
+    assert [batch['state'] for batch in result['batches']] == ['succeeded', 'failed', 'succeeded']
+    assert (run_directory / 'outputs_2' / 'out.txt').read_text() == 'third'
+
+
+def test_timed_out_batch_is_killed(tmp_path, write_red_file, run_directory):
+    red_file = write_red_file([{'message': 'sleep'}])
+
+    result, docker_api = _run_with_fake_api(tmp_path, red_file, batch_timeout=0.5, keep_going=True)
+
+    assert [batch['state'] for batch in result['batches']] == ['timedout']
+    assert ('POST', '/containers/container0/kill') in docker_api.requests
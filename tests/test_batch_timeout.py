@@ -0,0 +1,41 @@
+import json
+
+from cc_faice.commons.container_backends import FakeLatencies
+
+
+def test_timed_out_batch_is_killed(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'second'}])
+    fake_backend.latencies = FakeLatencies(agent=30)
+
+    result = run_experiment(red_file, batch_timeout=0.2, keep_going=True)
+
+    assert result['state'] == 'failed'
+    assert [batch['state'] for batch in result['batches']] == ['timedout', 'timedout']
+    assert [container['state'] for container in result['containers']] == ['timedout', 'timedout']
+    assert not (run_directory / 'outputs_0').exists()
+
+
+def test_timed_out_batch_is_retried_once(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}])
+    fake_backend.latencies = FakeLatencies(agent=30)
+
+    result = run_experiment(red_file, batch_timeout=0.2, retry_timeout=True, keep_going=True)
+
+    assert [batch['state'] for batch in result['batches']] == ['timedout']
+    assert [batch['attempts'] for batch in result['batches']] == [2]
+    assert len(fake_backend.containers) == 2
+
+
+def test_batch_timeout_of_container_settings(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}])
+    with open(red_file) as f:
+        red_data = json.load(f)
+    red_data['container']['settings']['batchTimeout'] = 1
+    with open(red_file, 'w') as f:
+        json.dump(red_data, f)
+    fake_backend.latencies = FakeLatencies(agent=30)
+
+    result = run_experiment(red_file)
+
+    assert result['state'] == 'failed'
+    assert [batch['state'] for batch in result['batches']] == ['timedout']
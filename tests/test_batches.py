@@ -0,0 +1,110 @@
+import copy
+
+import pytest
+
+from cc_core.commons.red_to_blue import convert_red_to_blue
+
+from cc_faice.commons.batches import red_batch_hashes, BlueBatchConverter, lazy_blue_batches
+
+CLI = {'baseCommand': 'echo', 'inputs': {'data': {'type': 'File', 'inputBinding': {'position': 0}}}}
+CONTAINER = {'engine': 'docker', 'settings': {'image': {'url': 'docker.io/curiouscontainers/cc-core-example:latest'}}}
+
+
+def _red_data(*batch_inputs):
+    return {'cli': CLI, 'container': CONTAINER, 'batches': [{'inputs': inputs} for inputs in batch_inputs]}
+
+
+def _ssh_input(path, password):
+    access = {'host': 'localhost', 'path': path, 'auth': {'username': 'user', '_password': password}}
+    return {'data': {'class': 'File', 'connector': {'command': 'red-connector-ssh', 'access': access}}}
+
+
+def test_batch_hashes_do_not_depend_on_credentials():
+    expected = red_batch_hashes(_red_data(_ssh_input('/data', 'secret')))
+
+    assert red_batch_hashes(_red_data(_ssh_input('/data', 'rotated'))) == expected
+    assert red_batch_hashes(_red_data(_ssh_input('/data', '{{ssh_password}}'))) == expected
+    assert red_batch_hashes(_red_data(_ssh_input('/other', 'secret'))) != expected
+
+
+def test_batch_hashes_depend_on_inputs():
+    first_input = _ssh_input('/first', 'secret')
+    red_data = _red_data(first_input, _ssh_input('/second', 'secret'), copy.deepcopy(first_input))
+    original = copy.deepcopy(red_data)
+
+    first, second, third = red_batch_hashes(red_data)
+
+    assert first == third
+    assert first != second
+    assert red_data == original
+
+
+def _string_red_data(*messages):
+    cli = {
+        'baseCommand': 'echo',
+        'inputs': {'message': {'type': 'string', 'inputBinding': {'position': 0}}},
+        'outputs': {'out': {'type': 'File', 'outputBinding': {'glob': 'out.txt'}}}
+    }
+    return {'cli': cli, 'container': CONTAINER, 'batches': [{'inputs': {'message': message}} for message in messages]}
+
+
+def test_converter_creates_blue_batches_like_cc_core():
+    red_data = _string_red_data('first', 'second')
+    expected = convert_red_to_blue(copy.deepcopy(red_data))
+
+    converter = BlueBatchConverter(red_data)
+
+    assert len(converter) == 2
+    assert [converter.convert(batch_index) for batch_index in range(2)] == expected
+
+
+def test_converted_batches_are_released():
+    red_data = _string_red_data('first', 'second')
+    converter = BlueBatchConverter(red_data)
+
+    converter.convert(1)
+
+    assert red_data['batches'][1] is None
+    with pytest.raises(ValueError):
+        converter.convert(1)
+
+
+def test_red_data_without_batches_is_a_single_batch():
+    red_data = _string_red_data()
+    del red_data['batches']
+    red_data['inputs'] = {'message': 'single'}
+    converter = BlueBatchConverter(red_data)
+
+    assert len(converter) == 1
+    assert converter.convert(0)['command'] == ['echo', 'single']
+    with pytest.raises(IndexError):
+        converter.convert(1)
+
+
+def test_batches_are_converted_on_demand():
+    red_data = _string_red_data('first', 'second', 'third')
+
+    blue_batches = lazy_blue_batches(BlueBatchConverter(red_data), [2, 0, 1])
+
+    batch_index, blue_batch = next(blue_batches)
+    assert (batch_index, blue_batch['command']) == (2, ['echo', 'third'])
+    assert red_data['batches'][0] is not None and red_data['batches'][1] is not None
+
+
+def test_batches_are_converted_just_before_execution(write_red_file, run_directory, fake_backend, run_experiment,
+                                                     monkeypatch):
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(3)])
+    created_containers = []
+    convert = BlueBatchConverter.convert
+
+    def recording_convert(self, batch_index):
+        created_containers.append(len(fake_backend.containers))
+        return convert(self, batch_index)
+
+    monkeypatch.setattr(BlueBatchConverter, 'convert', recording_convert)
+
+    result = run_experiment(red_file, jobs=1)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    # every batch is converted after the container of the previous batch was created
+    assert created_containers == [0, 1, 2]
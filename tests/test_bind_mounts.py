@@ -0,0 +1,72 @@
+import os
+
+from cc_core.commons.red_to_blue import CONTAINER_OUTPUT_DIR, CONTAINER_AGENT_PATH, CONTAINER_BLUE_FILE_PATH
+
+from cc_faice.agent.red.main import OutputMode
+from cc_faice.commons.docker import DockerManager, prepare_bind_directory, CONTAINER_USER_ID
+
+
+def _binds(arguments):
+    return {bind['bind']: (host_path, bind['mode']) for host_path, bind in (arguments['volumes'] or {}).items()}
+
+
+def test_outputs_directories_are_mounted(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'second'}])
+
+    result = run_experiment(red_file, mount_outputs=True)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    for batch_index, (_, arguments) in enumerate(fake_backend.containers):
+        outputs_directory = str(run_directory / 'outputs_{}'.format(batch_index))
+        assert _binds(arguments)[CONTAINER_OUTPUT_DIR] == (outputs_directory, 'rw')
+        # the outputs are written by the container directly and not copied from the container
+        assert os.listdir(outputs_directory) == []
+
+
+def test_mounted_outputs_require_directory_output_mode(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}])
+
+    result = run_experiment(red_file, mount_outputs=True, output_mode=OutputMode.Connectors)
+
+    assert result['state'] == 'failed'
+    assert not fake_backend.containers
+
+
+def test_bind_directory_is_writable_by_container_user(tmp_path):
+    directory = tmp_path / 'outputs'
+
+    prepare_bind_directory(str(directory))
+
+    status = directory.stat()
+    if os.geteuid() == 0:
+        assert status.st_uid == CONTAINER_USER_ID
+    elif os.geteuid() != CONTAINER_USER_ID:
+        assert status.st_mode & 0o777 == 0o777
+
+
+def test_agent_and_blue_file_are_mounted(write_red_file, run_directory, fake_backend, run_experiment, monkeypatch):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'second'}])
+
+    def put_archive(*args, **kwargs):
+        raise AssertionError('The blue file should not be uploaded.')
+
+    monkeypatch.setattr(DockerManager, 'put_archive', put_archive)
+
+    result = run_experiment(red_file, mount_agent=True)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    agent_paths = set()
+    for batch_index, (_, arguments) in enumerate(fake_backend.containers):
+        binds = _binds(arguments)
+        agent_path, agent_mode = binds[CONTAINER_AGENT_PATH]
+        blue_file_path, blue_file_mode = binds[CONTAINER_BLUE_FILE_PATH]
+        assert agent_mode == blue_file_mode == 'ro'
+        agent_paths.add(agent_path)
+
+        # the staged files are removed after the execution
+        assert not os.path.exists(blue_file_path)
+        assert (run_directory / 'outputs_{}'.format(batch_index) / 'out.txt').is_file()
+
+    # the agent is staged once for all batches
+    assert len(agent_paths) == 1
+    assert not os.path.exists(agent_paths.pop())
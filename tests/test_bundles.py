@@ -0,0 +1,143 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+import cc_faice.commons.bundles as bundles
+from cc_faice.agent.bundle.main import run as run_bundle
+from cc_faice.commons.bundles import BundleWriter, bundle_paths, GZIP_COMPRESSION, ZSTD_COMPRESSION
+
+FILES = {
+    'out/a.txt': b'first file',
+    'out/nested/b.txt': b'second file' * 1000,
+    'out/nested/c.txt': b''
+}
+
+
+def _output_archive():
+    """
+    :return: A tar archive like returned by container.get_archive() for the outputs directory "out"
+    :rtype: bytes
+    """
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w') as tar:
+        for directory in ('out', 'out/nested'):
+            tarinfo = tarfile.TarInfo(directory)
+            tarinfo.type = tarfile.DIRTYPE
+            tarinfo.mode = 0o755
+            tar.addfile(tarinfo)
+        for name, content in sorted(FILES.items()):
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = len(content)
+            tar.addfile(tarinfo, io.BytesIO(content))
+        link = tarfile.TarInfo('out/link')
+        link.type = tarfile.SYMTYPE
+        link.linkname = 'a.txt'
+        tar.addfile(link)
+    return archive.getvalue()
+
+
+def _write_bundle(directory, compression):
+    bundle_path, _ = bundle_paths(str(directory / 'outputs_0'), compression)
+    archive = _output_archive()
+    with BundleWriter(bundle_path, compression, chunk_size=1) as writer:
+        # the archive is streamed in small pieces like the docker archive stream
+        writer.add_archive(archive[offset:offset + 1000] for offset in range(0, len(archive), 1000))
+    return bundle_path
+
+
+@pytest.fixture(params=[GZIP_COMPRESSION, ZSTD_COMPRESSION])
+def compression(request):
+    if request.param == ZSTD_COMPRESSION:
+        pytest.importorskip('zstandard')
+    return request.param
+
+
+def test_bundle_is_a_compressed_tar_archive(tmp_path):
+    bundle_path = _write_bundle(tmp_path, GZIP_COMPRESSION)
+
+    with tarfile.open(bundle_path, 'r:gz') as tar:
+        assert sorted(tar.getnames()) == ['out', 'out/a.txt', 'out/link', 'out/nested', 'out/nested/b.txt',
+                                          'out/nested/c.txt']
+        for name, content in FILES.items():
+            assert tar.extractfile(name).read() == content
+
+
+def test_bundle_members_are_listed(tmp_path, compression):
+    bundle_path = _write_bundle(tmp_path, compression)
+
+    members = run_bundle(bundle_path)['members']
+
+    assert {member['name']: (member['type'], member['size']) for member in members} == {
+        'out': ('directory', 0),
+        'out/nested': ('directory', 0),
+        'out/a.txt': ('file', len(FILES['out/a.txt'])),
+        'out/nested/b.txt': ('file', len(FILES['out/nested/b.txt'])),
+        'out/nested/c.txt': ('file', 0),
+        'out/link': ('symlink', 0)
+    }
+
+
+def test_single_member_is_extracted_from_its_chunk(tmp_path, compression, monkeypatch):
+    bundle_path = _write_bundle(tmp_path, compression)
+    read_chunks = []
+    read_chunk = bundles._read_chunk
+
+    def recording_read_chunk(path, chunk_compression, chunk):
+        read_chunks.append(chunk)
+        return read_chunk(path, chunk_compression, chunk)
+
+    monkeypatch.setattr(bundles, '_read_chunk', recording_read_chunk)
+    output_dir = tmp_path / 'extracted'
+
+    members = run_bundle(bundle_path, ['out/nested/b.txt'], str(output_dir))['members']
+
+    assert [member['name'] for member in members] == ['out/nested/b.txt']
+    assert len(read_chunks) == 1
+    assert (output_dir / 'out' / 'nested' / 'b.txt').read_bytes() == FILES['out/nested/b.txt']
+    assert not (output_dir / 'out' / 'a.txt').exists()
+
+
+def test_directory_members_are_extracted_with_content(tmp_path, compression):
+    bundle_path = _write_bundle(tmp_path, compression)
+    output_dir = tmp_path / 'extracted'
+
+    run_bundle(bundle_path, ['out/nested/'], str(output_dir))
+
+    assert sorted(os.listdir(str(output_dir / 'out' / 'nested'))) == ['b.txt', 'c.txt']
+
+
+def test_missing_members_and_indices(tmp_path):
+    bundle_path = _write_bundle(tmp_path, GZIP_COMPRESSION)
+
+    with pytest.raises(ValueError):
+        run_bundle(bundle_path, ['out/missing.txt'], str(tmp_path / 'extracted'))
+
+    os.remove(bundle_paths(str(tmp_path / 'outputs_0'), GZIP_COMPRESSION)[1])
+    with pytest.raises(FileNotFoundError):
+        run_bundle(bundle_path)
+
+
+def test_batch_outputs_are_bundled(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'second'}])
+
+    result = run_experiment(red_file, bundle_outputs=GZIP_COMPRESSION)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    for batch_index in range(2):
+        outputs_directory = str(run_directory / 'outputs_{}'.format(batch_index))
+        bundle_path, index_path = bundle_paths(outputs_directory, GZIP_COMPRESSION)
+        assert os.path.isfile(index_path)
+        assert not os.path.exists(outputs_directory)
+        members = run_bundle(bundle_path)['members']
+        assert [(member['name'], member['size']) for member in members] == [('out.txt', fake_backend.output_size)]
+
+
+def test_bundles_require_directory_outputs(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}])
+
+    result = run_experiment(red_file, bundle_outputs=GZIP_COMPRESSION, mount_outputs=True)
+
+    assert result['state'] == 'failed'
+    assert not fake_backend.containers
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from cc_faice.commons.conversion import convert_files
+
+
+def identity(data):
+    return data
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_json_lines_report_data_without_json_representation(tmp_path, capsys, workers):
+    dated = tmp_path / 'dated.yml'
+    dated.write_text('created: 2020-01-01\n')
+    plain = tmp_path / 'plain.yml'
+    plain.write_text('name: plain\n')
+
+    errors = convert_files([str(dated), str(plain)], identity, 'json', workers=workers)
+
+    assert [error['file'] for error in errors] == [str(dated)]
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert lines[0]['file'] == str(dated) and 'error' in lines[0]
+    assert lines[1] == {'file': str(plain), 'data': {'name': 'plain'}}
+
+
+def test_output_dir_does_not_overwrite_input_files(tmp_path):
+    source = tmp_path / 'experiment.json'
+    source.write_text('{"name": "source"}')
+    other = tmp_path / 'other.yml'
+    other.write_text('name: other\n')
+
+    errors = convert_files([str(source), str(other)], identity, 'json', output_dir=str(tmp_path))
+
+    assert [error['file'] for error in errors] == [str(source)]
+    assert source.read_text() == '{"name": "source"}'
+    assert json.loads((tmp_path / 'other.json').read_text()) == {'name': 'other'}
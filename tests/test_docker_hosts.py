@@ -0,0 +1,84 @@
+import collections
+import threading
+import time
+
+import pytest
+
+from cc_faice.commons.container_backends import FakeLatencies
+from cc_faice.commons.docker_hosts import DockerHost, DockerHostPool, read_docker_hosts_file, is_local_docker_host
+
+
+def _hosts(count):
+    return [DockerHost(docker_manager='manager-{}'.format(index)) for index in range(count)]
+
+
+def test_read_docker_hosts_file(tmp_path):
+    hosts_file = tmp_path / 'hosts'
+    hosts_file.write_text('# workers\ntcp://10.0.0.2:2376\n\n  unix:///var/run/docker.sock  \n')
+
+    assert read_docker_hosts_file(str(hosts_file)) == ['tcp://10.0.0.2:2376', 'unix:///var/run/docker.sock']
+
+
+def test_is_local_docker_host():
+    assert is_local_docker_host('unix:///var/run/docker.sock')
+    assert not is_local_docker_host('tcp://10.0.0.2:2376')
+
+
+@pytest.mark.parametrize('hosts, capacity', [([], 1), (_hosts(1), 0)])
+def test_pool_rejects_invalid_arguments(hosts, capacity):
+    with pytest.raises(ValueError):
+        DockerHostPool(hosts, capacity)
+
+
+def test_pool_prefers_host_with_fewest_batches():
+    hosts = _hosts(3)
+    pool = DockerHostPool(hosts, capacity=2)
+
+    with pool.acquire() as first, pool.acquire() as second, pool.acquire() as third:
+        assert [first, second, third] == hosts
+
+        # every host executes one batch, so the first host is chosen again
+        with pool.acquire() as fourth:
+            assert fourth is hosts[0]
+
+            with pool.acquire() as fifth:
+                assert fifth is hosts[1]
+
+    # all batches were released
+    with pool.acquire() as host:
+        assert host is hosts[0]
+
+
+def test_pool_waits_for_capacity():
+    hosts = _hosts(2)
+    pool = DockerHostPool(hosts, capacity=1)
+    acquired = []
+
+    def acquire():
+        with pool.acquire() as host:
+            acquired.append(host)
+
+    with pool.acquire(), pool.acquire():
+        waiting = threading.Thread(target=acquire)
+        waiting.start()
+        time.sleep(0.1)
+        assert not acquired
+
+    waiting.join(timeout=5)
+    assert len(acquired) == 1
+
+
+def test_batches_are_distributed_across_docker_hosts(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(6)])
+    fake_backend.latencies = FakeLatencies(agent=0.05)
+    docker_hosts = ['tcp://10.0.0.2:2376', 'tcp://10.0.0.3:2376']
+
+    result = run_experiment(red_file, jobs=1, docker_host=docker_hosts)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert [batch['state'] for batch in result['batches']] == ['succeeded'] * 6
+    created = collections.Counter(base_url for base_url, _ in fake_backend.containers)
+    assert set(created) == set(docker_hosts)
+    assert sum(created.values()) == 6
+    for index in range(6):
+        assert (run_directory / 'outputs_{}'.format(index) / 'out.txt').is_file()
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+from docker.errors import DockerException
+from requests.exceptions import ConnectionError
+
+import cc_faice.commons.docker as docker_module
+from cc_faice.commons.container_backends import FakeBackend
+from cc_faice.commons.docker import DockerManager
+
+
+class CountingBackend(FakeBackend):
+    """
+    A fake backend, which counts the created clients and info calls and records the arguments of create_client().
+    """
+    def __init__(self, reachable=True):
+        super().__init__()
+        self.reachable = reachable
+        self.clients = []
+        self.info_calls = 0
+        self._lock = threading.Lock()
+
+    def create_client(self, base_url, pool_size, timeout):
+        client = super().create_client(base_url, pool_size, timeout)
+        info = client.info
+
+        def counting_info():
+            with self._lock:
+                self.info_calls += 1
+            if not self.reachable:
+                raise ConnectionError('Connection refused')
+            return info()
+
+        client.info = counting_info
+        with self._lock:
+            self.clients.append((base_url, pool_size, timeout))
+        return client
+
+
+@pytest.fixture(autouse=True)
+def empty_daemon_info_cache(monkeypatch):
+    monkeypatch.setattr(docker_module, '_daemon_info_cache', {})
+
+
+def test_client_is_created_lazily_once():
+    backend = CountingBackend()
+    docker_manager = DockerManager(pool_size=32, timeout=5, base_url='tcp://10.0.0.2:2376', backend=backend)
+
+    assert backend.clients == []
+
+    threads = [threading.Thread(target=docker_manager.pull, args=('image',)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    docker_manager.get_image_digest('image')
+
+    assert backend.clients == [('tcp://10.0.0.2:2376', 32, 5)]
+    assert backend.info_calls == 1
+
+
+@pytest.mark.parametrize('base_url, message', [
+    (None, 'Could not connect to docker socket.'),
+    ('tcp://10.0.0.2:2376', 'Could not connect to docker daemon "tcp://10.0.0.2:2376".')
+])
+def test_unreachable_daemon_fails_on_first_operation(base_url, message):
+    docker_manager = DockerManager(base_url=base_url, backend=CountingBackend(reachable=False))
+
+    with pytest.raises(DockerException) as error:
+        docker_manager.pull('image')
+
+    assert str(error.value).startswith(message)
+
+
+def test_cached_daemon_info_is_used_by_other_docker_managers():
+    backend = CountingBackend()
+    DockerManager(backend=backend).cache_daemon_info()
+
+    docker_manager = DockerManager(backend=backend)
+    docker_manager.pull('image')
+
+    assert len(backend.clients) == 2
+    assert backend.info_calls == 1
+
+    # docker managers of other daemons are not affected by the cache
+    DockerManager(base_url='tcp://10.0.0.2:2376', backend=backend).pull('image')
+    assert backend.info_calls == 2
+
+
+def test_pool_size_is_derived_from_workers(write_red_file, run_directory, run_experiment):
+    backend = CountingBackend()
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(4)])
+
+    result = run_experiment(red_file, container_backend=backend, jobs=8, pipeline=True, docker_timeout=30)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert backend.clients == [(None, 2 * (2 * 8 + 1), 30)]
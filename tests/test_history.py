@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from cc_faice.agent.history.main import run as run_history
+from cc_faice.commons.batches import red_batch_hashes
+from cc_faice.commons.container_backends import FAKE_IMAGE_DIGEST
+from cc_faice.commons.executor import longest_first_order
+from cc_faice.commons.history import BatchHistory, PREDICTION_WINDOW
+
+
+def test_longest_first_order_starts_unknown_batches_first():
+    batch_hashes = ['short', 'unknown', 'long', 'medium', 'other']
+    predicted_durations = {'short': 1.0, 'long': 10.0, 'medium': 5.0}
+
+    assert longest_first_order(batch_hashes, predicted_durations) == [1, 4, 2, 3, 0]
+
+
+def test_predicted_durations_use_recent_successful_runs(tmp_path):
+    history = BatchHistory(str(tmp_path / 'history.sqlite'))
+    history.record('batch', 'image', None, 'succeeded', 100.0, None)
+    for _ in range(PREDICTION_WINDOW):
+        history.record('batch', 'image', None, 'succeeded', 2.0, None)
+    history.record('batch', 'image', None, 'failed', 50.0, None)
+    history.record('failing', 'image', None, 'failed', 50.0, None)
+
+    assert history.predicted_durations(['batch', 'failing', 'unknown']) == {'batch': 2.0}
+    history.close()
+
+
+def test_batches_are_ordered_longest_first(tmp_path, write_red_file, run_directory, run_experiment):
+    history_file = str(tmp_path / 'history.sqlite')
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(4)])
+    with open(red_file) as f:
+        batch_hashes = red_batch_hashes(json.load(f))
+
+    history = BatchHistory(history_file)
+    for batch_hash, duration in zip(batch_hashes, [1.0, 3.0, 2.0, 4.0]):
+        history.record(batch_hash, 'image', None, 'succeeded', duration, None)
+    history.close()
+
+    # with a single job the results are streamed in execution order
+    results_file = str(tmp_path / 'results.ndjson')
+    result = run_experiment(red_file, history=history_file, order='longest-first', results_stream=results_file)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    with open(results_file) as f:
+        assert [json.loads(line)['batchIndex'] for line in f] == [3, 1, 2, 0]
+
+
+def test_executions_are_recorded(tmp_path, write_red_file, run_directory, run_experiment):
+    history_file = str(tmp_path / 'history.sqlite')
+    red_file = write_red_file([{'message': 'first'}, {'message': 'fail'}])
+
+    run_experiment(red_file, history=history_file, keep_going=True)
+    run_experiment(red_file, history=history_file, keep_going=True)
+
+    runs = run_history(history_file)['runs']
+    assert sorted(run['state'] for run in runs) == ['failed', 'failed', 'succeeded', 'succeeded']
+    assert all(run['imageDigest'].endswith('@' + FAKE_IMAGE_DIGEST) for run in runs)
+
+    batches = run_history(history_file, summary=True)['batches']
+    assert sorted(batch['runs'] for batch in batches) == [2, 2]
+    succeeded_hash = next(run['batchHash'] for run in runs if run['state'] == 'succeeded')
+    assert len(run_history(history_file, batch_hash=succeeded_hash, limit=1)['runs']) == 1
+
+
+def test_longest_first_order_requires_history(write_red_file, run_directory, fake_backend, run_experiment):
+    result = run_experiment(write_red_file([{'message': 'first'}]), order='longest-first')
+
+    assert result['state'] == 'failed'
+    assert not fake_backend.containers
+
+
+def test_missing_history_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        run_history(str(tmp_path / 'missing.sqlite'))
+    assert not (tmp_path / 'missing.sqlite').exists()
@@ -0,0 +1,138 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import cc_faice.commons.host_slots as host_slots_module
+from cc_faice.commons.container_backends import FakeLatencies
+from cc_faice.commons.files import is_private_directory
+from cc_faice.commons.host_slots import HostSlots, HOST_SLOTS_ENVVAR, HOST_SLOTS_DIRECTORY_ENVVAR
+
+# holds a slot until stdin is closed or the process is killed
+HOLD_SLOT_SCRIPT = '''
+import sys
+from cc_faice.commons.host_slots import HostSlots
+with HostSlots(1, sys.argv[1]).acquire():
+    print('acquired', flush=True)
+    sys.stdin.read()
+'''
+
+
+@pytest.fixture(autouse=True)
+def short_poll_interval(monkeypatch):
+    monkeypatch.setattr(host_slots_module, 'POLL_INTERVAL', 0.01)
+
+
+def test_private_directories(tmp_path):
+    directory = tmp_path / 'directory'
+    directory.mkdir(mode=0o700)
+    link = tmp_path / 'link'
+    link.symlink_to(directory)
+
+    assert is_private_directory(str(directory))
+    assert not is_private_directory(str(link))
+    assert not is_private_directory(str(tmp_path / 'missing'))
+
+    directory.chmod(0o770)
+    assert not is_private_directory(str(directory))
+
+
+def test_slots_directory_is_created_private(tmp_path):
+    directory = tmp_path / 'slots'
+
+    HostSlots(1, str(directory))
+
+    assert is_private_directory(str(directory))
+
+
+@pytest.mark.skipif(os.getuid() != 0, reason='shared slots directories are owned by root')
+def test_shared_slots_directory_requires_sticky_bit(tmp_path):
+    directory = tmp_path / 'slots'
+    directory.mkdir()
+
+    directory.chmod(0o777)
+    with pytest.raises(ValueError):
+        HostSlots(1, str(directory))
+
+    directory.chmod(0o1777)
+    HostSlots(1, str(directory))
+
+
+def test_host_slots_from_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv(HOST_SLOTS_ENVVAR, raising=False)
+    assert HostSlots.from_environment() is None
+
+    monkeypatch.setenv(HOST_SLOTS_ENVVAR, 'many')
+    with pytest.raises(ValueError):
+        HostSlots.from_environment()
+
+    monkeypatch.setenv(HOST_SLOTS_ENVVAR, '0')
+    with pytest.raises(ValueError):
+        HostSlots.from_environment()
+
+    monkeypatch.setenv(HOST_SLOTS_ENVVAR, '2')
+    monkeypatch.setenv(HOST_SLOTS_DIRECTORY_ENVVAR, str(tmp_path / 'slots'))
+    assert HostSlots.from_environment() is not None
+    assert (tmp_path / 'slots').is_dir()
+
+
+def _acquire_in_thread(host_slots):
+    """
+    Acquires and releases a slot of the given host slots in a new thread.
+
+    :return: The thread and an event, which is set, when the slot was acquired
+    :rtype: Tuple[threading.Thread, threading.Event]
+    """
+    acquired = threading.Event()
+
+    def acquire():
+        with host_slots.acquire():
+            acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    return thread, acquired
+
+
+def test_slots_are_shared_between_instances(tmp_path):
+    directory = str(tmp_path / 'slots')
+
+    with HostSlots(1, directory).acquire():
+        waiting, acquired = _acquire_in_thread(HostSlots(1, directory))
+        assert not acquired.wait(0.1)
+
+    waiting.join(timeout=5)
+    assert acquired.is_set()
+
+
+def test_slots_of_terminated_processes_are_released(tmp_path):
+    directory = str(tmp_path / 'slots')
+    holder = subprocess.Popen(
+        [sys.executable, '-c', HOLD_SLOT_SCRIPT, directory], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    )
+    try:
+        assert holder.stdout.readline() == b'acquired\n'
+        waiting, acquired = _acquire_in_thread(HostSlots(1, directory))
+        assert not acquired.wait(0.1)
+    finally:
+        holder.kill()
+        holder.wait()
+
+    waiting.join(timeout=5)
+    assert acquired.is_set()
+
+
+def test_host_slots_limit_running_containers(tmp_path, write_red_file, run_directory, fake_backend, run_experiment,
+                                             monkeypatch):
+    monkeypatch.setenv(HOST_SLOTS_ENVVAR, '1')
+    monkeypatch.setenv(HOST_SLOTS_DIRECTORY_ENVVAR, str(tmp_path / 'slots'))
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(4)])
+    fake_backend.latencies = FakeLatencies(agent=0.05)
+
+    result = run_experiment(red_file, jobs=3)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert fake_backend.max_running_agents == 1
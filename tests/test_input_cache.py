@@ -0,0 +1,193 @@
+import copy
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from cc_faice.commons.input_cache import InputCache, shared_input_requests, CACHE_CONNECTOR_SOURCE, \
+    CONTAINER_CACHE_CONNECTOR_PATH, CONTAINER_INPUT_CACHE_DIR, OBJECTS_DIRECTORY
+
+
+class FileServer(HTTPServer):
+    """
+    A http server serving the files given by path. Every response contains an ETag and conditional requests of
+    unchanged files are answered with 304. The number of downloads of every path is counted.
+    """
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FileRequestHandler)
+        self.files = {}
+        self.downloads = {}
+
+    def url(self, path):
+        return 'http://127.0.0.1:{}{}'.format(self.server_address[1], path)
+
+
+class FileRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        content = self.server.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+
+        etag = '"{}"'.format(hashlib.sha256(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.server.downloads[self.path] = self.server.downloads.get(self.path, 0) + 1
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _http_input(url):
+    return {'class': 'File', 'connector': {'command': 'red-connector-http', 'access': {'url': url}}}
+
+
+def _objects(cache_directory):
+    return sorted(os.listdir(os.path.join(str(cache_directory), OBJECTS_DIRECTORY)))
+
+
+def test_only_shared_http_inputs_are_fetched():
+    mounted = _http_input('http://localhost/mounted')
+    mounted['connector']['mount'] = True
+    ssh = {'class': 'File', 'connector': {'command': 'red-connector-ssh', 'access': {'url': 'ssh://localhost/a'}}}
+    batches = [
+        {'inputs': {'shared': _http_input('http://localhost/shared'), 'single': _http_input('http://localhost/single'),
+                    'mounted': mounted, 'ssh': ssh}},
+        {'inputs': {'shared': [_http_input('http://localhost/shared')], 'mounted': mounted, 'ssh': ssh}}
+    ]
+
+    shared = shared_input_requests(batches)
+
+    assert [access['url'] for access in shared.values()] == ['http://localhost/shared']
+
+
+def test_unchanged_inputs_are_downloaded_once(tmp_path, file_server):
+    file_server.files['/data'] = b'reference data'
+    batches = [{'inputs': {'data': _http_input(file_server.url('/data'))}}] * 2
+
+    assert InputCache(str(tmp_path)).prefetch(batches) == 1
+    assert InputCache(str(tmp_path)).prefetch(batches, workers=2) == 1
+
+    assert file_server.downloads == {'/data': 1}
+    assert _objects(tmp_path) == [hashlib.sha256(b'reference data').hexdigest()]
+
+
+def test_inputs_with_equal_content_are_stored_once(tmp_path, file_server):
+    file_server.files['/first'] = file_server.files['/second'] = b'equal content'
+    inputs = {'first': _http_input(file_server.url('/first')), 'second': _http_input(file_server.url('/second'))}
+
+    assert InputCache(str(tmp_path)).prefetch([{'inputs': inputs}] * 2, workers=2) == 2
+
+    assert len(_objects(tmp_path)) == 1
+
+
+def test_inputs_which_can_not_be_fetched_keep_their_connector(tmp_path, file_server, capsys):
+    blue_batch = {'inputs': {'data': _http_input(file_server.url('/missing'))}}
+    input_cache = InputCache(str(tmp_path))
+
+    assert input_cache.prefetch([blue_batch] * 2) == 0
+
+    assert 'Could not prefetch input' in capsys.readouterr().err
+    assert input_cache.localize_batch(blue_batch) == (blue_batch, {})
+
+
+def test_least_recently_used_inputs_are_evicted(tmp_path, file_server):
+    file_server.files['/old'] = b'o' * 700 * 1024
+    file_server.files['/new'] = b'n' * 700 * 1024
+
+    InputCache(str(tmp_path), max_size=1).prefetch([{'inputs': {'data': _http_input(file_server.url('/old'))}}] * 2)
+    InputCache(str(tmp_path), max_size=1).prefetch([{'inputs': {'data': _http_input(file_server.url('/new'))}}] * 2)
+
+    assert _objects(tmp_path) == [hashlib.sha256(file_server.files['/new']).hexdigest()]
+
+
+def test_localize_batch_replaces_connectors_of_cached_inputs(tmp_path, file_server):
+    file_server.files['/data'] = b'reference data'
+    digest = hashlib.sha256(b'reference data').hexdigest()
+    data = _http_input(file_server.url('/data'))
+    other = _http_input(file_server.url('/other'))
+    blue_batch = {'command': ['cat'], 'inputs': {'data': data, 'list': [other, copy.deepcopy(data)]}}
+    original = copy.deepcopy(blue_batch)
+    input_cache = InputCache(str(tmp_path))
+    input_cache.prefetch([blue_batch])
+
+    localized_batch, binds = input_cache.localize_batch(blue_batch)
+
+    assert blue_batch == original
+    cache_connector = {
+        'command': CONTAINER_CACHE_CONNECTOR_PATH,
+        'access': {'path': '{}/{}'.format(CONTAINER_INPUT_CACHE_DIR, digest)}
+    }
+    assert localized_batch['inputs']['data']['connector'] == cache_connector
+    assert localized_batch['inputs']['list'] == [other, dict(original['inputs']['list'][1], connector=cache_connector)]
+    assert localized_batch['command'] == ['cat']
+    object_path = os.path.join(str(tmp_path), OBJECTS_DIRECTORY, digest)
+    assert binds == {
+        object_path: {'bind': cache_connector['access']['path'], 'mode': 'ro'},
+        os.path.join(str(tmp_path), 'cache_connector.py'): {'bind': CONTAINER_CACHE_CONNECTOR_PATH, 'mode': 'ro'}
+    }
+
+
+def test_cache_connector_links_mounted_file(tmp_path):
+    connector = tmp_path / 'cache_connector.py'
+    connector.write_text(CACHE_CONNECTOR_SOURCE)
+    cached_file = tmp_path / 'cached'
+    cached_file.write_text('reference data')
+    access_file = tmp_path / 'access.json'
+    access_file.write_text(json.dumps({'path': str(cached_file)}))
+    input_path = tmp_path / 'input'
+
+    def connect(*args):
+        return subprocess.run([sys.executable, str(connector)] + list(args), stdout=subprocess.PIPE)
+
+    assert connect('cli-version').stdout.strip() == b'1'
+    assert connect('receive-file-validate', str(access_file)).returncode == 0
+    assert connect('receive-file', str(access_file), str(input_path)).returncode == 0
+    assert os.readlink(str(input_path)) == str(cached_file)
+
+    cached_file.unlink()
+    assert connect('receive-file-validate', str(access_file)).returncode == 1
+
+
+def test_prefetched_inputs_are_mounted_into_containers(tmp_path, file_server, write_red_file, run_directory,
+                                                       fake_backend, run_experiment):
+    file_server.files['/data'] = b'reference data'
+    data = _http_input(file_server.url('/data'))
+    red_file = write_red_file(
+        [{'data': data, 'message': 'first'}, {'data': data, 'message': 'second'}],
+        {
+            'data': {'type': 'File', 'inputBinding': {'position': 0}},
+            'message': {'type': 'string', 'inputBinding': {'position': 1}}
+        }
+    )
+
+    result = run_experiment(red_file, jobs=2, prefetch_inputs=str(tmp_path / 'input_cache'))
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert file_server.downloads == {'/data': 1}
+    assert len(fake_backend.containers) == 2
+    for _, arguments in fake_backend.containers:
+        assert CONTAINER_CACHE_CONNECTOR_PATH in [bind['bind'] for bind in arguments['volumes'].values()]
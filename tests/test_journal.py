@@ -0,0 +1,40 @@
+from cc_faice.commons.journal import RunJournal
+
+
+def test_journal_returns_only_succeeded_results_of_unchanged_batches(tmp_path):
+    journal = RunJournal(str(tmp_path / 'journal.sqlite'))
+    journal.record(0, 'hash-0', 'succeeded', {'state': 'succeeded'})
+    journal.record(1, 'hash-1', 'failed', {'state': 'failed'})
+
+    assert journal.get_succeeded_result(0, 'hash-0') == {'state': 'succeeded'}
+    assert journal.get_succeeded_result(0, 'changed') is None
+    assert journal.get_succeeded_result(1, 'hash-1') is None
+
+    journal.clear()
+    assert journal.get_succeeded_result(0, 'hash-0') is None
+    journal.close()
+
+
+def test_resume_skips_succeeded_batches(tmp_path, write_red_file, run_directory, fake_backend, run_experiment):
+    journal = str(tmp_path / 'journal.sqlite')
+    red_file = write_red_file([{'message': 'first'}, {'message': 'fail'}, {'message': 'third'}])
+
+    result = run_experiment(red_file, journal=journal, keep_going=True)
+
+    assert [batch['state'] for batch in result['batches']] == ['succeeded', 'failed', 'succeeded']
+    assert len(fake_backend.containers) == 3
+
+    # only the failed batch and the changed batch are executed again
+    red_file = write_red_file([{'message': 'first'}, {'message': 'fail'}, {'message': 'changed'}])
+    result = run_experiment(red_file, journal=journal, resume=True, keep_going=True)
+
+    assert [batch['state'] for batch in result['batches']] == ['succeeded', 'failed', 'succeeded']
+    assert [batch['attempts'] for batch in result['batches']] == [0, 1, 1]
+    assert len(fake_backend.containers) == 5
+
+
+def test_resume_requires_journal(write_red_file, run_directory, fake_backend, run_experiment):
+    result = run_experiment(write_red_file([{'message': 'first'}]), resume=True)
+
+    assert result['state'] == 'failed'
+    assert not fake_backend.containers
@@ -0,0 +1,51 @@
+import pytest
+
+import cc_faice.agent.red.main as red_main
+
+
+@pytest.fixture(autouse=True)
+def no_retry_backoff(monkeypatch):
+    monkeypatch.setattr(red_main, 'RETRY_BACKOFF_BASE', 0)
+
+
+def test_failed_batch_aborts_run(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'fail'}, {'message': 'second'}])
+
+    result = run_experiment(red_file)
+
+    assert result['state'] == 'failed'
+    assert [batch['state'] for batch in result['batches']] == ['failed']
+    assert len(fake_backend.containers) == 1
+
+
+def test_keep_going_records_failed_batch_and_continues(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'fail'}, {'message': 'third'}])
+
+    result = run_experiment(red_file, keep_going=True)
+
+    assert result['state'] == 'failed'
+    assert [batch['state'] for batch in result['batches']] == ['succeeded', 'failed', 'succeeded']
+    # failures of the blue agent are deterministic and not retried
+    assert [batch['attempts'] for batch in result['batches']] == [1, 1, 1]
+    assert (run_directory / 'outputs_2' / 'out.txt').is_file()
+
+
+def test_transient_docker_errors_are_retried(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'flaky'}, {'message': 'second'}])
+
+    result = run_experiment(red_file, keep_going=True, max_retries=2)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert [batch['attempts'] for batch in result['batches']] == [2, 1]
+    assert (run_directory / 'outputs_0' / 'out.txt').is_file()
+
+
+def test_transient_docker_errors_fail_batch_after_retries(write_red_file, run_directory, fake_backend,
+                                                          run_experiment):
+    red_file = write_red_file([{'message': 'flaky'}, {'message': 'second'}])
+
+    result = run_experiment(red_file, keep_going=True, max_retries=0)
+
+    assert result['state'] == 'failed'
+    assert [batch['state'] for batch in result['batches']] == ['failed', 'succeeded']
+    assert 'Connection aborted.' in '\n'.join(result['batches'][0]['debugInfo'])
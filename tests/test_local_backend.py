@@ -0,0 +1,47 @@
+import pytest
+
+from cc_faice.commons.container_backends import LocalBackend
+
+# writes the first argument to the output file of the cli
+WRITE_OUTPUT_COMMAND = ['sh', '-c', 'echo "$0" > out.txt']
+
+
+@pytest.mark.parametrize('mount_agent, mount_outputs', [(False, False), (True, False), (False, True), (True, True)])
+def test_batches_are_executed_as_local_processes(tmp_path, write_red_file, run_directory, run_experiment,
+                                                 mount_agent, mount_outputs):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'second'}], base_command=WRITE_OUTPUT_COMMAND)
+
+    result = run_experiment(
+        red_file, container_backend=LocalBackend(str(tmp_path)), mount_agent=mount_agent, mount_outputs=mount_outputs
+    )
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert (run_directory / 'outputs_0' / 'out.txt').read_text() == 'first\n'
+    assert (run_directory / 'outputs_1' / 'out.txt').read_text() == 'second\n'
+
+
+def test_only_the_blue_agent_is_executed_on_the_host(tmp_path):
+    client = LocalBackend(str(tmp_path)).create_client(None, 1, 1)
+    container = client.containers.create('image', '/bin/sh', name='container', working_dir='/cc/outputs')
+    marker = tmp_path / 'marker'
+
+    return_code, _ = container.exec_run(['touch', str(marker)], user='root', workdir='/')
+
+    assert return_code == 0
+    assert not marker.exists()
+    container.remove()
+
+
+def test_fuse_mounts_are_rejected(tmp_path, write_red_file, run_directory, run_experiment):
+    mounted_input = {
+        'class': 'Directory',
+        'connector': {'command': 'red-connector-ssh', 'mount': True, 'access': {'host': 'localhost'}}
+    }
+    red_file = write_red_file(
+        [{'data': mounted_input}], {'data': {'type': 'Directory', 'inputBinding': {'position': 0}}}
+    )
+
+    result = run_experiment(red_file, container_backend=LocalBackend(str(tmp_path)), insecure=True)
+
+    assert result['state'] == 'failed'
+    assert 'does not support FUSE mounts' in '\n'.join(result['debugInfo'])
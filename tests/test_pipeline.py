@@ -0,0 +1,36 @@
+from cc_faice.commons.container_backends import FakeLatencies
+
+
+def test_containers_are_prepared_while_batches_execute(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(4)])
+    fake_backend.latencies = FakeLatencies(agent=0.1)
+
+    result = run_experiment(red_file, jobs=1, pipeline=True)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert fake_backend.max_running_agents == 1
+    assert fake_backend.created_during_execution > 0
+    for index in range(4):
+        assert (run_directory / 'outputs_{}'.format(index) / 'out.txt').is_file()
+
+
+def test_batches_are_processed_in_series_without_pipeline(write_red_file, run_directory, fake_backend,
+                                                          run_experiment):
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(4)])
+    fake_backend.latencies = FakeLatencies(agent=0.05)
+
+    result = run_experiment(red_file, jobs=1)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert fake_backend.max_running_agents == 1
+    assert fake_backend.created_during_execution == 0
+
+
+def test_pipeline_executes_as_many_batches_as_jobs(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(8)])
+    fake_backend.latencies = FakeLatencies(agent=0.1)
+
+    result = run_experiment(red_file, jobs=2, pipeline=True)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert fake_backend.max_running_agents == 2
@@ -0,0 +1,73 @@
+import pstats
+from collections import OrderedDict
+
+import pytest
+
+from cc_faice.commons.profiling import split_profiling_args, PROFILE_CPU_ENVVAR, PROFILE_MEM_ENVVAR
+
+
+def test_split_profiling_args_strips_only_leading_options():
+    argv = ['--profile-mem', '--profile-cpu', 'out.prof', 'agent', 'red', '--profile-mem']
+
+    remaining, profiler = split_profiling_args(argv, {})
+
+    assert remaining == ['agent', 'red', '--profile-mem']
+    assert profiler is not None
+
+
+def test_split_profiling_args_accepts_option_with_value():
+    remaining, profiler = split_profiling_args(['--profile-cpu=out.prof', 'agent', 'red'], {})
+
+    assert remaining == ['agent', 'red']
+    assert profiler is not None
+
+
+def test_split_profiling_args_without_profiling():
+    argv = ['agent', 'red', 'experiment.red.yml']
+
+    assert split_profiling_args(argv, {}) == (argv, None)
+    assert split_profiling_args(argv, {PROFILE_CPU_ENVVAR: '', PROFILE_MEM_ENVVAR: ''}) == (argv, None)
+
+
+def test_split_profiling_args_enabled_by_environment():
+    argv = ['agent', 'red', 'experiment.red.yml']
+
+    remaining, profiler = split_profiling_args(argv, {PROFILE_MEM_ENVVAR: '1'})
+
+    assert remaining == argv
+    assert profiler is not None
+
+
+def _modes(main):
+    return OrderedDict([('agent', {'main': main, 'description': 'agent'})])
+
+
+def test_profiler_writes_cpu_profile(tmp_path):
+    cpu_profile = str(tmp_path / 'faice.prof')
+    _, profiler = split_profiling_args(['--profile-cpu', cpu_profile], {})
+
+    def agent_main():
+        return sum(range(1000))
+
+    modes = profiler.wrap_modes(_modes(agent_main))
+
+    assert modes['agent']['description'] == 'agent'
+    assert modes['agent']['main']() == sum(range(1000))
+    assert pstats.Stats(cpu_profile).total_calls > 0
+
+
+def test_profiler_reports_memory_when_main_exits(capsys):
+    _, profiler = split_profiling_args([], {PROFILE_MEM_ENVVAR: '1'})
+
+    def agent_main():
+        allocations = [bytearray(1024) for _ in range(100)]
+        exit(len(allocations))
+
+    modes = profiler.wrap_modes(_modes(agent_main))
+
+    with pytest.raises(SystemExit) as exit_info:
+        modes['agent']['main']()
+
+    assert exit_info.value.code == 100
+
+    assert 'Memory profile: peak' in capsys.readouterr().err
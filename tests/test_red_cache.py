@@ -0,0 +1,26 @@
+import os
+
+from cc_faice.commons.red_cache import RedCache, red_cache_key
+
+
+def test_entries_are_cached_in_private_directory(tmp_path):
+    red_cache = RedCache(str(tmp_path / 'cache'))
+    key = red_cache_key('{"redVersion": "9"}')
+
+    red_cache.put(key, {'redVersion': '9'}, {'schema': None})
+
+    assert red_cache.get(key) == ({'redVersion': '9'}, {'schema': None})
+
+
+def test_cache_is_disabled_in_directory_writable_by_others(tmp_path, capsys):
+    directory = tmp_path / 'cache'
+    directory.mkdir()
+    os.chmod(str(directory), 0o777)
+    key = red_cache_key('{"redVersion": "9"}')
+
+    red_cache = RedCache(str(directory))
+    red_cache.put(key, {'redVersion': '9'}, {'schema': None})
+
+    assert 'disabled' in capsys.readouterr().err
+    assert os.listdir(str(directory)) == []
+    assert red_cache.get(key) is None
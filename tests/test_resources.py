@@ -0,0 +1,144 @@
+import os
+import random
+import threading
+import time
+
+import pytest
+
+import cc_faice.agent.red.main as red_main
+from cc_faice.commons.container_backends import FakeLatencies
+from cc_faice.commons.docker import DockerManager
+from cc_faice.commons.resources import host_memory_budget, MemoryAdmissionController, CpuAllocator, numa_nodes, \
+    parse_cpu_list, format_cpu_list
+
+
+@pytest.mark.parametrize('meminfo, budget', [
+    ('MemTotal:       16384000 kB\nMemFree:         1024000 kB\nMemAvailable:    8192000 kB\n', 8000),
+    ('MemTotal:       16384000 kB\nMemFree:         1024000 kB\n', 16000)
+])
+def test_host_memory_budget(tmp_path, meminfo, budget):
+    meminfo_path = tmp_path / 'meminfo'
+    meminfo_path.write_text(meminfo)
+
+    assert host_memory_budget(str(meminfo_path)) == budget
+
+
+def test_reservations_wait_for_released_memory():
+    controller = MemoryAdmissionController(1000, default_ram=600)
+    admitted = threading.Event()
+
+    def reserve_default_ram():
+        with controller.reserve(None):
+            admitted.set()
+
+    with controller.reserve(500):
+        waiting = threading.Thread(target=reserve_default_ram)
+        waiting.start()
+        assert not admitted.wait(0.1)
+
+    waiting.join(timeout=5)
+    assert admitted.is_set()
+
+
+def test_reservation_larger_than_budget_fails():
+    with pytest.raises(ValueError):
+        with MemoryAdmissionController(1000).reserve(2000):
+            pass
+
+
+def test_concurrent_containers_fit_into_memory_budget(write_red_file, run_directory, fake_backend, run_experiment):
+    # every batch requires 256 MB as set by create_red_data()
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(6)])
+    fake_backend.latencies = FakeLatencies(agent=0.1)
+
+    result = run_experiment(red_file, jobs=4, memory_budget=512)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert fake_backend.max_running_agents == 2
+
+
+def test_batch_exceeding_memory_budget_fails(write_red_file, run_directory, fake_backend, run_experiment):
+    red_file = write_red_file([{'message': 'first'}])
+
+    result = run_experiment(red_file, memory_budget=128)
+
+    assert result['state'] == 'failed'
+    assert not fake_backend.containers
+
+
+@pytest.mark.parametrize('cpu_list, cpus', [('0-3,8,10-11', [0, 1, 2, 3, 8, 10, 11]), ('5', [5]), ('', [])])
+def test_cpu_lists(cpu_list, cpus):
+    assert parse_cpu_list(cpu_list) == cpus
+    assert format_cpu_list(cpus) == cpu_list
+
+
+def test_numa_nodes_contain_only_available_cpus(tmp_path):
+    available_cpus = sorted(os.sched_getaffinity(0))
+    for node_index, node_cpus in enumerate([available_cpus, [max(available_cpus) + 1]]):
+        node_directory = tmp_path / 'node{}'.format(node_index)
+        node_directory.mkdir()
+        (node_directory / 'cpulist').write_text(format_cpu_list(node_cpus) + '\n')
+
+    assert numa_nodes(str(tmp_path)) == [available_cpus]
+    assert numa_nodes(str(tmp_path / 'missing')) == [available_cpus]
+
+
+def test_cpus_of_one_numa_node_are_preferred():
+    allocator = CpuAllocator([[0, 1, 2, 3], [4, 5, 6, 7]])
+
+    with allocator.allocate(2) as first:
+        assert first == '0-1'
+        # the node with the fewest free cpus, which fits the request, is used
+        with allocator.allocate(2) as second, allocator.allocate(4) as third:
+            assert second == '2-3'
+            assert third == '4-7'
+
+    with allocator.allocate(8) as all_cpus:
+        assert all_cpus == '0-7'
+
+
+def test_cpus_are_never_allocated_to_concurrent_batches():
+    allocator = CpuAllocator([[0, 1, 2], [3, 4, 5, 6]])
+    allocated = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def run_batch(count):
+        with allocator.allocate(count) as cpu_list:
+            cpus = set(parse_cpu_list(cpu_list))
+            with lock:
+                if cpus & allocated or len(cpus) != count:
+                    overlaps.append(cpu_list)
+                allocated.update(cpus)
+            time.sleep(random.uniform(0, 0.01))
+            with lock:
+                allocated.difference_update(cpus)
+
+    threads = [threading.Thread(target=run_batch, args=(index % 4 + 1,)) for index in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert not overlaps
+    assert not allocated
+
+
+def test_containers_are_restricted_to_allocated_cpus(write_red_file, run_directory, fake_backend, run_experiment,
+                                                     monkeypatch):
+    red_file = write_red_file([{'message': 'batch-{}'.format(index)} for index in range(6)])
+    fake_backend.latencies = FakeLatencies(agent=0.05)
+    monkeypatch.setattr(red_main, 'numa_nodes', lambda: [[0, 1], [2, 3]])
+    cpusets = []
+
+    def set_cpuset(container, cpuset_cpus):
+        cpusets.append(cpuset_cpus)
+
+    monkeypatch.setattr(DockerManager, 'set_cpuset', staticmethod(set_cpuset))
+
+    result = run_experiment(red_file, jobs=4, cpuset=True, batch_cpus=2)
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    assert fake_backend.max_running_agents == 2
+    assert len(cpusets) == 6
+    assert set(cpusets) == {'0-1', '2-3'}
@@ -0,0 +1,46 @@
+import json
+
+from cc_faice.commons.results_stream import ResultsStream
+
+
+def test_records_are_written_as_compact_lines(tmp_path):
+    path = str(tmp_path / 'results.ndjson')
+    stream = ResultsStream(path)
+
+    stream.write({'batchIndex': 0, 'state': 'succeeded'})
+    # the line is readable before the stream is closed
+    with open(path) as f:
+        assert f.read() == '{"batchIndex":0,"state":"succeeded"}\n'
+
+    # values, which are not json serializable, are written as strings
+    stream.write({'batchIndex': 1, 'path': tmp_path})
+    stream.close()
+    with open(path) as f:
+        assert json.loads(f.readlines()[1]) == {'batchIndex': 1, 'path': str(tmp_path)}
+
+
+def test_batch_results_are_streamed(tmp_path, write_red_file, run_directory, run_experiment):
+    path = str(tmp_path / 'results.ndjson')
+    red_file = write_red_file([{'message': 'first'}, {'message': 'fail'}, {'message': 'third'}])
+
+    result = run_experiment(red_file, keep_going=True, results_stream=path)
+
+    # only the outcomes of the batches are kept in memory
+    assert result['containers'] == []
+    assert [batch['state'] for batch in result['batches']] == ['succeeded', 'failed', 'succeeded']
+
+    with open(path) as f:
+        records = sorted((json.loads(line) for line in f), key=lambda record: record['batchIndex'])
+    assert [(record['batchIndex'], record['state']) for record in records] == \
+        [(0, 'succeeded'), (1, 'failed'), (2, 'succeeded')]
+    assert records[0]['container']['state'] == 'succeeded'
+
+
+def test_batch_results_are_streamed_to_stdout(write_red_file, run_directory, run_experiment, capsys):
+    red_file = write_red_file([{'message': 'first'}, {'message': 'second'}])
+
+    result = run_experiment(red_file, results_stream='-')
+
+    assert result['state'] == 'succeeded', result['debugInfo']
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(json.loads(line)['batchIndex'] for line in lines) == [0, 1]
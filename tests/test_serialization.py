@@ -0,0 +1,40 @@
+import pytest
+
+from cc_faice.commons.serialization import read, SERIALIZATION_ENVVAR, ACCELERATED_BACKEND, CC_CORE_BACKEND
+
+DOCUMENTS = [
+    '{"a": 1, "b": [1, 2.5, -0.0, 1e5, 1E-3, true, false, null]}',
+    '{"a": "\\u00e9\\n\\t", "b": "\\ud800", "\\u00fc": "ü"}',
+    '{"a": "x\\": 1", "b\\"": {"c": "d"}}',
+    '{"a": 12345678901234567890, "b": -98765432109876543210}',
+    '{"a": 1e400, "b": -1e400}',
+    '{"a": NaN, "b": Infinity, "c": -Infinity}',
+    '{"a": 1, "a": 2}',
+    '{"a": 1,\n "a": 1}',
+    '{"a": {"b": 1, "b": 1}}',
+    '{"a": [{"k": 1}, {"k": 2, "k": 3}]}',
+    '{"k": "2020-01-01", "y": "yes", "o": "on"}',
+    '{"a": 1}\n# comment',
+    '{"a": [1, 2,]}',
+    '{a: 010, b: 2020-01-01}',
+    '  {"": {}}  ',
+    '{"a": 1} x',
+    '[1, 2]',
+    'a: 1\na: 2\n',
+]
+
+
+def _read_with_backend(monkeypatch, backend, raw_data):
+    monkeypatch.setenv(SERIALIZATION_ENVVAR, backend)
+    try:
+        return repr(read(raw_data, 'data'))
+    except Exception:
+        return 'error'
+
+
+@pytest.mark.parametrize('raw_data', DOCUMENTS)
+def test_accelerated_read_equals_cc_core_read(monkeypatch, raw_data):
+    accelerated = _read_with_backend(monkeypatch, ACCELERATED_BACKEND, raw_data)
+    cc_core = _read_with_backend(monkeypatch, CC_CORE_BACKEND, raw_data)
+
+    assert accelerated == cc_core